@@ -0,0 +1,126 @@
+import hashlib
+import json
+import re
+
+# Canonical activity -> words that map onto it (shared by the extractor and the pattern finder)
+ACTIVITY_SYNONYMS = {
+    'exercise': ['gym', 'workout', 'run', 'running', 'walk', 'walking', 'hike', 'hiking', 'yoga', 'fitness', 'dance', 'dancing', 'sports', 'volleyball', 'weightlifting', 'cardio', 'training', 'bike', 'biking', 'swimming'],
+    'social_media': ['scrolling', 'instagram', 'tiktok', 'facebook', 'feeds', 'social', 'browsing', 'checking', 'phone', 'apps', 'posting', 'liking'],
+    'cooking': ['cook', 'cooking', 'meal', 'prep', 'recipe', 'recipes', 'baking', 'kitchen', 'ingredients', 'preparing', 'prepared'],
+    'social': ['friends', 'family', 'party', 'dinner', 'brunch', 'hanging', 'video', 'call', 'chat', 'meeting', 'conversation', 'gatherings', 'socializing'],
+    'sleep': ['sleep', 'sleeping', 'bed', 'bedtime', 'nap', 'rest', 'tired', 'exhausted', 'late']
+}
+
+# Seed phrase words too generic to count as an activity on their own ("make bed", "take notes")
+GENERIC_SEED_WORDS = {
+    'make', 'take', 'check', 'attend', 'enjoy', 'visit', 'play', 'watch', 'listen', 'read', 'write',
+    'practice', 'learn', 'drive', 'feed', 'help', 'comfort', 'receive', 'deep', 'power', 'physical',
+    'online', 'public', 'outside', 'books', 'skills', 'notes', 'goals', 'others', 'support', 'night', 'date'
+}
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+class LexicalActivityMatcher:
+    """Dictionary pass over an entry: known activity words and phrases, without running a model"""
+
+    def __init__(self, seed_phrases, synonyms=ACTIVITY_SYNONYMS, stop_words=(), min_length=4):
+        self.min_length = min_length
+        self.words = set()
+        # First word -> phrases starting with it, longest first
+        self.phrases = {}
+
+        # Short words are skipped (the pattern finder rejects activities of 3 characters or fewer anyway)
+        for synonym_list in synonyms.values():
+            for word in synonym_list:
+                if len(word) >= min_length:
+                    self.words.add(word)
+
+        for phrase in seed_phrases:
+            tokens = tuple(_WORD.findall(phrase.lower()))
+            if len(tokens) > 1:
+                self.phrases.setdefault(tokens[0], set()).add(tokens)
+            for token in tokens:
+                if len(token) >= min_length and token not in stop_words and token not in GENERIC_SEED_WORDS:
+                    self.words.add(token)
+
+        self.phrases = {
+            first: sorted(phrases, key=len, reverse=True) for first, phrases in self.phrases.items()
+        }
+
+    def fingerprint(self):
+        """Hash of everything match() looks for, for cache keys"""
+        vocabulary = {
+            'min_length': self.min_length,
+            'words': sorted(self.words),
+            'phrases': sorted(" ".join(phrase) for phrases in self.phrases.values() for phrase in phrases)
+        }
+        return hashlib.sha1(json.dumps(vocabulary).encode("utf-8")).hexdigest()
+
+    def match(self, text, score, top_n=10):
+        """Known activities in order of first appearance, as (keyword, score) pairs like KeyBERT returns"""
+        tokens = _WORD.findall(text.lower())
+        found = {}
+        i = 0
+        while i < len(tokens) and len(found) < top_n:
+            token = tokens[i]
+            for phrase in self.phrases.get(token, ()):
+                if tuple(tokens[i:i + len(phrase)]) == phrase:
+                    found.setdefault(" ".join(phrase), score)
+                    i += len(phrase)
+                    break
+            else:
+                if token in self.words:
+                    found.setdefault(token, score)
+                i += 1
+        return list(found.items())
+
+class SynonymMatcher:
+    """Aho-Corasick automaton over every synonym: the earliest canonical (in dict order) with a synonym in the text"""
+
+    def __init__(self, synonyms=ACTIVITY_SYNONYMS):
+        self.canonicals = list(synonyms)
+        # Per node: next states, failure link, and the best (lowest) canonical rank ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._rank = [None]
+
+        for rank, synonym_list in enumerate(synonyms.values()):
+            for synonym in synonym_list:
+                node = 0
+                for char in synonym:
+                    if char not in self._goto[node]:
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._rank.append(None)
+                        self._goto[node][char] = len(self._goto) - 1
+                    node = self._goto[node][char]
+                if self._rank[node] is None or rank < self._rank[node]:
+                    self._rank[node] = rank
+
+        # Breadth first, so a node's failure target is finished before the node itself
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                inherited = self._rank[self._fail[child]]
+                if inherited is not None and (self._rank[child] is None or inherited < self._rank[child]):
+                    self._rank[child] = inherited
+                queue.append(child)
+
+    def canonical(self, text):
+        """Canonical activity for an already lowercased text, or None if no synonym occurs in it"""
+        best = None
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            rank = self._rank[node]
+            if rank is not None and (best is None or rank < best):
+                best = rank
+                if best == 0:
+                    break
+        return None if best is None else self.canonicals[best]
@@ -0,0 +1,127 @@
+'''
+Throughput and latency of the extractor's keyword + emotion extraction over daily_data (scaled to
+--entries with synthetic entries), one fresh process per configuration, without the extraction cache.
+
+Usage: python benchmark_extractor.py --entries 300 --batch-sizes 1 8 32 --threads 1 4 --output results.json
+'''
+
+import itertools
+import multiprocessing
+import platform
+import random
+import re
+import time
+
+from report_utils import report_parser, peak_rss_mb, latency_summary, print_table, write_report
+
+def synthesize_entries(base_entries, count, seed=0):
+    """The base corpus followed by synthetic entries stitched together from its sentences"""
+    entries = list(base_entries[:count])
+    sentences = [sentence for text, _, _ in base_entries for sentence in re.split(r'(?<=[.!?])\s+', text) if sentence]
+    rng = random.Random(seed)
+    while len(entries) < count:
+        text = " ".join(rng.sample(sentences, rng.randint(4, 8)))
+        entries.append((text, rng.randint(1, 10), rng.randint(1, 10)))
+    return entries
+
+def run_configuration(config, entries):
+    import torch
+    import extractor
+
+    torch.set_num_threads(config['threads'])
+    extractor.EXTRACTION_BATCH_SIZE = config['batch_size']
+    extractor.EMOTION_BACKEND = config['backend']
+    extractor.KEYWORD_DIVERSITY = config['diversity']
+    extractor.KEYWORD_TIERING = config['tiering']
+
+    start = time.perf_counter()
+    extractor.load_models()
+    load_seconds = time.perf_counter() - start
+
+    texts = [text for text, _, _ in entries]
+
+    # Warm up outside the timed region
+    extractor.get_daily_keywords_tiered(texts[:1])
+    extractor.get_top_emotions_batch(texts[:1])
+
+    entry_latencies = []
+    lexical_only = 0
+    start = time.perf_counter()
+    for batch_start in range(0, len(texts), config['batch_size']):
+        batch = texts[batch_start:batch_start + config['batch_size']]
+        batch_start_time = time.perf_counter()
+        _, batch_lexical_only = extractor.get_daily_keywords_tiered(batch)
+        extractor.get_top_emotions_batch(batch)
+        batch_ms = (time.perf_counter() - batch_start_time) * 1000
+        # Every entry in a batch waits for the whole batch
+        entry_latencies.extend([batch_ms] * len(batch))
+        lexical_only += len(batch_lexical_only)
+    total_seconds = time.perf_counter() - start
+
+    return {
+        'config': config,
+        'entries': len(texts),
+        'entries_per_sec': len(texts) / total_seconds,
+        'latency_ms': {
+            **latency_summary(entry_latencies, (50, 95, 99)),
+            'mean_per_entry': total_seconds * 1000 / len(texts)
+        },
+        'model_load_seconds': load_seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'lexical_only_entries': lexical_only
+    }
+
+def main():
+    parser = report_parser(__doc__, output="extractor_benchmark.json")
+    parser.add_argument("--entries", type=int, default=30, help="Corpus size (daily_data is 30 entries, the rest is synthetic)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1])
+    parser.add_argument("--backends", nargs="+", default=["pytorch"])
+    parser.add_argument("--diversity", nargs="+", default=["exact_maxsum"])
+    parser.add_argument("--tiering", nargs="+", default=["lexical_first", "off"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Only the corpus is needed here, the models load inside each configuration's process
+    import extractor
+    entries = synthesize_entries(extractor.daily_data, args.entries, seed=args.seed)
+
+    configs = [
+        {'batch_size': batch_size, 'threads': threads, 'backend': backend, 'diversity': diversity, 'tiering': tiering}
+        for batch_size, threads, backend, diversity, tiering
+        in itertools.product(args.batch_sizes, args.threads, args.backends, args.diversity, args.tiering)
+    ]
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for config in configs:
+        print(f"Running {config}...")
+        with context.Pool(1) as pool:
+            try:
+                results.append(pool.apply(run_configuration, (config, entries)))
+            except Exception as e:
+                print(f"  failed: {e}")
+                results.append({'config': config, 'error': str(e)})
+
+    rows = []
+    for result in results:
+        config = result['config']
+        row = [config['batch_size'], config['threads'], config['backend'], config['diversity'], config['tiering']]
+        if 'error' in result:
+            rows.append(row + ["failed"] + [""] * 5)
+            continue
+        latency = result['latency_ms']
+        rows.append(row + [f"{result['entries_per_sec']:.1f}", f"{latency['p50']:.1f}", f"{latency['p95']:.1f}",
+                           f"{latency['p99']:.1f}", f"{result['model_load_seconds']:.1f}", f"{result['peak_rss_mb']:.0f}"])
+    print()
+    print_table(["batch", "thr", "backend", "diversity", "tiering", "ent/s", "p50 ms", "p95 ms", "p99 ms", "load s", "RSS MB"], rows)
+
+    write_report(args.output, {
+        'machine': {'platform': platform.platform(), 'processor': platform.processor(), 'python': platform.python_version()},
+        'entries': len(entries),
+        'seed': args.seed,
+        'results': results
+    })
+
+if __name__ == "__main__":
+    main()
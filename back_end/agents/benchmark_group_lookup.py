@@ -0,0 +1,126 @@
+'''
+Per-lookup latency of the pattern finder's nearest-group search at different vocabulary sizes, and
+recall of the IVF index against exact search (with scikit-learn, also the old cosine_similarity scan).
+
+Usage: python benchmark_group_lookup.py [--sizes 100 10000 100000] [--queries 200] [--output results.json]
+'''
+
+import time
+import numpy as np
+
+from group_index import ExactGroupIndex, IVFGroupIndex
+from report_utils import report_parser, latency_summary, print_table, write_report
+
+EMBEDDING_DIM = 384
+SIMILARITY_THRESHOLD = 0.85
+
+def make_groups(count, rng):
+    return rng.standard_normal((count, EMBEDDING_DIM)).astype(np.float32)
+
+def make_queries(groups, count, rng):
+    # Half near-duplicates of existing groups (matches), half fresh vectors (misses)
+    near = groups[rng.integers(0, len(groups), count // 2)]
+    near = near + 0.2 * np.linalg.norm(near, axis=1, keepdims=True) / np.sqrt(EMBEDDING_DIM) * rng.standard_normal(near.shape)
+    fresh = rng.standard_normal((count - count // 2, EMBEDDING_DIM))
+    return np.vstack([near, fresh]).astype(np.float32)
+
+def legacy_search(groups, embedding, threshold):
+    from sklearn.metrics.pairwise import cosine_similarity
+    best_group = None
+    best_similarity = 0
+    for group_id, group_embedding in enumerate(groups):
+        similarity = cosine_similarity([embedding], [group_embedding])[0][0]
+        if similarity > best_similarity and similarity >= threshold:
+            best_similarity = similarity
+            best_group = group_id
+    return best_group
+
+def time_lookups(search, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return results, latency_summary(latencies)
+
+def main():
+    parser = report_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--legacy-max-groups", type=int, default=10_000)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+    
+    try:
+        import sklearn
+        has_sklearn = True
+    except ImportError:
+        has_sklearn = False
+    
+    rng = np.random.default_rng(0)
+    results = []
+    for size in args.sizes:
+        groups = make_groups(size, rng)
+        queries = make_queries(groups, args.queries, rng)
+        
+        index = ExactGroupIndex()
+        start = time.perf_counter()
+        for group_id, embedding in enumerate(groups):
+            index.add(group_id, embedding)
+        build_seconds = time.perf_counter() - start
+        
+        matches, latency = time_lookups(lambda q: index.search(q, SIMILARITY_THRESHOLD)[0], queries)
+        result = {
+            'groups': size,
+            'build_seconds': build_seconds,
+            'match_rate': sum(match is not None for match in matches) / len(matches),
+            'exact_index_us': latency
+        }
+        
+        ivf = IVFGroupIndex(min_train_size=1)
+        start = time.perf_counter()
+        for group_id, embedding in enumerate(groups):
+            ivf.add(group_id, embedding)
+        result['ivf_build_seconds'] = time.perf_counter() - start
+        result['ivf'] = {}
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            ivf_matches, ivf_latency = time_lookups(lambda q: ivf.search(q, SIMILARITY_THRESHOLD)[0], queries)
+            exact_hits = [(a, b) for a, b in zip(matches, ivf_matches) if a is not None]
+            result['ivf'][nprobe] = {
+                'latency_us': ivf_latency,
+                'recall': sum(a == b for a, b in zip(matches, ivf_matches)) / len(matches),
+                'recall_of_matches': sum(a == b for a, b in exact_hits) / len(exact_hits) if exact_hits else 1.0
+            }
+        
+        if has_sklearn and size <= args.legacy_max_groups:
+            legacy_queries = queries[:max(10, args.queries // 10)]
+            legacy_matches, legacy_latency = time_lookups(
+                lambda q: legacy_search(groups, q, SIMILARITY_THRESHOLD), legacy_queries
+            )
+            result['legacy_scan_us'] = legacy_latency
+            result['legacy_agreement'] = sum(
+                a == b for a, b in zip(legacy_matches, matches)
+            ) / len(legacy_matches)
+        results.append(result)
+    
+    rows = []
+    for result in results:
+        legacy = result.get('legacy_scan_us')
+        rows.append([result['groups'], f"{result['exact_index_us']['mean']:.1f}", f"{result['exact_index_us']['p95']:.1f}",
+                     f"{legacy['mean']:.0f}" if legacy else "-", f"{result['legacy_agreement']:.0%}" if legacy else "-"])
+    print_table(["groups", "mean us", "p95 us", "legacy mean us", "agreement"], rows)
+    
+    rows = []
+    for result in results:
+        for nprobe, ivf in result['ivf'].items():
+            rows.append([result['groups'], nprobe, f"{ivf['latency_us']['mean']:.1f}", f"{ivf['latency_us']['p95']:.1f}",
+                         f"{ivf['recall']:.1%}", f"{ivf['recall_of_matches']:.1%}"])
+    print()
+    print_table(["groups", "nprobe", "ivf mean us", "ivf p95 us", "recall", "match recall"], rows)
+    
+    write_report(args.output, {'results': results})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import json
+import os
+import shutil
+import time
+from collections.abc import MutableMapping
+import numpy as np
+
+from group_index import ExactGroupIndex, IVFGroupIndex, normalize_rows
+from state_journal import atomic_write
+
+# Layout of a snapshot directory (the pattern finder's shared vocabulary):
+#   CURRENT                      name of the live snapshot-* subdirectory (swapped atomically)
+#   snapshot-*/meta.json         scalars (next_group_id, journal_seq, ...) and group index parameters
+#   snapshot-*/embeddings.npy    normalized group embeddings, one row per group (float32 or float16)
+#   snapshot-*/group_ids.npy     group id of each row
+#   snapshot-*/index_*.npy       IVF clustering of the group index, when it has been trained
+#   snapshot-*/labels.npy        group labels as one UTF-8 blob, labels_offsets.npy marks where each starts
+#   snapshot-*/activities.npy    the same for each group's activity list (a JSON array per group)
+#   snapshot-*/activity_keys.npy activity_to_group: activities sorted by UTF-8 bytes (fixed width,
+#                                for np.searchsorted) and their group ids in activity_key_groups.npy
+#   snapshot-*/seed.pkl          pickled user state new users start from, if there is one (seed_seq in meta.json)
+# Strings stay mapped and are decoded per group on access (LazyGroups, LazyActivityIndex), so
+# loading builds no per-group objects.
+
+SNAPSHOT_VERSION = 1
+
+def _json_default(value):
+    # NumPy scalars sneak into some of the JSON columns
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+def _write_file(path, name, write):
+    with open(os.path.join(path, name), 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _write_array(path, name, array):
+    _write_file(path, f"{name}.npy", lambda f: np.save(f, array))
+
+def _write_json(path, name, value):
+    _write_file(path, f"{name}.json", lambda f: f.write(json.dumps(value, default=_json_default).encode("utf-8")))
+
+def _read_json(path, name):
+    with open(os.path.join(path, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_strings(path, name, strings):
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(data) for data in encoded])
+    _write_array(path, name, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    _write_array(path, f"{name}_offsets", offsets)
+
+class StringColumn:
+    """Read-only list of strings over a UTF-8 blob and its offsets, decoded on access"""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+class LazyGroups(MutableMapping):
+    """activity_groups over a snapshot's columns, a group's dict is built on first lookup"""
+
+    def __init__(self, group_ids, labels, activities, embeddings):
+        self._group_ids = group_ids
+        # Group ids are assigned in order and never removed, so they're normally the row numbers
+        if np.array_equal(group_ids, np.arange(len(group_ids))):
+            self._rows = None
+        else:
+            self._rows = {group_id: row for row, group_id in enumerate(group_ids.tolist())}
+        self._labels = labels
+        self._activities = activities
+        self._embeddings = embeddings
+        self._groups = {}
+        self._added = 0
+
+    def _row(self, group_id):
+        if self._rows is not None:
+            return self._rows.get(group_id)
+        if type(group_id) is int and 0 <= group_id < len(self._group_ids):
+            return group_id
+        return None
+
+    def _build(self, row):
+        return {
+            'activities': set(json.loads(self._activities[row])),
+            'embedding': self._embeddings[row],
+            'label': self._labels[row]
+        }
+
+    def label(self, group_id):
+        group = self._groups.get(group_id)
+        return group['label'] if group is not None else self._labels[self._row(group_id)]
+
+    def __getitem__(self, group_id):
+        group = self._groups.get(group_id)
+        if group is None:
+            row = self._row(group_id)
+            if row is None:
+                raise KeyError(group_id)
+            group = self._groups[group_id] = self._build(row)
+        return group
+
+    def __setitem__(self, group_id, group):
+        if group_id not in self:
+            self._added += 1
+        self._groups[group_id] = group
+
+    def __delitem__(self, group_id):
+        raise TypeError("Groups are never removed")
+
+    def __contains__(self, group_id):
+        return group_id in self._groups or self._row(group_id) is not None
+
+    def __len__(self):
+        return len(self._group_ids) + self._added
+
+    def __iter__(self):
+        yield from self._group_ids.tolist()
+        for group_id in self._groups:
+            if self._row(group_id) is None:
+                yield group_id
+
+    def items(self):
+        for group_id in self:
+            group = self._groups.get(group_id)
+            yield group_id, group if group is not None else self._build(self._row(group_id))
+
+    def values(self):
+        for _, group in self.items():
+            yield group
+
+    def __reduce__(self):
+        # Pickles as a plain dict
+        return dict, (dict(self.items()),)
+
+class LazyActivityIndex(MutableMapping):
+    """activity_to_group over a snapshot's sorted activity column, binary searched per lookup"""
+
+    def __init__(self, keys, group_ids):
+        self._keys = keys
+        self._group_ids = group_ids
+        self._added = {}
+        self._added_count = 0
+
+    def _find(self, activity):
+        encoded = activity.encode("utf-8")
+        if len(encoded) > self._keys.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self._keys, encoded))
+        if i < len(self._keys) and self._keys[i] == encoded:
+            return int(self._group_ids[i])
+        return None
+
+    def __getitem__(self, activity):
+        group_id = self._added.get(activity)
+        if group_id is None:
+            group_id = self._find(activity)
+            if group_id is None:
+                raise KeyError(activity)
+        return group_id
+
+    def __setitem__(self, activity, group_id):
+        if activity not in self:
+            self._added_count += 1
+        self._added[activity] = group_id
+
+    def __delitem__(self, activity):
+        raise TypeError("Activities are never removed")
+
+    def __contains__(self, activity):
+        return activity in self._added or self._find(activity) is not None
+
+    def __len__(self):
+        return len(self._keys) + self._added_count
+
+    def __iter__(self):
+        for key in self._keys.tolist():
+            yield key.decode("utf-8")
+        for activity in self._added:
+            if self._find(activity) is None:
+                yield activity
+
+    def items(self):
+        for activity in self:
+            yield activity, self[activity]
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+def _index_columns(group_index, group_ids):
+    """Index parameters for meta.json plus its arrays, or None if the index doesn't line up with the groups"""
+    if group_index is None or group_index.group_ids != group_ids:
+        return None, {}
+    if isinstance(group_index, IVFGroupIndex):
+        meta = {
+            'type': 'ivf',
+            'min_train_size': group_index.min_train_size,
+            'nprobe': group_index.nprobe,
+            'kmeans_iterations': group_index.kmeans_iterations,
+            'seed': group_index.seed,
+            'trained_size': group_index._trained_size
+        }
+        arrays = {}
+        if group_index.centroids is not None:
+            arrays = {'index_centroids': group_index.centroids, 'index_assignments': group_index.assignments()}
+        return meta, arrays
+    return {'type': 'exact'}, {}
+
+def write_snapshot(directory, state, dtype="float32"):
+    """Write a vocabulary state dict as a new snapshot and switch CURRENT to it"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot-{state['journal_seq']:012d}-{time.time_ns()}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    group_ids = []
+    labels = []
+    activities = []
+    group_embeddings = []
+    for group_id, group in state['activity_groups'].items():
+        group_ids.append(group_id)
+        labels.append(group['label'])
+        activities.append(json.dumps(list(group['activities'])))
+        group_embeddings.append(group['embedding'])
+
+    index_meta, index_arrays = _index_columns(state.get('group_index'), group_ids)
+    if index_meta is not None and group_ids:
+        # Exactly the vectors the index searches, so a loaded index behaves identically
+        embeddings = state['group_index'].vectors()
+    elif group_ids:
+        embeddings = normalize_rows(np.stack(group_embeddings))
+    else:
+        embeddings = np.empty((0, 0), dtype=np.float32)
+    del group_embeddings
+
+    _write_array(path, 'embeddings', np.ascontiguousarray(embeddings, dtype=dtype))
+    _write_array(path, 'group_ids', np.asarray(group_ids, dtype=np.int64))
+    for array_name, array in index_arrays.items():
+        _write_array(path, array_name, array)
+
+    _write_strings(path, 'labels', labels)
+    _write_strings(path, 'activities', activities)
+    activity_keys = sorted((activity.encode("utf-8"), group_id) for activity, group_id in state['activity_to_group'].items())
+    width = max((len(key) for key, _ in activity_keys), default=1)
+    _write_array(path, 'activity_keys', np.array([key for key, _ in activity_keys], dtype=f"S{max(width, 1)}"))
+    _write_array(path, 'activity_key_groups', np.array([group_id for _, group_id in activity_keys], dtype=np.int64))
+    if state.get('seed_state') is not None:
+        _write_file(path, "seed.pkl", lambda f: f.write(state['seed_state']))
+    _write_json(path, 'meta', {
+        'version': SNAPSHOT_VERSION,
+        'next_group_id': state['next_group_id'],
+        'group_index_kind': state.get('group_index_kind'),
+        'group_index': index_meta,
+        'journal_seq': state.get('journal_seq', 0),
+        'seed_seq': state.get('seed_seq') if state.get('seed_state') is not None else None
+    })
+
+    dir_fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    atomic_write(os.path.join(directory, "CURRENT"), lambda f: f.write(name.encode("utf-8")))
+
+def _current_name(directory):
+    try:
+        with open(os.path.join(directory, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def remove_old_snapshots(directory):
+    """Delete every snapshot but the current one (and leftovers of interrupted writes)"""
+    # Only once nothing maps them any more: the kernel keeps deleted files that are still
+    # mapped, so removing them earlier frees no disk space
+    current = _current_name(directory)
+    if current is None:
+        return
+    for entry in os.listdir(directory):
+        if entry.startswith("snapshot-") and entry != current:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+def read_snapshot(directory, mmap=True):
+    """The state dict from the current snapshot, or None if there isn't one"""
+    current = _current_name(directory)
+    if current is None:
+        return None
+    path = os.path.join(directory, current)
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+
+    meta = _read_json(path, 'meta')
+    embeddings = load('embeddings')
+    if embeddings.dtype != np.float32:
+        # float16 snapshots are widened once on load, searches need float32
+        embeddings = embeddings.astype(np.float32)
+    else:
+        # Plain ndarray view of the same mapping, row indexing on np.memmap is much slower
+        embeddings = embeddings.view(np.ndarray)
+
+    def column(name):
+        # Plain ndarray views again, element access on np.memmap goes through its subclass hooks
+        return load(name).view(np.ndarray)
+
+    group_ids = column('group_ids')
+    activity_groups = LazyGroups(
+        group_ids,
+        StringColumn(column('labels'), column('labels_offsets')),
+        StringColumn(column('activities'), column('activities_offsets')),
+        embeddings
+    )
+    activity_to_group = LazyActivityIndex(column('activity_keys'), column('activity_key_groups'))
+    group_ids = group_ids.tolist()
+
+    group_index = None
+    index_meta = meta['group_index']
+    if index_meta is not None:
+        if index_meta['type'] == 'ivf':
+            group_index = IVFGroupIndex(
+                min_train_size=index_meta['min_train_size'],
+                nprobe=index_meta['nprobe'],
+                kmeans_iterations=index_meta['kmeans_iterations'],
+                seed=index_meta['seed']
+            )
+        else:
+            group_index = ExactGroupIndex()
+        group_index.load_arrays(group_ids, embeddings)
+        if index_meta['type'] == 'ivf' and os.path.exists(os.path.join(path, "index_centroids.npy")):
+            group_index.load_clustering(
+                np.load(os.path.join(path, "index_centroids.npy")),
+                np.load(os.path.join(path, "index_assignments.npy")),
+                index_meta['trained_size']
+            )
+
+    seed_state = None
+    if meta.get('seed_seq') is not None:
+        with open(os.path.join(path, "seed.pkl"), 'rb') as f:
+            seed_state = f.read()
+
+    return {
+        'activity_groups': activity_groups,
+        'activity_to_group': activity_to_group,
+        'next_group_id': meta['next_group_id'],
+        'group_index': group_index,
+        'group_index_kind': meta['group_index_kind'],
+        'journal_seq': meta['journal_seq'],
+        'seed_state': seed_state,
+        'seed_seq': meta.get('seed_seq')
+    }
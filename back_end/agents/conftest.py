@@ -0,0 +1,3 @@
+# test_client.py is an agent that drives the running pipeline, not a pytest module.
+# pytest puts this file's directory on sys.path, which is how tests/ imports the agent modules.
+collect_ignore = ["test_client.py"]
@@ -1,6 +1,8 @@
 from uagents import Agent, Context, Model
 from typing import List, Dict, Any, Optional
 
+from pattern_stream import PatternStreams
+
 # Message models
 class PatternAnalysisMessage(Model):
     patterns: List[Dict[str, Any]]
@@ -8,6 +10,12 @@ class PatternAnalysisMessage(Model):
     total_patterns: int
     high_confidence_patterns: int
     is_baseline: bool = False
+    seq: int = 0
+    base_seq: int = 0
+    is_full: bool = True
+    removed: List[str] = []
+    overall_avg_mood: float = 5.0
+    overall_avg_energy: float = 5.0
 
 class UserFeedbackMessage(Model):
     pattern_id: str
@@ -32,6 +40,12 @@ class ImmediatePlannerUpdateMessage(Model):
     patterns_to_focus: List[str]
     updated_patterns: List[Dict[str, Any]]
 
+class PatternResyncRequestMessage(Model):
+    user_id: str
+    stream: str
+    focus_patterns: List[str] = []
+    trigger_reason: str = ""
+
 curator_agent = Agent(
     name="curator_agent",
     seed="curator_seed", 
@@ -157,11 +171,14 @@ class PatternCurator:
         return None, self.current_patterns
 
 pattern_curator = None
+# Each user's patterns, rebuilt from the pattern finder's deltas
+pattern_streams = None
 
 @curator_agent.on_event("startup")
 async def initialize_curator(ctx: Context):
-    global pattern_curator
+    global pattern_curator, pattern_streams
     pattern_curator = PatternCurator()
+    pattern_streams = PatternStreams()
     ctx.logger.info("Pattern Curator initialized")
 
 @curator_agent.on_message(model=PatternAnalysisMessage)
@@ -174,8 +191,15 @@ async def handle_pattern_analysis(ctx: Context, sender: str, msg: PatternAnalysi
         return
     
     try:
+        patterns = pattern_streams.apply(msg)
+        if patterns is None:
+            ctx.logger.warning(f"Missed pattern messages for {msg.user_id} (have seq {pattern_streams.seq(msg.user_id)}, "
+                               f"got a delta on {msg.base_seq}), requesting a resync")
+            await ctx.send(sender, PatternResyncRequestMessage(user_id=msg.user_id, stream="curator"))
+            return
+        
         should_trigger, reasons, affected_patterns = pattern_curator.should_trigger_planner_update(
-            msg.patterns, msg.user_id
+            patterns, msg.user_id
         )
         
         if should_trigger or msg.is_baseline:
@@ -194,13 +218,13 @@ async def handle_pattern_analysis(ctx: Context, sender: str, msg: PatternAnalysi
             await ctx.send("agent1qggee7fyd8fjtm379ggavw3h0uckmgglwnj35e8gte5a4ev4kry3ss788jf", trigger_msg)
             
             # Update our memory
-            pattern_curator.update_memory(msg.patterns)
+            pattern_curator.update_memory(patterns)
             
             ctx.logger.info("Sent planner trigger to pattern_finder")
         else:
             ctx.logger.info("CURATOR DECISION: No significant changes, not triggering planner")
             # Still update memory even if not triggering
-            pattern_curator.update_memory(msg.patterns)
+            pattern_curator.update_memory(patterns)
     
     except Exception as e:
         ctx.logger.error(f"Error in curator: {str(e)}")
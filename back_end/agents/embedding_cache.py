@@ -0,0 +1,138 @@
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+
+class EmbeddingCache:
+    """LRU of activity string -> embedding in front of a SentenceTransformer, with an optional on-disk tier"""
+
+    def __init__(self, model, model_name, max_entries=50_000, disk_dir=None, batch_size=256):
+        self.model = model
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk_keys = {}
+        self._disk_matrix = None
+        self._dim = None
+        self.disk_enabled = bool(disk_dir)
+        if disk_dir:
+            self._open_disk_tier(os.path.join(disk_dir, model_name.replace('/', '_')))
+
+    @staticmethod
+    def normalize(activity):
+        return activity.lower().strip()
+
+    def _open_disk_tier(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self._keys_file = os.path.join(directory, "keys.jsonl")
+        self._matrix_file = os.path.join(directory, "embeddings.f32")
+        self._meta_file = os.path.join(directory, "meta.json")
+
+        if os.path.exists(self._meta_file):
+            with open(self._meta_file) as f:
+                self._dim = json.load(f)['dim']
+
+            keys = []
+            torn = False
+            if os.path.exists(self._keys_file):
+                with open(self._keys_file, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            keys.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            # Torn last line from a crash mid-append
+                            torn = True
+                            break
+
+            # Embeddings are written before their key, so trust whichever file is shorter
+            matrix_rows = os.path.getsize(self._matrix_file) // (4 * self._dim) if os.path.exists(self._matrix_file) else 0
+            rows = min(len(keys), matrix_rows)
+            if torn or rows < len(keys):
+                with open(self._keys_file, 'w', encoding="utf-8") as f:
+                    for key in keys[:rows]:
+                        f.write(json.dumps(key) + "\n")
+
+            self._disk_keys = {key: row for row, key in enumerate(keys[:rows])}
+            self._remap_disk_tier(rows)
+
+    def _remap_disk_tier(self, rows):
+        if rows:
+            self._disk_matrix = np.memmap(self._matrix_file, dtype=np.float32, mode='r', shape=(rows, self._dim))
+        else:
+            self._disk_matrix = None
+
+    def _append_to_disk(self, keys, embeddings):
+        if self._dim is None:
+            self._dim = embeddings.shape[1]
+            with open(self._meta_file, 'w') as f:
+                json.dump({'model': self.model_name, 'dim': self._dim}, f)
+
+        # Drop anything past the last complete row, then append the new rows and their keys
+        rows = len(self._disk_keys)
+        with open(self._matrix_file, 'ab') as f:
+            f.truncate(rows * 4 * self._dim)
+            f.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        with open(self._keys_file, 'a', encoding="utf-8") as f:
+            for key in keys:
+                f.write(json.dumps(key) + "\n")
+
+        for key in keys:
+            self._disk_keys[key] = len(self._disk_keys)
+        self._remap_disk_tier(len(self._disk_keys))
+
+    def _remember(self, key, embedding):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def encode(self, activities):
+        """Embeddings for a list of activity strings, in order"""
+        keys = [self.normalize(activity) for activity in activities]
+        found = {}
+        missing = []
+        for key in keys:
+            if key in found:
+                continue
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[key] = self._entries[key]
+                self.hits += 1
+            elif key in self._disk_keys:
+                found[key] = np.array(self._disk_matrix[self._disk_keys[key]])
+                self._remember(key, found[key])
+                self.disk_hits += 1
+            else:
+                missing.append(key)
+                found[key] = None
+
+        if missing:
+            self.misses += len(missing)
+            embeddings = np.asarray(self.model.encode(missing, batch_size=self.batch_size))
+            for key, embedding in zip(missing, embeddings):
+                found[key] = embedding
+                self._remember(key, embedding)
+            if self.disk_enabled:
+                self._append_to_disk(missing, embeddings)
+
+        return [found[key] for key in keys]
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        memory_bytes = sum(embedding.nbytes for embedding in self._entries.values())
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'memory_mb': memory_bytes / (1024 * 1024),
+            'disk_entries': len(self._disk_keys)
+        }
@@ -0,0 +1,102 @@
+'''
+Accuracy parity (against the fp32 "pytorch" pipeline), latency and memory of the extractor's emotion
+classifier backends over daily_data, each backend in a fresh process.
+
+Usage: python emotion_backend_report.py [--backends pytorch int8 onnx] [--repeat 3] [--output report.json]
+'''
+
+import multiprocessing
+import time
+import numpy as np
+
+from report_utils import report_parser, current_rss_mb, peak_rss_mb, latency_summary, print_table, write_report
+
+def run_backend(backend, repeat):
+    import extractor
+    
+    texts = [entry_text for entry_text, _, _ in extractor.daily_data]
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    classifier = extractor.build_emotion_classifier(backend)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+    
+    # Warm up
+    classifier(texts[0], top_k=None)
+    
+    scores = []
+    latencies = []
+    for _ in range(repeat):
+        scores = []
+        for text in texts:
+            start = time.perf_counter()
+            results = classifier(text, top_k=None)
+            latencies.append((time.perf_counter() - start) * 1000)
+            scores.append({result['label']: result['score'] for result in results})
+    
+    return {
+        'scores': scores,
+        'latencies_ms': latencies,
+        'load_seconds': load_seconds,
+        'model_rss_mb': rss_loaded - rss_before,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def compare(reference_scores, scores):
+    top_agree = 0
+    abs_diffs = []
+    for ref, cur in zip(reference_scores, scores):
+        top_agree += max(ref, key=ref.get) == max(cur, key=cur.get)
+        abs_diffs.extend(abs(ref[label] - cur.get(label, 0.0)) for label in ref)
+    return {
+        'top_label_agreement': top_agree / len(reference_scores),
+        'mean_abs_score_diff': float(np.mean(abs_diffs)),
+        'max_abs_score_diff': float(np.max(abs_diffs))
+    }
+
+def main():
+    parser = report_parser(__doc__)
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "int8", "onnx"])
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus for latency")
+    args = parser.parse_args()
+    
+    backends = ["pytorch"] + [backend for backend in args.backends if backend != "pytorch"]
+    context = multiprocessing.get_context("spawn")
+    
+    runs = {}
+    for backend in backends:
+        print(f"Running {backend}...")
+        with context.Pool(1) as pool:
+            try:
+                runs[backend] = pool.apply(run_backend, (backend, args.repeat))
+            except Exception as e:
+                print(f"  {backend} failed: {e}")
+    
+    if "pytorch" not in runs:
+        print("Reference pytorch backend failed, nothing to compare against")
+        return
+    
+    report = {}
+    for backend, run in runs.items():
+        report[backend] = {
+            'parity': compare(runs['pytorch']['scores'], run['scores']),
+            'latency_ms': latency_summary(run['latencies_ms']),
+            'load_seconds': run['load_seconds'],
+            'model_rss_mb': run['model_rss_mb'],
+            'peak_rss_mb': run['peak_rss_mb']
+        }
+    
+    rows = []
+    for backend, result in report.items():
+        parity = result['parity']
+        latency = result['latency_ms']
+        rows.append([backend, f"{parity['top_label_agreement']:.0%}", f"{parity['mean_abs_score_diff']:.4f}",
+                     f"{parity['max_abs_score_diff']:.4f}", f"{latency['mean']:.1f}", f"{latency['p95']:.1f}",
+                     f"{result['load_seconds']:.1f}", f"{result['model_rss_mb']:.0f}"])
+    print()
+    print_table(["backend", "top-1", "mean |d|", "max |d|", "mean ms", "p95 ms", "load s", "model MB"], rows)
+    
+    write_report(args.output, {'backends': report})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class ExtractionCache:
+    """SQLite LRU of extractor outputs keyed by entry text and extraction settings"""
+
+    def __init__(self, filename, settings, max_entries=100_000):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Anything that changes the output (models and library versions, parameters, seed list) goes into every key
+        self.settings_key = json.dumps(settings, sort_keys=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key BLOB PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.settings_key}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts):
+        """Returns (keywords, emotions) for each cached text, None for misses"""
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in set(keys):
+                row = self._conn.execute("SELECT result FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE extractions SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+
+        results = []
+        for key in keys:
+            if key in found:
+                keywords, emotions = json.loads(found[key])
+                results.append(([tuple(k) for k in keywords], [tuple(e) for e in emotions]))
+            else:
+                results.append(None)
+        # Lookups run on worker threads, so the counters are only touched under the lock
+        with self._lock:
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put_many(self, texts, results, replace=False):
+        """Store results for texts (None results are skipped). replace=True overwrites existing entries"""
+        rows = []
+        now = time.time()
+        for text, result in zip(texts, results):
+            if result is not None:
+                rows.append((self._key(text), json.dumps(result, separators=(",", ":")), now))
+        if not rows:
+            return
+
+        with self._lock:
+            before = self._conn.total_changes
+            if replace:
+                self._conn.executemany("DELETE FROM extractions WHERE key = ?", [(row[0],) for row in rows])
+                self._size -= self._conn.total_changes - before
+                before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO extractions (key, result, last_used) VALUES (?, ?, ?)", rows)
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Drop 10% below the limit so eviction doesn't run on every insert
+        target = int(self.max_entries * 0.9)
+        excess = self._size - target
+        self._conn.execute(
+            "DELETE FROM extractions WHERE key IN "
+            "(SELECT key FROM extractions ORDER BY last_used LIMIT ?)", (excess,)
+        )
+        self._size = target
+        self.evictions += excess
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self._size,
+            'evictions': self.evictions,
+            'file_bytes': os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
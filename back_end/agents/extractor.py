@@ -6,11 +6,93 @@ import logging
 logging.getLogger("transformers").setLevel(logging.WARNING)
 
 from keybert import KeyBERT
+from sentence_transformers import SentenceTransformer
 from transformers import pipeline
 
 from uagents import Agent, Context, Model
 from typing import List, Tuple
+import numpy as np
+import re
+import hashlib
 import asyncio
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+from extraction_cache import ExtractionCache
+from activity_vocabulary import LexicalActivityMatcher
+from keyword_diversity import exact_max_sum, greedy_max_sum
+from micro_batching import MicroBatchQueue
+
+# Number of entries sent through KeyBERT / the emotion pipeline per forward pass
+EXTRACTION_BATCH_SIZE = int(os.environ.get("EXTRACTOR_BATCH_SIZE", "32"))
+
+KEYBERT_MODEL = "all-MiniLM-L6-v2"
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+# Hub revisions (branch, tag or commit) the models are loaded from
+KEYBERT_MODEL_REVISION = os.environ.get("EXTRACTOR_KEYBERT_REVISION", "main")
+EMOTION_MODEL_REVISION = os.environ.get("EXTRACTOR_EMOTION_REVISION", "main")
+
+# Emotion classifier backend:
+#   "pytorch" - the fp32 transformers pipeline
+#   "int8"    - the same model with dynamically quantized int8 Linear layers
+#   "onnx"    - an ONNX Runtime export of the model (needs optimum[onnxruntime])
+EMOTION_BACKEND = os.environ.get("EXTRACTOR_EMOTION_BACKEND", "pytorch")
+
+# Entries longer than this many tokens are split into sentence-aligned windows that are scored
+# together in one batch and averaged (weighted by window length). 510 = the model's full context.
+EMOTION_WINDOW_TOKENS = int(os.environ.get("EXTRACTOR_EMOTION_WINDOW_TOKENS", "510"))
+
+# How the 10 keywords are picked from the 20 best candidates:
+#   "maxsum"        - KeyBERT's brute force Max-Sum Similarity (pure Python over ~185k combinations)
+#   "exact_maxsum"  - the same Max-Sum objective, solved exactly with branch and bound (identical picks)
+#   "greedy_maxsum" - greedy Max-Sum with a swap pass (approximate, no enumeration)
+#   "mmr"           - KeyBERT's Maximal Marginal Relevance
+KEYWORD_DIVERSITY = os.environ.get("EXTRACTOR_KEYWORD_DIVERSITY", "exact_maxsum")
+KEYWORD_TOP_N = 10
+KEYWORD_CANDIDATES = 20
+MMR_DIVERSITY = float(os.environ.get("EXTRACTOR_MMR_DIVERSITY", "0.5"))
+
+# Keyword tiering:
+#   "off"           - always KeyBERT
+#   "lexical_first" - a dictionary pass over seed_keywords + the pattern finder's activity synonyms runs
+#                     first, KeyBERT only runs when it finds fewer than LEXICAL_MIN_ACTIVITIES activities.
+#                     The entries it answers keep the dictionary's keywords: every match scores
+#                     LEXICAL_KEYWORD_SCORE, and seed phrase words like "work" match in most entries
+#   "background"    - same, but dictionary-only entries are re-extracted with KeyBERT in the background:
+#                     the refined keywords replace them in the extraction cache, and the pattern finder
+#                     gets a correction swapping them in for the dictionary's. The default, since entries
+#                     are answered without waiting on KeyBERT and still end up with its keywords
+KEYWORD_TIERING = os.environ.get("EXTRACTOR_KEYWORD_TIERING", "background")
+LEXICAL_MIN_ACTIVITIES = int(os.environ.get("EXTRACTOR_LEXICAL_MIN_ACTIVITIES", "4"))
+# Weight given to dictionary matches (KeyBERT scores are similarities, typically 0.2-0.5)
+LEXICAL_KEYWORD_SCORE = 0.35
+
+# Mean seed-keyword embeddings are cached on disk per (model, seed list)
+SEED_EMBEDDING_CACHE_DIR = "seed_embedding_cache"
+
+# Extraction results are cached on disk by entry text + models + parameters
+EXTRACTION_CACHE_FILE = "extraction_cache.sqlite3"
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get("EXTRACTOR_CACHE_MAX_ENTRIES", "100000"))
+
+# Live entries are collected for up to ENTRY_BATCH_WAIT seconds (or ENTRY_BATCH_MAX_SIZE entries)
+# and extracted together. The queue blocks new entries once ENTRY_QUEUE_MAX_DEPTH are waiting.
+ENTRY_BATCH_MAX_SIZE = int(os.environ.get("EXTRACTOR_ENTRY_BATCH_SIZE", "16"))
+ENTRY_BATCH_WAIT = float(os.environ.get("EXTRACTOR_ENTRY_BATCH_WAIT", "0.05"))
+ENTRY_QUEUE_MAX_DEPTH = int(os.environ.get("EXTRACTOR_ENTRY_QUEUE_DEPTH", "256"))
+
+# Model inference runs in a worker pool so the agent loop keeps accepting messages.
+# "thread" runs on one worker thread sharing the models loaded in this process: the models' fast
+# tokenizer can't be used from two threads at once ("Already borrowed"), and the GIL would keep
+# threads from scaling anyway. "process" workers load their own copy once and split the cores
+# between them, so EXTRACTOR_WORKERS > 1 with "process" is the way to scale with cores.
+INFERENCE_EXECUTOR = os.environ.get("EXTRACTOR_EXECUTOR", "thread")
+REQUESTED_INFERENCE_WORKERS = int(os.environ.get("EXTRACTOR_WORKERS", "1"))
+INFERENCE_WORKERS = REQUESTED_INFERENCE_WORKERS if INFERENCE_EXECUTOR == "process" else 1
+# Seconds startup waits for every process worker to finish loading its models
+WORKER_READY_TIMEOUT = float(os.environ.get("EXTRACTOR_WORKER_READY_TIMEOUT", "600"))
 
 daily_data = [
     # Pattern: Exercise + good mood + high energy
@@ -169,6 +251,15 @@ class BaselineInitMessage(Model):
     total_entries: int
     user_id: str
 
+class ExtractionCorrectionMessage(Model):
+    previous_keywords: List[Tuple[str, float]]
+    keywords: List[Tuple[str, float]]
+    emotions: List[Tuple[str, float]]
+    mood_rating: int
+    energy_rating: int
+    user_id: str
+    entry_text: str
+
 # Define our agent
 extractor_agent = Agent(
     name="extractor_agent",
@@ -182,40 +273,205 @@ kw_model = None
 emotion_classifier = None
 baseline_processed = False
 
-@extractor_agent.on_event("startup")
-async def initialize_models(ctx: Context):
-    global kw_model, emotion_classifier, baseline_processed
-    ctx.logger.info("Initializing KeyBERT and emotion classification models...")
+# Seed list hash -> mean seed embedding
+seed_embedding_cache = {}
+
+# Dictionary matcher for the cheap keyword tier
+lexical_matcher = LexicalActivityMatcher(seed_keywords, stop_words=ENGLISH_STOP_WORDS)
+keyword_tier_metrics = {
+    'lexical_only': 0,
+    'model': 0,
+    'refined': 0
+}
+# Background KeyBERT passes over dictionary-only entries, referenced until they finish
+refinement_tasks = set()
+inference_executor = None
+extraction_cache = None
+# Set in each process pool worker by init_inference_worker
+worker_barrier = None
+
+# Live entry micro-batching
+entry_queue = None
+entry_batch_task = None
+
+def load_models():
+    """Load both models into this process (also run by each process pool worker on startup)"""
+    global kw_model, emotion_classifier
     
     # Init keyword model
-    kw_model = KeyBERT()
+    kw_model = KeyBERT(model=SentenceTransformer(KEYBERT_MODEL, revision=KEYBERT_MODEL_REVISION))
+    get_seed_embedding(seed_keywords)
     
     # Init sentiment analysis model
-    emotion_classifier = pipeline(
-        "text-classification", 
-        model="j-hartmann/emotion-english-distilroberta-base"
-    )
+    emotion_classifier = build_emotion_classifier(EMOTION_BACKEND)
+
+def build_emotion_classifier(backend):
+    if backend == "pytorch":
+        return pipeline(
+            "text-classification", 
+            model=EMOTION_MODEL,
+            revision=EMOTION_MODEL_REVISION
+        )
+    
+    if backend == "int8":
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        
+        model = AutoModelForSequenceClassification.from_pretrained(EMOTION_MODEL, revision=EMOTION_MODEL_REVISION)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline(
+            "text-classification",
+            model=model,
+            tokenizer=AutoTokenizer.from_pretrained(EMOTION_MODEL, revision=EMOTION_MODEL_REVISION)
+        )
+    
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError:
+            raise ImportError("The onnx emotion backend needs optimum[onnxruntime] installed")
+        from transformers import AutoTokenizer
+        
+        model = ORTModelForSequenceClassification.from_pretrained(EMOTION_MODEL, revision=EMOTION_MODEL_REVISION, export=True)
+        return pipeline(
+            "text-classification",
+            model=model,
+            tokenizer=AutoTokenizer.from_pretrained(EMOTION_MODEL, revision=EMOTION_MODEL_REVISION)
+        )
+    
+    raise ValueError(f"Unknown EXTRACTOR_EMOTION_BACKEND '{backend}', expected 'pytorch', 'int8' or 'onnx'")
+
+def model_versions():
+    """Library versions and the exact model revisions loaded in this inference worker"""
+    from importlib.metadata import version, PackageNotFoundError
+    
+    def package_version(package):
+        try:
+            return version(package)
+        except PackageNotFoundError:
+            return None
+    
+    # The int8 backend is quantized at load time, so torch's version identifies its weights too
+    packages = ["keybert", "sentence-transformers", "transformers", "torch"]
+    if EMOTION_BACKEND == "onnx":
+        packages += ["optimum", "onnxruntime"]
+    versions = {package: package_version(package) for package in packages}
+    
+    # Commit the revision resolved to when the model was downloaded (transformers records it on load)
+    versions['keybert_commit'] = keybert_commit()
+    versions['emotion_commit'] = getattr(emotion_classifier.model.config, "_commit_hash", None) or EMOTION_MODEL_REVISION
+    
+    if EMOTION_BACKEND == "onnx":
+        # The exported graph itself, so a different export of the same revision is a different model
+        model_path = getattr(emotion_classifier.model, "model_path", None)
+        if model_path is not None and os.path.exists(model_path):
+            digest = hashlib.sha256()
+            with open(model_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            versions['emotion_onnx_sha256'] = digest.hexdigest()
+    return versions
+
+def keybert_commit():
+    keybert_config = kw_model.model.embedding_model[0].auto_model.config
+    return getattr(keybert_config, "_commit_hash", None) or KEYBERT_MODEL_REVISION
+
+def init_inference_worker(barrier):
+    """Process pool worker initializer: this worker's share of the cores, then the models"""
+    global worker_barrier
+    import torch
+    # Otherwise every worker runs torch with one intra-op thread per core and they oversubscribe
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS))
+    load_models()
+    worker_barrier = barrier
+
+def worker_ready():
+    """Warm-up task: holds this worker until every worker has loaded its models"""
+    # A worker blocked here can't pick up a second warm-up task, so each one lands on a different worker
+    worker_barrier.wait(timeout=WORKER_READY_TIMEOUT)
+    return os.getpid()
+
+def create_inference_executor():
+    if INFERENCE_EXECUTOR == "process":
+        # Spawn rather than fork so workers don't inherit the agent's threads and sockets
+        mp_context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(
+            max_workers=INFERENCE_WORKERS,
+            mp_context=mp_context,
+            initializer=init_inference_worker,
+            initargs=(mp_context.Barrier(INFERENCE_WORKERS),)
+        )
+    if INFERENCE_EXECUTOR != "thread":
+        raise ValueError(f"Unknown EXTRACTOR_EXECUTOR '{INFERENCE_EXECUTOR}', expected 'thread' or 'process'")
+    load_models()
+    return ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="extractor-inference")
+
+@extractor_agent.on_event("startup")
+async def initialize_models(ctx: Context):
+    global inference_executor, extraction_cache, entry_queue, entry_batch_task
+    ctx.logger.info(f"Initializing KeyBERT and emotion classification models ({INFERENCE_WORKERS} {INFERENCE_EXECUTOR} worker(s))...")
+    if INFERENCE_WORKERS != REQUESTED_INFERENCE_WORKERS:
+        ctx.logger.warning(f"EXTRACTOR_WORKERS={REQUESTED_INFERENCE_WORKERS} ignored, the thread executor has one worker; "
+                           f"use EXTRACTOR_EXECUTOR=process to run several")
+    
+    inference_executor = create_inference_executor()
+    loop = asyncio.get_running_loop()
+    
+    if INFERENCE_EXECUTOR == "process":
+        # Make every worker load its models now instead of on the first entry
+        ready_pids = await asyncio.gather(*[
+            loop.run_in_executor(inference_executor, worker_ready)
+            for _ in range(INFERENCE_WORKERS)
+        ])
+        ctx.logger.info(f"{len(set(ready_pids))} inference worker(s) ready")
     
     ctx.logger.info("Models initialized successfully!")
     
+    # Asked of a worker, in process mode the models only live there
+    versions = await loop.run_in_executor(inference_executor, model_versions)
+    extraction_cache = ExtractionCache(EXTRACTION_CACHE_FILE, extraction_settings(versions),
+                                       max_entries=EXTRACTION_CACHE_MAX_ENTRIES)
+    ctx.logger.info(f"Extraction cache: {extraction_cache.stats()['entries']} cached entries")
+    
+    # Start collecting live entries into micro-batches
+    entry_queue = MicroBatchQueue(ENTRY_BATCH_MAX_SIZE, ENTRY_BATCH_WAIT, ENTRY_QUEUE_MAX_DEPTH)
+    entry_batch_task = asyncio.create_task(entry_batch_worker())
+    
     # Process baseline data after model initialization
     ctx.logger.info("Starting baseline data processing...")
     await process_baseline_data(ctx)
 
+@extractor_agent.on_event("shutdown")
+async def close_extraction_cache(ctx: Context):
+    if extraction_cache is not None:
+        extraction_cache.close()
+
 async def process_baseline_data(ctx: Context):
     global baseline_processed
     
     ctx.logger.info(f"Processing {len(daily_data)} baseline entries...")
     baseline_extractions = []
     
-    # Process all baseline entries first
-    for i, (entry_text, mood_rating, energy_rating) in enumerate(daily_data):
-        ctx.logger.info(f"Processing baseline entry {i+1}/{len(daily_data)}")
+    # Process baseline entries in batches so the models see lists of documents
+    start_time = time.perf_counter()
+    for batch_start in range(0, len(daily_data), EXTRACTION_BATCH_SIZE):
+        batch = daily_data[batch_start:batch_start + EXTRACTION_BATCH_SIZE]
+        ctx.logger.info(f"Processing baseline entries {batch_start+1}-{batch_start+len(batch)}/{len(daily_data)}")
         
-        try:
-            # Extract keywords and emotions
-            keywords = get_daily_keywords(entry_text)
-            emotions = get_top_emotions(entry_text)
+        texts = [entry_text for entry_text, _, _ in batch]
+        batch_results, refinable = await extract_entry_batch(ctx, texts, first_entry_number=batch_start+1)
+        if refinable:
+            # The baseline goes out in one message at the end, so it waits for KeyBERT here instead
+            refine_texts = list(dict.fromkeys(text for text in texts if text in refinable))
+            refined = await refine_keywords(ctx, refine_texts, [batch_results[texts.index(text)] for text in refine_texts])
+            if refined is not None:
+                refined_by_text = dict(zip(refine_texts, refined))
+                batch_results = [refined_by_text.get(text, result) for text, result in zip(texts, batch_results)]
+        
+        for (entry_text, mood_rating, energy_rating), result in zip(batch, batch_results):
+            if result is None:
+                continue
+            keywords, emotions = result
             
             # Create extracted data message
             extracted_data = ExtractedDataMessage(
@@ -228,13 +484,15 @@ async def process_baseline_data(ctx: Context):
             )
             
             baseline_extractions.append(extracted_data)
-            
-            # Small delay to prevent overloading
-            await asyncio.sleep(0.05)
-            
-        except Exception as e:
-            ctx.logger.error(f"Error processing baseline entry {i+1}: {str(e)}")
-    
+        
+        # Yield to the event loop between batches
+        await asyncio.sleep(0)
+    
+    elapsed = time.perf_counter() - start_time
+    entries_per_sec = len(baseline_extractions) / elapsed if elapsed > 0 else 0.0
+    ctx.logger.info(f"Baseline extraction took {elapsed:.2f}s ({entries_per_sec:.1f} entries/sec, batch size {EXTRACTION_BATCH_SIZE})")
+    ctx.logger.info(f"Extraction cache: {extraction_cache.stats()}")
+    ctx.logger.info(f"Keyword tiers: {keyword_tier_metrics}")
     ctx.logger.info(f"Completed processing all {len(baseline_extractions)} baseline entries")
     
     # Now send all baseline data at once to pattern finder
@@ -255,50 +513,409 @@ async def process_baseline_data(ctx: Context):
         ctx.logger.error(f"Error sending baseline data: {str(e)}")
 
 def get_daily_keywords(doc, seed_keywords_list=None):
+    return get_daily_keywords_batch([doc], seed_keywords_list)[0]
+
+def get_seed_embedding(seed_keywords_list):
+    """Mean embedding of a seed keyword list, computed once per list and cached on disk"""
+    seed_hash = hashlib.sha1("\n".join(seed_keywords_list).encode("utf-8")).hexdigest()
+    if seed_hash in seed_embedding_cache:
+        return seed_embedding_cache[seed_hash]
+    
+    # Keyed on the model commit too, so another revision of the same model doesn't reuse the embedding
+    model_key = f"{KEYBERT_MODEL}@{keybert_commit()}".replace('/', '_')
+    cache_file = os.path.join(SEED_EMBEDDING_CACHE_DIR, f"{model_key}_{seed_hash}.npy")
+    try:
+        seed_embedding = np.load(cache_file)
+    except (FileNotFoundError, ValueError):
+        seed_embedding = kw_model.model.embed(seed_keywords_list).mean(axis=0, keepdims=True)
+        try:
+            os.makedirs(SEED_EMBEDDING_CACHE_DIR, exist_ok=True)
+            # Write then rename so concurrent workers never read a half-written file
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                np.save(f, seed_embedding)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+    
+    seed_embedding_cache[seed_hash] = seed_embedding
+    return seed_embedding
+
+def get_doc_embeddings(docs, seed_keywords_list):
+    """Document embeddings pulled towards the seed keywords, the same way KeyBERT's seed_keywords does"""
+    doc_embeddings = kw_model.model.embed(docs)
+    return (doc_embeddings * 3 + get_seed_embedding(seed_keywords_list)) / 4
+
+def get_daily_keywords_batch(docs, seed_keywords_list=None, diversity=None):
+    """Extract keywords for a list of documents, embedding them in a single pass"""
     if seed_keywords_list is None:
         seed_keywords_list = seed_keywords
-    return kw_model.extract_keywords(doc, keyphrase_ngram_range=(1,1), stop_words='english',
-                                use_maxsum=True, nr_candidates=20, top_n=10, seed_keywords=seed_keywords_list)
+    if diversity is None:
+        diversity = KEYWORD_DIVERSITY
+    
+    # Seeding is applied here with the cached seed embedding, so KeyBERT gets no seed_keywords
+    doc_embeddings = get_doc_embeddings(docs, seed_keywords_list)
+    
+    if diversity == "maxsum":
+        keywords = kw_model.extract_keywords(docs, keyphrase_ngram_range=(1,1), stop_words='english',
+                                    use_maxsum=True, nr_candidates=KEYWORD_CANDIDATES, top_n=KEYWORD_TOP_N,
+                                    doc_embeddings=doc_embeddings)
+    elif diversity == "mmr":
+        keywords = kw_model.extract_keywords(docs, keyphrase_ngram_range=(1,1), stop_words='english',
+                                    use_mmr=True, diversity=MMR_DIVERSITY, top_n=KEYWORD_TOP_N,
+                                    doc_embeddings=doc_embeddings)
+    elif diversity in ("exact_maxsum", "greedy_maxsum"):
+        # Let KeyBERT rank the candidates, then run the Max-Sum selection ourselves
+        candidates = kw_model.extract_keywords(docs, keyphrase_ngram_range=(1,1), stop_words='english',
+                                    top_n=KEYWORD_CANDIDATES, doc_embeddings=doc_embeddings)
+        if len(docs) == 1:
+            candidates = [candidates]
+        return select_max_sum_keywords(candidates, greedy=(diversity == "greedy_maxsum"))
+    else:
+        raise ValueError(f"Unknown keyword diversity engine '{diversity}'")
+    
+    # KeyBERT returns a flat list (not a list of lists) for a single document
+    if len(docs) == 1:
+        return [keywords]
+    return keywords
 
-def get_top_emotions(text, top_n=1):
-    results = emotion_classifier(text, top_k=None)
+def select_max_sum_keywords(docs_candidates, top_n=KEYWORD_TOP_N, greedy=False):
+    """Pick the top_n least similar of each document's ranked candidates (KeyBERT's Max-Sum)"""
+    words = sorted({word for candidates in docs_candidates for word, _ in candidates})
+    if not words:
+        return [[] for _ in docs_candidates]
+    
+    # Embed every candidate word of the batch once
+    word_embeddings = np.asarray(kw_model.model.embed(words), dtype=np.float64)
+    word_embeddings /= np.linalg.norm(word_embeddings, axis=1, keepdims=True)
+    word_index = {word: i for i, word in enumerate(words)}
+    
+    results = []
+    for candidates in docs_candidates:
+        # KeyBERT ranks max-sum candidates by ascending similarity to the document
+        candidates = candidates[::-1]
+        if len(candidates) < top_n:
+            # Like KeyBERT, which returns nothing when there are fewer words than keywords asked for
+            results.append([])
+            continue
+        if len(candidates) == top_n:
+            results.append(candidates)
+            continue
+        
+        embeddings = word_embeddings[[word_index[word] for word, _ in candidates]]
+        similarities = embeddings @ embeddings.T
+        
+        if greedy:
+            chosen = greedy_max_sum(similarities, top_n)
+        else:
+            chosen = exact_max_sum(similarities, top_n)
+        results.append([candidates[i] for i in chosen])
+    return results
+
+def _select_top_emotions(results, top_n):
     top_emotions = sorted(results, key=lambda x: x['score'], reverse=True)[:top_n]
     return [(emotion['label'], emotion['score']) for emotion in top_emotions]
 
+def get_top_emotions(text, top_n=1):
+    return get_top_emotions_batch([text], top_n)[0]
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def _token_chunks(tokenizer, texts, max_tokens):
+    """Cut texts longer than max_tokens at token boundaries, returns (chunk_text, token_count) pairs"""
+    offsets = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    chunks = []
+    for text, text_offsets in zip(texts, offsets):
+        if len(text_offsets) <= max_tokens:
+            chunks.append((text, len(text_offsets)))
+            continue
+        for start in range(0, len(text_offsets), max_tokens):
+            chunk = text_offsets[start:start + max_tokens]
+            chunks.append((text[chunk[0][0]:chunk[-1][1]], len(chunk)))
+    return chunks
+
+def split_into_windows(text, max_tokens=EMOTION_WINDOW_TOKENS):
+    """Split text into (window_text, token_count) pairs that each fit the emotion model whole"""
+    tokenizer = emotion_classifier.tokenizer
+    # Leave room for the special tokens so the classifier never has to truncate a window
+    max_tokens = min(max_tokens, tokenizer.model_max_length - tokenizer.num_special_tokens_to_add())
+    
+    # Every token covers at least one byte, so short texts can skip tokenization entirely
+    if len(text.encode("utf-8")) <= max_tokens:
+        return [(text, 1)]
+    
+    if len(tokenizer(text, add_special_tokens=False)['input_ids']) <= max_tokens:
+        return [(text, 1)]
+    
+    # Sentences longer than max_tokens are cut at token boundaries
+    sentences = [sentence for sentence in _SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+    pieces = _token_chunks(tokenizer, sentences, max_tokens)
+    
+    windows = []
+    current, current_tokens = [], 0
+    for piece, length in pieces:
+        if current and current_tokens + length > max_tokens:
+            windows.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += length
+    if current:
+        windows.append(" ".join(current))
+    
+    # Joined pieces can tokenize differently at the seams, so recount the windows themselves and
+    # cut any that came out too long (each cut piece is shorter text, so this ends)
+    checked = _token_chunks(tokenizer, windows, max_tokens)
+    while len(checked) != len(windows):
+        windows = [window for window, _ in checked]
+        checked = _token_chunks(tokenizer, windows, max_tokens)
+    return checked
+
+def get_top_emotions_batch(texts, top_n=1):
+    """Score texts with the emotion classifier, long texts window by window"""
+    windows, owners, weights = [], [], []
+    for i, text in enumerate(texts):
+        for window_text, token_count in split_into_windows(text):
+            windows.append(window_text)
+            owners.append(i)
+            weights.append(token_count)
+    
+    # split_into_windows checked every window fits, so nothing is truncated here
+    results = emotion_classifier(windows, top_k=None, batch_size=EXTRACTION_BATCH_SIZE)
+    
+    window_results = [[] for _ in texts]
+    for owner, weight, scores in zip(owners, weights, results):
+        window_results[owner].append((weight, scores))
+    
+    top_emotions = []
+    for text_windows in window_results:
+        if len(text_windows) == 1:
+            top_emotions.append(_select_top_emotions(text_windows[0][1], top_n))
+            continue
+        
+        total_weight = sum(weight for weight, _ in text_windows)
+        label_scores = {}
+        for weight, scores in text_windows:
+            for emotion in scores:
+                label_scores[emotion['label']] = label_scores.get(emotion['label'], 0.0) + emotion['score'] * weight
+        averaged = [{'label': label, 'score': score / total_weight} for label, score in label_scores.items()]
+        top_emotions.append(_select_top_emotions(averaged, top_n))
+    return top_emotions
+
+def get_daily_keywords_tiered(docs):
+    """Returns (keywords per doc, indices of the docs answered by the dictionary alone)"""
+    if KEYWORD_TIERING == "off":
+        return get_daily_keywords_batch(docs), []
+    
+    keywords = [lexical_matcher.match(doc, LEXICAL_KEYWORD_SCORE, KEYWORD_TOP_N) for doc in docs]
+    lexical_only = [i for i, doc_keywords in enumerate(keywords) if len(doc_keywords) >= LEXICAL_MIN_ACTIVITIES]
+    
+    needs_model = [i for i, doc_keywords in enumerate(keywords) if len(doc_keywords) < LEXICAL_MIN_ACTIVITIES]
+    if needs_model:
+        model_keywords = get_daily_keywords_batch([docs[i] for i in needs_model])
+        for i, doc_keywords in zip(needs_model, model_keywords):
+            keywords[i] = doc_keywords
+    return keywords, lexical_only
+
+def extract_texts(texts):
+    """Run both models over texts in an inference worker, returns (results, errors, lexical_only)"""
+    try:
+        batch_keywords, lexical_only = get_daily_keywords_tiered(texts)
+        batch_emotions = get_top_emotions_batch(texts)
+        return list(zip(batch_keywords, batch_emotions)), [], lexical_only
+    except Exception as e:
+        # Fall back to one entry at a time so a single bad entry only skips itself
+        errors = [(None, str(e))]
+    
+    results = []
+    lexical_only = []
+    for i, text in enumerate(texts):
+        try:
+            (keywords,), lexical = get_daily_keywords_tiered([text])
+            results.append((keywords, get_top_emotions(text)))
+            if lexical:
+                lexical_only.append(i)
+        except Exception as e:
+            errors.append((i, str(e)))
+            results.append(None)
+    return results, errors, lexical_only
+
+def extraction_settings(versions):
+    """Everything besides the entry text that changes extraction output (used in the cache key)"""
+    settings = {
+        'keybert_model': KEYBERT_MODEL,
+        'emotion_model': EMOTION_MODEL,
+        'emotion_backend': EMOTION_BACKEND,
+        'versions': versions,
+        'emotion_window_tokens': EMOTION_WINDOW_TOKENS,
+        'keyword_diversity': KEYWORD_DIVERSITY,
+        'keyword_top_n': KEYWORD_TOP_N,
+        'keyword_candidates': KEYWORD_CANDIDATES,
+        'mmr_diversity': MMR_DIVERSITY,
+        'seed_keywords': hashlib.sha1("\n".join(seed_keywords).encode("utf-8")).hexdigest(),
+        'emotion_top_n': 1,
+        'keyword_tiering': KEYWORD_TIERING
+    }
+    if KEYWORD_TIERING != "off":
+        # The dictionary tier only changes output when it runs, so editing the synonyms
+        # doesn't invalidate results extracted without it
+        settings.update({
+            # Seed keywords plus the activity synonyms, after filtering
+            'lexical_vocabulary': lexical_matcher.fingerprint(),
+            'lexical_min_activities': LEXICAL_MIN_ACTIVITIES,
+            'lexical_keyword_score': LEXICAL_KEYWORD_SCORE
+        })
+    return settings
+
+async def extract_entry_batch(ctx: Context, texts, first_entry_number=1):
+    """Await extraction of texts on the inference executor, skipping cached texts: (results, texts to refine)"""
+    # SQLite reads and writes block, so they run on a worker thread instead of the event loop
+    results = await asyncio.to_thread(extraction_cache.get_many, texts)
+    
+    # Only run the models on texts we haven't seen (once each, even if repeated in the batch)
+    missing_texts = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+    if not missing_texts:
+        return results, set()
+    
+    loop = asyncio.get_running_loop()
+    computed, errors, lexical_only = await loop.run_in_executor(inference_executor, extract_texts, missing_texts)
+    await asyncio.to_thread(extraction_cache.put_many, missing_texts, computed)
+    
+    keyword_tier_metrics['lexical_only'] += len(lexical_only)
+    keyword_tier_metrics['model'] += len(missing_texts) - len(lexical_only)
+    refinable = {missing_texts[i] for i in lexical_only} if KEYWORD_TIERING == "background" else set()
+    
+    computed_by_text = dict(zip(missing_texts, computed))
+    results = [computed_by_text[text] if result is None else result for text, result in zip(texts, results)]
+    
+    for index, error in errors:
+        if index is None:
+            ctx.logger.error(f"Error processing batch at entry {first_entry_number}: {error}")
+        else:
+            ctx.logger.error(f"Error processing entry {first_entry_number + texts.index(missing_texts[index])}: {error}")
+    return results, refinable
+
+async def refine_keywords(ctx: Context, texts, results):
+    """Re-extract dictionary-only entries with KeyBERT and update the cache, returns the refined results"""
+    try:
+        loop = asyncio.get_running_loop()
+        refined_keywords = await loop.run_in_executor(inference_executor, get_daily_keywords_batch, texts)
+        refined = [(keywords, emotions) for keywords, (_, emotions) in zip(refined_keywords, results)]
+        await asyncio.to_thread(extraction_cache.put_many, texts, refined, replace=True)
+        keyword_tier_metrics['refined'] += len(texts)
+        return refined
+    except Exception as e:
+        ctx.logger.error(f"Error refining keywords: {str(e)}")
+        return None
+
+async def send_refinements(entries):
+    """Background pass over sent dictionary-only entries: correct the ones whose KeyBERT keywords differ"""
+    texts = list(dict.fromkeys(msg.entry_text for _, msg, _ in entries))
+    results = {msg.entry_text: result for _, msg, result in entries}
+    refined = await refine_keywords(entries[0][0], texts, [results[text] for text in texts])
+    if refined is None:
+        return
+    refined_by_text = dict(zip(texts, refined))
+    
+    for ctx, msg, (keywords, emotions) in entries:
+        refined_keywords, _ = refined_by_text[msg.entry_text]
+        if refined_keywords == keywords:
+            continue
+        try:
+            correction = ExtractionCorrectionMessage(
+                previous_keywords=keywords,
+                keywords=refined_keywords,
+                emotions=emotions,
+                mood_rating=msg.mood_rating,
+                energy_rating=msg.energy_rating,
+                user_id=msg.user_id,
+                entry_text=msg.entry_text
+            )
+            await ctx.send("agent1qggee7fyd8fjtm379ggavw3h0uckmgglwnj35e8gte5a4ev4kry3ss788jf", correction)
+            ctx.logger.info("Sent refined keywords to pattern finder")
+        except Exception as e:
+            ctx.logger.error(f"Error sending keyword correction: {str(e)}")
+
 @extractor_agent.on_message(model=DailyEntryMessage)
 async def handle_daily_entry(ctx: Context, sender: str, msg: DailyEntryMessage):
-    ctx.logger.info(f"Processing NEW daily entry from {sender}")
+    ctx.logger.info(f"Queueing NEW daily entry from {sender}")
     
-    if kw_model is None or emotion_classifier is None:
+    if entry_queue is None:
         ctx.logger.error("Models not initialized yet!")
         return
         
     if not baseline_processed:
         ctx.logger.warning("Baseline not processed yet, but processing new entry anyway...")
     
+    await entry_queue.put(ctx, msg)
+
+async def entry_batch_worker():
+    """Collect queued entries into micro-batches and extract each batch in one pass"""
+    # Keep at most one batch in flight per inference worker
+    worker_slots = asyncio.Semaphore(INFERENCE_WORKERS)
+    in_flight = set()
+    
+    while True:
+        batch = await entry_queue.next_batch()
+        await worker_slots.acquire()
+        task = asyncio.create_task(run_entry_batch(batch, worker_slots))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+async def run_entry_batch(batch, worker_slots):
     try:
-        # Extract keywords and emotions
-        keywords = get_daily_keywords(msg.entry_text)
-        emotions = get_top_emotions(msg.entry_text)
+        await process_entry_batch(batch)
+    except Exception as e:
+        batch[0][0].logger.error(f"Error processing entry batch: {str(e)}")
+    finally:
+        worker_slots.release()
+
+async def process_entry_batch(batch):
+    first_ctx = batch[0][0]
+    wait_ms = entry_queue.record_batch(batch)
+    
+    first_ctx.logger.info(
+        f"Extracting batch of {len(batch)} entries "
+        f"(waited {wait_ms:.1f}ms, queue depth {entry_queue.metrics['queue_depth']})"
+    )
+    
+    results, refinable = await extract_entry_batch(first_ctx, [msg.entry_text for _, msg, _ in batch])
+    
+    cache_stats = extraction_cache.stats()
+    first_ctx.logger.info(f"Extraction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    
+    # Fan the results back out, replying through each entry's own context
+    for (ctx, msg, _), result in zip(batch, results):
+        if result is None:
+            continue
+        keywords, emotions = result
         
         ctx.logger.info(f"Extracted {len(keywords)} keywords and {len(emotions)} emotions for new entry")
         
-        # Create response message
-        extracted_data = ExtractedDataMessage(
-            keywords=keywords,
-            emotions=emotions,
-            mood_rating=msg.mood_rating,
-            energy_rating=msg.energy_rating,
-            user_id=msg.user_id,
-            entry_text=msg.entry_text
-        )
-        
-        # Send to pattern finder agent
-        await ctx.send("agent1qggee7fyd8fjtm379ggavw3h0uckmgglwnj35e8gte5a4ev4kry3ss788jf", extracted_data)
-        ctx.logger.info("Sent NEW entry extracted data to pattern finder")
-        
-    except Exception as e:
-        ctx.logger.error(f"Error processing daily entry: {str(e)}")
+        try:
+            # Create response message
+            extracted_data = ExtractedDataMessage(
+                keywords=keywords,
+                emotions=emotions,
+                mood_rating=msg.mood_rating,
+                energy_rating=msg.energy_rating,
+                user_id=msg.user_id,
+                entry_text=msg.entry_text
+            )
+            
+            # Send to pattern finder agent
+            await ctx.send("agent1qggee7fyd8fjtm379ggavw3h0uckmgglwnj35e8gte5a4ev4kry3ss788jf", extracted_data)
+            ctx.logger.info("Sent NEW entry extracted data to pattern finder")
+            
+        except Exception as e:
+            ctx.logger.error(f"Error processing daily entry: {str(e)}")
+    
+    # Started only now, so a correction can't reach the pattern finder ahead of its entry
+    refine_entries = [(ctx, msg, result) for (ctx, msg, _), result in zip(batch, results)
+                      if result is not None and msg.entry_text in refinable]
+    if refine_entries:
+        task = asyncio.create_task(send_refinements(refine_entries))
+        refinement_tasks.add(task)
+        task.add_done_callback(refinement_tasks.discard)
 
 if __name__ == "__main__":
     extractor_agent.run()
\ No newline at end of file
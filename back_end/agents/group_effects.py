@@ -0,0 +1,223 @@
+import numpy as np
+
+from running_stats import RunningMedian
+
+class GroupEffects:
+    """One user's outcome statistics per activity group as parallel NumPy arrays, one row per group"""
+
+    def __init__(self, labels=(), initial_capacity=64, initial_label_capacity=8):
+        self.labels = []
+        self._columns = {}
+        self.size = 0
+        self.mood = np.full((initial_capacity, initial_label_capacity), np.nan)
+        self.energy = np.full((initial_capacity, initial_label_capacity), np.nan)
+        self.confidence = np.zeros(initial_capacity)
+        self.observation_count = np.zeros(initial_capacity)
+        # When each row first got a value under each label, so ties go to the label the group saw first
+        self.first_seen = np.zeros((initial_capacity, initial_label_capacity), dtype=np.int64)
+        self.next_rank = 0
+        self.mood_median = RunningMedian()
+        self.energy_median = RunningMedian()
+        for label in labels:
+            self.column(label)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, rows, columns):
+        old_rows, old_columns = self.mood.shape
+        if rows <= old_rows and columns <= old_columns:
+            return
+        new_rows = max(rows, old_rows * 2 if rows > old_rows else old_rows)
+        new_columns = max(columns, old_columns * 2 if columns > old_columns else old_columns)
+        for name in ('mood', 'energy'):
+            grown = np.full((new_rows, new_columns), np.nan)
+            grown[:old_rows, :old_columns] = getattr(self, name)
+            setattr(self, name, grown)
+        grown = np.zeros((new_rows, new_columns), dtype=np.int64)
+        grown[:old_rows, :old_columns] = self.first_seen
+        self.first_seen = grown
+        for name in ('confidence', 'observation_count'):
+            grown = np.zeros(new_rows)
+            grown[:old_rows] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def column(self, label):
+        if label not in self._columns:
+            self._grow(len(self.mood), len(self.labels) + 1)
+            self._columns[label] = len(self.labels)
+            self.labels.append(label)
+        return self._columns[label]
+
+    def add_group(self, row):
+        # Rows are appended in the order the owner first touches each group (its group_rows maps
+        # shared group ids to them)
+        if row != self.size:
+            raise ValueError(f"Expected row {self.size}, got {row}")
+        self._grow(self.size + 1, len(self.labels))
+        self.size += 1
+
+    def observe(self, rows, weights, label, mood_rating, energy_rating):
+        """Fold one entry's ratings into its groups' rows"""
+        groups, inverse = np.unique(np.asarray(rows, dtype=np.int64), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.asarray(weights, dtype=np.float64))
+        column = self.column(label)
+
+        old_count = self.observation_count[groups]
+        new_count = old_count + weights
+        unseen = groups[np.isnan(self.mood[groups, column])]
+        self.first_seen[unseen, column] = self.next_rank
+        self.next_rank += 1
+        for values, rating, running_median in ((self.mood, mood_rating, self.mood_median),
+                                               (self.energy, energy_rating, self.energy_median)):
+            current = values[groups, column]
+            existed = ~np.isnan(current)
+            updated = (np.where(existed, current, 0.0) * old_count + rating * weights) / new_count
+            values[groups, column] = updated
+            for old_value, new_value, was_set in zip(current.tolist(), updated.tolist(), existed.tolist()):
+                if was_set:
+                    running_median.replace(old_value, new_value)
+                else:
+                    running_median.add(new_value)
+
+        self.confidence[groups] = np.minimum(1.0, new_count / 5.0)
+        self.observation_count[groups] = new_count
+
+    def retract(self, rows, weights, label, mood_rating, energy_rating):
+        """Undo observe() with the same arguments"""
+        column = self._columns.get(label)
+        if column is None:
+            return
+        groups, inverse = np.unique(np.asarray(rows, dtype=np.int64), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.asarray(weights, dtype=np.float64))
+
+        old_count = self.observation_count[groups]
+        new_count = np.maximum(old_count - weights, 0.0)
+        divisor = np.where(new_count > 0.0, new_count, 1.0)
+        for values, rating, running_median in ((self.mood, mood_rating, self.mood_median),
+                                               (self.energy, energy_rating, self.energy_median)):
+            current = values[groups, column]
+            total = current * old_count
+            # Ratings are positive, so a label whose weighted total drops to zero has nothing left
+            # under it and goes back to having no value
+            emptied = np.isclose(total, rating * weights, rtol=1e-9, atol=1e-12) | (new_count <= 0.0)
+            updated = np.where(emptied, np.nan, (total - rating * weights) / divisor)
+            existed = ~np.isnan(current)
+            values[groups, column] = np.where(existed, updated, current)
+            self.first_seen[groups[existed & emptied], column] = 0
+            for old_value, new_value, was_set in zip(current.tolist(), updated.tolist(), existed.tolist()):
+                if not was_set:
+                    continue
+                if np.isnan(new_value):
+                    running_median.remove(old_value)
+                else:
+                    running_median.replace(old_value, new_value)
+
+        self.confidence[groups] = np.minimum(1.0, new_count / 5.0)
+        self.observation_count[groups] = new_count
+
+    def adjust_confidence(self, row, adjustment):
+        """Returns (old, new) confidence"""
+        old_confidence = float(self.confidence[row])
+        new_confidence = max(0.0, min(1.0, old_confidence + adjustment))
+        self.confidence[row] = new_confidence
+        return old_confidence, new_confidence
+
+    def dominant_effects(self, rows):
+        """Per row: whether it's a pattern, and its strongest label column, mood and energy"""
+        groups = np.asarray(rows, dtype=np.int64)
+        if not self.labels:
+            nothing = np.zeros(len(groups))
+            return np.zeros(len(groups), dtype=bool), nothing.astype(np.int64), nothing, nothing
+        mood = self.mood[groups, :len(self.labels)]
+        energy = self.energy[groups, :len(self.labels)]
+        mood_missing = np.isnan(mood)
+        energy_missing = np.isnan(energy)
+
+        is_pattern = (self.observation_count[groups] >= 1.5) & ~mood_missing.all(axis=1) & ~energy_missing.all(axis=1)
+        first_seen = self.first_seen[groups, :len(self.labels)]
+        mood_column = self._strongest(mood, mood_missing, first_seen)
+        energy_column = self._strongest(energy, energy_missing, first_seen)
+        index = np.arange(len(groups))
+        return is_pattern, mood_column, mood[index, mood_column], energy[index, energy_column]
+
+    @staticmethod
+    def _strongest(values, missing, first_seen):
+        # Largest magnitude per row, the earliest seen label among equals
+        magnitude = np.where(missing, -1.0, np.abs(values))
+        tied = magnitude == magnitude.max(axis=1, keepdims=True)
+        return np.argmin(np.where(tied, first_seen, np.iinfo(np.int64).max), axis=1)
+
+    def rebuild_medians(self):
+        mood = self.mood[:self.size, :len(self.labels)]
+        energy = self.energy[:self.size, :len(self.labels)]
+        self.mood_median = RunningMedian(mood[~np.isnan(mood)].tolist())
+        self.energy_median = RunningMedian(energy[~np.isnan(energy)].tolist())
+
+    def changed_rows(self, base):
+        """Rows that differ from base, the state this one was copied from (rows added since included)"""
+        base_rows = len(base)
+        labels = len(self.labels)
+        changed = np.ones(self.size, dtype=bool)
+        changed[:base_rows] = ((self.confidence[:base_rows] != base.confidence[:base_rows])
+                               | (self.observation_count[:base_rows] != base.observation_count[:base_rows]))
+        for name, missing in (('mood', np.nan), ('energy', np.nan), ('first_seen', 0)):
+            ours = getattr(self, name)[:base_rows, :labels]
+            # Labels are only ever appended, so base's are a prefix of ours
+            theirs = np.full_like(ours, missing)
+            theirs[:, :len(base.labels)] = getattr(base, name)[:base_rows, :len(base.labels)]
+            same = (ours == theirs) | (np.isnan(ours) & np.isnan(theirs))
+            changed[:base_rows] |= ~same.all(axis=1)
+        return np.flatnonzero(changed)
+
+    def rows_state(self, rows):
+        """Labels and the given rows' columns, for restore_rows() on a copy of the same base"""
+        return {
+            'labels': list(self.labels),
+            'size': self.size,
+            'next_rank': self.next_rank,
+            'rows': rows,
+            **{name: values[rows] for name, values in self.columns().items()}
+        }
+
+    def restore_rows(self, state):
+        for label in state['labels']:
+            self.column(label)
+        for row in range(self.size, state['size']):
+            self.add_group(row)
+        rows = state['rows']
+        labels = len(self.labels)
+        for name in ('mood', 'energy', 'first_seen'):
+            getattr(self, name)[rows, :labels] = state[name]
+        for name in ('confidence', 'observation_count'):
+            getattr(self, name)[rows] = state[name]
+        self.next_rank = state['next_rank']
+        self.rebuild_medians()
+
+    def columns(self):
+        """Trimmed copies of the arrays, for pickling"""
+        labels = len(self.labels)
+        return {
+            'mood': self.mood[:self.size, :labels].copy(),
+            'energy': self.energy[:self.size, :labels].copy(),
+            'confidence': self.confidence[:self.size].copy(),
+            'observation_count': self.observation_count[:self.size].copy(),
+            'first_seen': self.first_seen[:self.size, :labels].copy()
+        }
+
+    def __getstate__(self):
+        # Medians are rebuilt on load, and unused capacity isn't worth persisting
+        state = self.__dict__.copy()
+        state.update(self.columns())
+        del state['mood_median'], state['energy_median']
+        return state
+
+    def __setstate__(self, state):
+        if 'first_seen' not in state:
+            # Saved before ranks were kept: fall back to column order, which is how ties went then
+            state['first_seen'] = np.tile(np.arange(len(state['labels']), dtype=np.int64), (len(state['confidence']), 1))
+            state['next_rank'] = len(state['labels'])
+        self.__dict__.update(state)
+        if len(self.confidence) == 0:
+            self._grow(1, max(len(self.labels), 1))
+        self.rebuild_medians()
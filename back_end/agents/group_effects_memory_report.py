@@ -0,0 +1,109 @@
+'''
+Memory comparison of the pattern finder's group effect storage at a given number of groups:
+the old dict-per-group layout (two defaultdicts keyed by the whole (label, score) emotion tuple,
+so one key per observation), the same layout keyed by emotion label, and GroupEffects arrays.
+Observations come in entries of --keywords random groups sharing one emotion and rating pair,
+like a journal entry, until each group has --observations on average. Memory is what tracemalloc
+sees retained (and at peak) after building the structure; build time includes the overall
+running medians for GroupEffects only.
+
+Usage: python group_effects_memory_report.py [--groups 100000] [--observations 4] [--keywords 10] [--output report.json]
+'''
+
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from group_effects import GroupEffects
+from report_utils import report_parser, print_table, write_report
+
+EMOTIONS = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
+
+def synthesize_entries(groups, observations, keywords, seed=0):
+    rng = random.Random(seed)
+    return [
+        (rng.sample(range(groups), keywords), [rng.uniform(0.2, 1.0) for _ in range(keywords)],
+         (rng.choice(EMOTIONS), rng.random()), rng.randint(1, 10), rng.randint(1, 10))
+        for _ in range(groups * observations // keywords)
+    ]
+
+def build_dicts(groups, entries, label_keys):
+    group_effects = {}
+    for group_id in range(groups):
+        group_effects[group_id] = {
+            'mood_outcomes': defaultdict(float),
+            'energy_outcomes': defaultdict(float),
+            'confidence': 0.0,
+            'observation_count': 0
+        }
+    for group_ids, weights, emotion, mood_rating, energy_rating in entries:
+        key = emotion[0] if label_keys else emotion
+        for group_id, weight in zip(group_ids, weights):
+            effect_data = group_effects[group_id]
+            old_count = effect_data['observation_count']
+            new_count = old_count + weight
+            effect_data['mood_outcomes'][key] = (effect_data['mood_outcomes'].get(key, 0.0) * old_count + mood_rating * weight) / new_count
+            effect_data['energy_outcomes'][key] = (effect_data['energy_outcomes'].get(key, 0.0) * old_count + energy_rating * weight) / new_count
+            effect_data['confidence'] = min(1.0, new_count / 5.0)
+            effect_data['observation_count'] = new_count
+    return group_effects
+
+def build_arrays(groups, entries):
+    effects = GroupEffects()
+    for group_id in range(groups):
+        effects.add_group(group_id)
+    for group_ids, weights, emotion, mood_rating, energy_rating in entries:
+        effects.observe(group_ids, weights, emotion[0], mood_rating, energy_rating)
+    return effects
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, seconds
+
+def main():
+    parser = report_parser(__doc__)
+    parser.add_argument("--groups", type=int, default=100_000)
+    parser.add_argument("--observations", type=int, default=4, help="Observations per group, on average")
+    parser.add_argument("--keywords", type=int, default=10, help="Groups per entry")
+    args = parser.parse_args()
+
+    entries = synthesize_entries(args.groups, args.observations, args.keywords)
+    layouts = {
+        'dicts, (label, score) keys': lambda: build_dicts(args.groups, entries, label_keys=False),
+        'dicts, label keys': lambda: build_dicts(args.groups, entries, label_keys=True),
+        'GroupEffects arrays': lambda: build_arrays(args.groups, entries)
+    }
+
+    print(f"{args.groups} groups, {len(entries)} entries of {args.keywords} groups")
+    results = {}
+    for name, build in layouts.items():
+        effects, current, peak, seconds = measure(build)
+
+        # One pass finding every group's dominant mood, what the pattern view needs
+        start = time.perf_counter()
+        if isinstance(effects, GroupEffects):
+            effects.dominant_effects(range(len(effects)))
+        else:
+            for effect_data in effects.values():
+                if effect_data['mood_outcomes']:
+                    max(effect_data['mood_outcomes'].items(), key=lambda x: abs(x[1]))
+        pass_ms = (time.perf_counter() - start) * 1000
+
+        results[name] = {'retained_mb': current / 1e6, 'peak_mb': peak / 1e6, 'build_seconds': seconds, 'pattern_pass_ms': pass_ms}
+        del effects
+
+    rows = [[name, f"{result['retained_mb']:.1f}", f"{result['peak_mb']:.1f}", f"{result['build_seconds']:.2f}",
+             f"{result['pattern_pass_ms']:.1f}"] for name, result in results.items()]
+    print()
+    print_table(["layout", "retained MB", "peak MB", "build s", "pattern pass ms"], rows)
+
+    write_report(args.output, {'groups': args.groups, 'entries': len(entries), 'keywords': args.keywords, 'layouts': results})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import numpy as np
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class ExactGroupIndex:
+    """Nearest activity group by cosine similarity, brute force over every group"""
+
+    def __init__(self, initial_capacity=64):
+        self.initial_capacity = initial_capacity
+        self.group_ids = []
+        self._matrix = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, group_id, embedding):
+        vector = normalize_rows(embedding)
+        if self._matrix is None:
+            self._matrix = np.empty((self.initial_capacity, vector.shape[-1]), dtype=np.float32)
+        elif self._size == len(self._matrix):
+            grown = np.empty((len(self._matrix) * 2, self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+
+        self._matrix[self._size] = vector
+        self.group_ids.append(group_id)
+        self._size += 1
+
+    def vectors(self):
+        """Normalized embeddings of every group, in group_ids order"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+
+    def load_arrays(self, group_ids, vectors):
+        """Adopt already normalized vectors (e.g. a read-only memory map) as the index matrix"""
+        self.group_ids = list(group_ids)
+        self._matrix = vectors if len(vectors) else None
+        self._size = len(vectors)
+
+    def search(self, embedding, threshold):
+        """Most similar group with similarity >= threshold (first one on ties), or None"""
+        if self._size == 0:
+            return None, 0.0
+
+        similarities = self._matrix[:self._size] @ normalize_rows(embedding)
+        best = int(np.argmax(similarities))
+        best_similarity = float(similarities[best])
+        # Same rule as the old per-group scan: must clear the threshold and be positive
+        if best_similarity >= threshold and best_similarity > 0:
+            return self.group_ids[best], best_similarity
+        return None, best_similarity
+
+    def __getstate__(self):
+        # Don't persist the unused capacity
+        state = self.__dict__.copy()
+        if self._matrix is not None:
+            state['_matrix'] = np.array(self._matrix[:self._size])
+        return state
+
+class IVFGroupIndex(ExactGroupIndex):
+    """Approximate nearest group search for large vocabularies (inverted file index)"""
+
+    def __init__(self, min_train_size=20_000, nprobe=8, kmeans_iterations=10, initial_capacity=64, seed=0):
+        super().__init__(initial_capacity=initial_capacity)
+        self.min_train_size = min_train_size
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self._trained_size = 0
+        self._list_arrays = {}
+
+    def add(self, group_id, embedding):
+        super().add(group_id, embedding)
+        row = self._size - 1
+
+        if self.centroids is None:
+            if self._size >= self.min_train_size:
+                self.train()
+        elif self._size >= 2 * self._trained_size:
+            self.train()
+        else:
+            cluster = int(np.argmax(self.centroids @ self._matrix[row]))
+            self.lists[cluster].append(row)
+            self._list_arrays.pop(cluster, None)
+
+    def _assign(self, vectors, chunk_size=8192):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def train(self):
+        vectors = self._matrix[:self._size]
+        nlist = max(1, int(np.sqrt(self._size)))
+        rng = np.random.default_rng(self.seed)
+
+        # Train on a sample, then assign every group
+        sample_size = min(self._size, 64 * nlist)
+        sample = vectors[rng.choice(self._size, sample_size, replace=False)]
+        self.centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = self._assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=nlist) == 0
+            # Keep the old centroid for clusters that lost all their points
+            sums[empty] = self.centroids[empty]
+            self.centroids = normalize_rows(sums)
+
+        self.load_clustering(self.centroids, self._assign(vectors), self._size)
+
+    def assignments(self):
+        """Cluster of every row, the inverse of lists"""
+        assignments = np.empty(self._size, dtype=np.int32)
+        for cluster, rows in enumerate(self.lists):
+            assignments[rows] = cluster
+        return assignments
+
+    def load_clustering(self, centroids, assignments, trained_size):
+        self.centroids = centroids
+        nlist = len(centroids)
+        order = np.argsort(assignments, kind="stable")
+        boundaries = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self.lists = [order[boundaries[i]:boundaries[i + 1]].tolist() for i in range(nlist)]
+        self._list_arrays = {}
+        self._trained_size = trained_size
+
+    def _list_array(self, cluster):
+        if cluster not in self._list_arrays:
+            self._list_arrays[cluster] = np.asarray(self.lists[cluster], dtype=np.int64)
+        return self._list_arrays[cluster]
+
+    def search(self, embedding, threshold):
+        if self.centroids is None:
+            return super().search(embedding, threshold)
+
+        query = normalize_rows(embedding)
+        nprobe = min(self.nprobe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._list_array(int(cluster)) for cluster in probed])
+        if len(rows) == 0:
+            return None, 0.0
+
+        # Sort so ties still go to the earliest group, like the exact scan
+        rows.sort()
+        similarities = self._matrix[rows] @ query
+        best = int(np.argmax(similarities))
+        best_similarity = float(similarities[best])
+        if best_similarity >= threshold and best_similarity > 0:
+            return self.group_ids[rows[best]], best_similarity
+        return None, best_similarity
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_list_arrays'] = {}
+        return state
+
+def create_group_index(kind="auto", ann_min_groups=20_000, nprobe=8):
+    """'exact', 'ivf', or 'auto' (exact until ann_min_groups groups, then IVF)"""
+    if kind == "exact":
+        return ExactGroupIndex()
+    if kind == "ivf":
+        return IVFGroupIndex(min_train_size=1, nprobe=nprobe)
+    if kind == "auto":
+        return IVFGroupIndex(min_train_size=ann_min_groups, nprobe=nprobe)
+    raise ValueError(f"Unknown group index '{kind}', expected 'exact', 'ivf' or 'auto'")
@@ -0,0 +1,91 @@
+import numpy as np
+
+def exact_max_sum(similarities, top_n, tolerance=1e-9):
+    """Branch and bound for the combination KeyBERT's Max-Sum scan picks, ties included"""
+    n = len(similarities)
+
+    # half_smallest[start, r - 1, j]: half the sum of the r - 1 smallest similarities of
+    # candidate j to the other candidates from start on
+    half_smallest = np.zeros((n, top_n, n))
+    for start in range(n):
+        block = similarities[start:, start:].copy()
+        np.fill_diagonal(block, np.inf)
+        block.sort(axis=1)
+        count = min(top_n - 1, n - start - 1)
+        if count > 0:
+            half_smallest[start, 1:count + 1, start:] = (np.cumsum(block[:, :count], axis=1) / 2).T
+
+    rows = similarities.tolist()
+
+    def keybert_total(chosen):
+        return sum([rows[i][j] for i in chosen for j in chosen if i != j])
+
+    greedy = greedy_max_sum(similarities, top_n)
+    best = {
+        'total': sum(rows[a][b] for i, a in enumerate(greedy) for b in greedy[i + 1:]),
+        'keybert_total': np.inf,
+        'chosen': greedy
+    }
+
+    def search(chosen, total, linear, start):
+        remaining = top_n - len(chosen)
+        if remaining == 0:
+            # Visited in KeyBERT's order, and near-ties are settled by its own sum, so ties go the same way
+            if total < best['total'] + tolerance:
+                exact_total = keybert_total(chosen)
+                if exact_total < best['keybert_total']:
+                    best['total'] = min(best['total'], total)
+                    best['keybert_total'] = exact_total
+                    best['chosen'] = list(chosen)
+            return
+
+        # Lower bound: the cheapest completions, each candidate costing its similarity to the picked
+        # ones plus half its smallest similarities to the other candidates left
+        costs = linear[start:] + half_smallest[start, remaining - 1, start:]
+        if len(costs) < remaining:
+            return
+        if total + np.partition(costs, remaining - 1)[:remaining].sum() >= best['total'] + tolerance:
+            return
+
+        for j in range(start, n - remaining + 1):
+            chosen.append(j)
+            search(chosen, total + linear[j], linear + similarities[j], j + 1)
+            chosen.pop()
+
+    search([], 0.0, np.zeros(n), 0)
+    return [int(i) for i in best['chosen']]
+
+def greedy_max_sum(similarities, top_n):
+    n = len(similarities)
+    similarities = similarities.copy()
+    np.fill_diagonal(similarities, 0.0)
+
+    # Start from the candidate least similar to the rest, then keep adding the candidate
+    # least similar to those already chosen
+    chosen = [int(np.argmin(similarities.sum(axis=1)))]
+    totals = similarities[chosen[0]].copy()
+    while len(chosen) < top_n:
+        totals_masked = totals.copy()
+        totals_masked[chosen] = np.inf
+        best = int(np.argmin(totals_masked))
+        chosen.append(best)
+        totals += similarities[best]
+
+    # Swap single members out while that lowers the total
+    improved = True
+    while improved:
+        improved = False
+        for i in list(chosen):
+            others = [c for c in chosen if c != i]
+            current = similarities[i, others].sum()
+            for j in range(n):
+                if j in chosen:
+                    continue
+                if similarities[j, others].sum() < current - 1e-12:
+                    chosen = others + [j]
+                    improved = True
+                    break
+            if improved:
+                break
+
+    return sorted(chosen)
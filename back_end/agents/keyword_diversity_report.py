@@ -0,0 +1,85 @@
+'''
+Keyword parity against KeyBERT's brute force Max-Sum ("maxsum", the original engine) and latency of
+the extractor's diversification engines over daily_data plus a few entries too short for top_n keywords.
+
+Usage: python keyword_diversity_report.py [--engines maxsum exact_maxsum greedy_maxsum mmr] [--output report.json]
+'''
+
+import time
+import numpy as np
+
+import extractor
+from report_utils import report_parser, latency_summary, print_table, write_report
+
+SHORT_ENTRIES = [
+    "Went for a run.",
+    "Slept badly, skipped the gym.",
+    "Cooked dinner with friends and read a book before bed."
+]
+
+def run_engine(engine, texts):
+    keywords = []
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        keywords.append(extractor.get_daily_keywords_batch([text], diversity=engine)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return keywords, latencies
+
+def compare(reference, candidate):
+    """Per-entry overlap of keyword sets (order is ignored)"""
+    jaccards = []
+    exact = 0
+    for ref_keywords, keywords in zip(reference, candidate):
+        ref_words = {word for word, _ in ref_keywords}
+        words = {word for word, _ in keywords}
+        union = ref_words | words
+        jaccards.append(len(ref_words & words) / len(union) if union else 1.0)
+        exact += ref_keywords == keywords
+    return {
+        'exact_match_rate': exact / len(reference),
+        'mean_jaccard': float(np.mean(jaccards)),
+        'min_jaccard': float(np.min(jaccards))
+    }
+
+def main():
+    parser = report_parser(__doc__)
+    parser.add_argument("--engines", nargs="+", default=["maxsum", "exact_maxsum", "greedy_maxsum", "mmr"])
+    args = parser.parse_args()
+    
+    print("Loading models...")
+    extractor.load_models()
+    texts = [entry_text for entry_text, _, _ in extractor.daily_data] + SHORT_ENTRIES
+    
+    # Warm up so the first engine doesn't pay for lazy initialization
+    extractor.get_daily_keywords_batch(texts[:1], diversity="exact_maxsum")
+    
+    print("Running reference engine (maxsum)...")
+    reference, reference_latencies = run_engine("maxsum", texts)
+    
+    report = {'entries': len(texts), 'engines': {}}
+    for engine in args.engines:
+        if engine == "maxsum":
+            keywords, latencies = reference, reference_latencies
+        else:
+            print(f"Running {engine}...")
+            keywords, latencies = run_engine(engine, texts)
+        
+        report['engines'][engine] = {
+            'parity': compare(reference, keywords),
+            'latency_ms': latency_summary(latencies)
+        }
+    
+    rows = []
+    for engine, result in report['engines'].items():
+        parity = result['parity']
+        latency = result['latency_ms']
+        rows.append([engine, f"{parity['exact_match_rate']:.0%}", f"{parity['mean_jaccard']:.3f}",
+                     f"{parity['min_jaccard']:.3f}", f"{latency['mean']:.1f}", f"{latency['p95']:.1f}"])
+    print()
+    print_table(["engine", "exact", "jaccard", "min jac", "mean ms", "p95 ms"], rows)
+    
+    write_report(args.output, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+class MicroBatchQueue:
+    """Queue of (ctx, msg, time queued) between a message handler and its batch worker"""
+
+    def __init__(self, max_size, max_wait, max_depth):
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue(maxsize=max_depth)
+        self.metrics = {
+            'batches': 0,
+            'entries': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'last_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'queue_depth': 0,
+            'max_queue_depth': 0
+        }
+
+    async def put(self, ctx, msg):
+        await self._queue.put((ctx, msg, time.perf_counter()))
+        queue_depth = self._queue.qsize()
+        self.metrics['queue_depth'] = queue_depth
+        self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], queue_depth)
+
+    async def next_batch(self):
+        """Wait for an entry, then collect more until the batch is full or max_wait has passed"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def record_batch(self, batch, users=None):
+        """Count a batch about to be processed, returns how long its first entry waited in ms"""
+        wait_ms = (time.perf_counter() - batch[0][2]) * 1000
+
+        self.metrics['batches'] += 1
+        self.metrics['entries'] += len(batch)
+        self.metrics['last_batch_size'] = len(batch)
+        self.metrics['max_batch_size'] = max(self.metrics['max_batch_size'], len(batch))
+        if users is not None:
+            self.metrics['last_batch_users'] = users
+        self.metrics['last_wait_ms'] = wait_ms
+        self.metrics['max_wait_ms'] = max(self.metrics['max_wait_ms'], wait_ms)
+        self.metrics['queue_depth'] = self._queue.qsize()
+        return wait_ms
@@ -1,13 +1,22 @@
 from uagents import Agent, Context, Model
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-from collections import defaultdict
 import re
 from typing import List, Tuple, Dict, Any, Optional
 import pickle
 import os
 import asyncio
+import hashlib
+from urllib.parse import quote
+from bisect import bisect_left, insort
+
+from activity_vocabulary import ACTIVITY_SYNONYMS, SynonymMatcher
+from group_index import create_group_index
+from embedding_cache import EmbeddingCache
+from state_journal import StateJournal, atomic_write
+import columnar_snapshot
+from group_effects import GroupEffects
+from user_state_cache import UserStateCache
+from micro_batching import MicroBatchQueue
 
 # Structure for communication between uAgents
 
@@ -19,6 +28,12 @@ class PatternAnalysisForPlannerMessage(Model):
     focus_patterns: List[str] = []
     trigger_reason: str = ""
     is_baseline: bool = False
+    seq: int = 0
+    base_seq: int = 0
+    is_full: bool = True
+    removed: List[str] = []
+    overall_avg_mood: float = 5.0
+    overall_avg_energy: float = 5.0
     
 class ExtractedDataMessage(Model):
     keywords: List[Tuple[str, float]]
@@ -33,12 +48,27 @@ class BaselineInitMessage(Model):
     total_entries: int
     user_id: str
 
+class ExtractionCorrectionMessage(Model):
+    previous_keywords: List[Tuple[str, float]]
+    keywords: List[Tuple[str, float]]
+    emotions: List[Tuple[str, float]]
+    mood_rating: int
+    energy_rating: int
+    user_id: str
+    entry_text: str
+
 class PatternAnalysisMessage(Model):
     patterns: List[Dict[str, Any]]
     user_id: str
     total_patterns: int
     high_confidence_patterns: int
     is_baseline: bool = False
+    seq: int = 0
+    base_seq: int = 0
+    is_full: bool = True
+    removed: List[str] = []
+    overall_avg_mood: float = 5.0
+    overall_avg_energy: float = 5.0
 
 class ConfidenceUpdateMessage(Model):
     pattern_id: str
@@ -51,6 +81,12 @@ class PlannerTriggerMessage(Model):
     reason: str
     patterns_to_focus: List[str]
 
+class PatternResyncRequestMessage(Model):
+    user_id: str
+    stream: str  # "curator" or "planner", the receiver whose patterns are out of sync
+    focus_patterns: List[str] = []
+    trigger_reason: str = ""
+
 # Initialize pattern finder agent
 pattern_finder_agent = Agent(
     name="pattern_finder_agent",
@@ -59,19 +95,114 @@ pattern_finder_agent = Agent(
     endpoint=["http://127.0.0.1:8002/submit"]
 )
 
-# Global pattern finder instance
-pattern_finder = None
-PATTERN_CACHE_FILE = "pattern_finder_cache.pkl"
-baseline_initialized = False
+# Activity groups shared by all users, snapshotted on every journal compaction
+vocabulary = None
+PATTERN_VOCABULARY_DIR = "pattern_finder_vocabulary"
+PATTERN_VOCABULARY_FILE = "pattern_finder_vocabulary.pkl"
 
-class SemanticPatternFinder:
-    def __init__(self, similarity_threshold=0.85):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+# One effect table per user, in an LRU of at most MAX_RESIDENT_USERS. Evicted users are saved
+# to their own (small, pickled) file under PATTERN_USERS_DIR and reloaded on their next message.
+user_finders = None
+PATTERN_USERS_DIR = os.environ.get("PATTERN_FINDER_USERS_DIR", "pattern_finder_users")
+MAX_RESIDENT_USERS = int(os.environ.get("PATTERN_FINDER_MAX_RESIDENT_USERS", "256"))
+# The extractor sends the journal history as SEED_USER and daily entries under the client's user id,
+# so new users start from SEED_USER's state right after its baseline to see the history's patterns.
+# That seed is kept read-only in the vocabulary snapshot, and a seeded user's file only holds what
+# differs from it. Set PATTERN_FINDER_SEED_USER="" to start new users empty.
+SEED_USER = os.environ.get("PATTERN_FINDER_SEED_USER", "baseline_user")
+USER_STATS_INTERVAL = float(os.environ.get("PATTERN_FINDER_USER_STATS_INTERVAL", "300"))
+
+# Vocabulary snapshot format: "columnar" (memory-mapped PATTERN_VOCABULARY_DIR) or "pickle" (PATTERN_VOCABULARY_FILE)
+PATTERN_SNAPSHOT_FORMAT = os.environ.get("PATTERN_FINDER_SNAPSHOT_FORMAT", "columnar")
+# float16 halves the embedding file but is widened to float32 (and so not memory-mapped) on load
+PATTERN_SNAPSHOT_DTYPE = os.environ.get("PATTERN_FINDER_SNAPSHOT_DTYPE", "float32")
+
+# Observations and confidence changes are journaled here between snapshots
+journal = None
+PATTERN_JOURNAL_FILE = "pattern_finder_journal.jsonl"
+JOURNAL_FSYNC_EVERY = int(os.environ.get("PATTERN_FINDER_JOURNAL_FSYNC_EVERY", "32"))
+JOURNAL_FSYNC_INTERVAL = float(os.environ.get("PATTERN_FINDER_JOURNAL_FSYNC_INTERVAL", "1.0"))
+JOURNAL_COMPACT_EVERY = int(os.environ.get("PATTERN_FINDER_JOURNAL_COMPACT_EVERY", "1000"))
+
+# Live entries are collected for up to OBSERVATION_BATCH_WAIT seconds (or OBSERVATION_BATCH_MAX_SIZE
+# entries) and applied together: per user in the batch, one journal write, one pattern update and one
+# analysis message. The queue blocks new entries once OBSERVATION_QUEUE_MAX_DEPTH are waiting.
+OBSERVATION_BATCH_MAX_SIZE = int(os.environ.get("PATTERN_FINDER_BATCH_SIZE", "64"))
+OBSERVATION_BATCH_WAIT = float(os.environ.get("PATTERN_FINDER_BATCH_WAIT", "0.05"))
+OBSERVATION_QUEUE_MAX_DEPTH = int(os.environ.get("PATTERN_FINDER_QUEUE_DEPTH", "1024"))
+observation_queue = None
+observation_batch_task = None
+
+# Pattern messages are delta encoded per user and receiver (stream). Stream state lives with
+# the user's finder, so a restart or an eviction makes the next message a full one.
+CURATOR_STREAM = "curator"
+PLANNER_STREAM = "planner"
+
+# Nearest-group search: "exact", "ivf" (approximate) or "auto" (exact until GROUP_INDEX_ANN_MIN_GROUPS groups)
+GROUP_INDEX_KIND = os.environ.get("PATTERN_FINDER_GROUP_INDEX", "auto")
+GROUP_INDEX_ANN_MIN_GROUPS = int(os.environ.get("PATTERN_FINDER_ANN_MIN_GROUPS", "20000"))
+
+SENTENCE_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# SentenceTransformer batch size when encoding many new activities at once
+ENCODE_BATCH_SIZE = 256
+
+# Activity embeddings: in-memory LRU size, and where the on-disk tier lives ("" disables it)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("PATTERN_FINDER_EMBEDDING_CACHE_SIZE", "50000"))
+EMBEDDING_CACHE_DIR = os.environ.get("PATTERN_FINDER_EMBEDDING_CACHE_DIR", "embedding_cache")
+
+# Raw keyword -> (valid, canonical) results kept by the activity normalizer
+ACTIVITY_MEMO_MAX_ENTRIES = 100_000
+
+FEELING_WORDS = frozenset({'stressed', 'tired', 'happy', 'sad', 'anxious', 'excited', 'bored', 'grateful', 'accomplished', 'energized', 'motivated', 'overwhelmed', 'satisfied', 'content', 'frustrated', 'felt', 'feeling', 'spent', 'had', 'was', 'were', 'been', 'have', 'has'})
+NON_ACTIVITIES = frozenset({'time', 'life', 'people', 'things', 'way', 'nothing', 'everything', 'something', 'perfect', 'amazing', 'wonderful', 'terrible', 'good', 'bad'})
+
+def create_embedding_cache():
+    return EmbeddingCache(
+        SentenceTransformer(SENTENCE_MODEL_NAME),
+        SENTENCE_MODEL_NAME,
+        max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        disk_dir=EMBEDDING_CACHE_DIR,
+        batch_size=ENCODE_BATCH_SIZE
+    )
+
+def save_state_file(filename, state):
+    # Written to a temp file and renamed, so a crash mid-write leaves the previous snapshot intact
+    atomic_write(filename, lambda f: pickle.dump(state, f))
+
+def load_state_file(filename, restore):
+    """Passes the state pickled in filename to restore, False if there is no such file"""
+    try:
+        with open(filename, 'rb') as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return False
+    restore(state)
+    return True
+
+class SharedVocabulary:
+    """Activity groups shared by every user"""
+    
+    def __init__(self, embedding_cache, similarity_threshold=0.85, group_index_kind=GROUP_INDEX_KIND):
+        self.embedding_cache = embedding_cache
+        self.model = embedding_cache.model
+        # Plain dicts, or lazy views over the columns of a loaded columnar snapshot
         self.activity_groups = {}
-        self.group_effects = {}
         self.activity_to_group = {}
+        # Group label (what the curator calls a pattern id) -> group id, derived from activity_groups
+        # on first use after a load
+        self._label_to_group = {}
         self.similarity_threshold = similarity_threshold
         self.next_group_id = 0
+        # Every journal record up to here has been applied to the groups
+        self.journal_seq = 0
+        self.group_index_kind = group_index_kind
+        self.group_index = create_group_index(group_index_kind, ann_min_groups=GROUP_INDEX_ANN_MIN_GROUPS)
+        # Pickled user state new users start from (see SEED_USER) and the journal seq it was taken at,
+        # snapshotted along with the groups it uses. _seed is an unpickled copy nobody changes.
+        self.seed_state = None
+        self.seed_seq = None
+        self._seed = None
         
         # Time patterns to filter out
         self.time_patterns = [
@@ -82,64 +213,41 @@ class SemanticPatternFinder:
             r'(?:january|february|march|april|may|june|july|august|september|october|november|december)',
             r'\b(?:early|late|immediately|soon|later|before|after|until|since|while|during)\b',
         ]
+        # Keywords are lowercased before matching, so one search over the alternation does it
+        self._time_regex = re.compile("|".join(self.time_patterns))
         
-        self.activity_synonyms = {
-            'exercise': ['gym', 'workout', 'run', 'running', 'walk', 'walking', 'hike', 'hiking', 'yoga', 'fitness', 'dance', 'dancing', 'sports', 'volleyball', 'weightlifting', 'cardio', 'training', 'bike', 'biking', 'swimming'],
-            'social_media': ['scrolling', 'instagram', 'tiktok', 'facebook', 'feeds', 'social', 'browsing', 'checking', 'phone', 'apps', 'posting', 'liking'],
-            'cooking': ['cook', 'cooking', 'meal', 'prep', 'recipe', 'recipes', 'baking', 'kitchen', 'ingredients', 'preparing', 'prepared'],
-            'social': ['friends', 'family', 'party', 'dinner', 'brunch', 'hanging', 'video', 'call', 'chat', 'meeting', 'conversation', 'gatherings', 'socializing'],
-            'sleep': ['sleep', 'sleeping', 'bed', 'bedtime', 'nap', 'rest', 'tired', 'exhausted', 'late']
-        }
+        self.activity_synonyms = {canonical: list(synonyms) for canonical, synonyms in ACTIVITY_SYNONYMS.items()}
+        self._synonym_matcher = SynonymMatcher(self.activity_synonyms)
+        self._activity_memo = {}
     
-    def _calculate_overall_averages(self):
-        all_moods = []
-        all_energies = []
-        
-        for effect_data in self.group_effects.values():
-            if effect_data['mood_outcomes']:
-                all_moods.extend(effect_data['mood_outcomes'].values())
-            if effect_data['energy_outcomes']:
-                all_energies.extend(effect_data['energy_outcomes'].values())
+    def normalize_activity(self, activity):
+        """(valid, canonical) for a raw keyword, memoized since the same keywords come back every day"""
+        result = self._activity_memo.get(activity)
+        if result is not None:
+            return result
         
-        if all_moods and all_energies:
-            return np.median(all_moods), np.median(all_energies)
-        return 5.0, 5.0
-    
-    def _is_valid_activity(self, activity):
         activity_lower = activity.lower().strip()
         
         # Filter unneeded stuff
-        for pattern in self.time_patterns:
-            if re.search(pattern, activity_lower):
-                return False
-        
-        if len(activity_lower) <= 3:
-            return False
-            
-        feeling_words = {'stressed', 'tired', 'happy', 'sad', 'anxious', 'excited', 'bored', 'grateful', 'accomplished', 'energized', 'motivated', 'overwhelmed', 'satisfied', 'content', 'frustrated', 'felt', 'feeling', 'spent', 'had', 'was', 'were', 'been', 'have', 'has'}
-        if activity_lower in feeling_words:
-            return False
-            
-        non_activities = {'time', 'life', 'people', 'things', 'way', 'nothing', 'everything', 'something', 'perfect', 'amazing', 'wonderful', 'terrible', 'good', 'bad'}
-        if activity_lower in non_activities:
-            return False
-            
-        return True
-    
-    def _get_canonical_activity(self, activity):
-        activity_lower = activity.lower().strip()
+        valid = not (
+            len(activity_lower) <= 3
+            or activity_lower in FEELING_WORDS
+            or activity_lower in NON_ACTIVITIES
+            or self._time_regex.search(activity_lower)
+        )
+        canonical = self._synonym_matcher.canonical(activity_lower) or activity_lower
         
-        for canonical, synonyms in self.activity_synonyms.items():
-            if activity_lower in synonyms or any(synonym in activity_lower for synonym in synonyms):
-                return canonical
-                
-        return activity_lower
+        if len(self._activity_memo) >= ACTIVITY_MEMO_MAX_ENTRIES:
+            # Drop the oldest entry (dicts keep insertion order)
+            del self._activity_memo[next(iter(self._activity_memo))]
+        result = (valid, canonical)
+        self._activity_memo[activity] = result
+        return result
     
-    def _find_or_create_group(self, activity):
-        if not self._is_valid_activity(activity):
+    def find_or_create_group(self, activity):
+        valid, canonical_activity = self.normalize_activity(activity)
+        if not valid:
             return None
-            
-        canonical_activity = self._get_canonical_activity(activity)
         
         if canonical_activity in self.activity_to_group:
             group_id = self.activity_to_group[canonical_activity]
@@ -147,16 +255,9 @@ class SemanticPatternFinder:
             self.activity_to_group[activity] = group_id
             return group_id
             
-        activity_embedding = self.model.encode([canonical_activity])[0]
+        activity_embedding = self.embedding_cache.encode([canonical_activity])[0]
         
-        best_group = None
-        best_similarity = 0
-        
-        for group_id, group_data in self.activity_groups.items():
-            similarity = cosine_similarity([activity_embedding], [group_data['embedding']])[0][0]
-            if similarity > best_similarity and similarity >= self.similarity_threshold:
-                best_similarity = similarity
-                best_group = group_id
+        best_group, _ = self.group_index.search(activity_embedding, self.similarity_threshold)
         
         if best_group is not None:
             self.activity_groups[best_group]['activities'].add(activity)
@@ -174,42 +275,218 @@ class SemanticPatternFinder:
                 'embedding': activity_embedding,
                 'label': canonical_activity
             }
-            
-            self.group_effects[group_id] = {
-                'mood_outcomes': defaultdict(float),
-                'energy_outcomes': defaultdict(float),
-                'confidence': 0.0,
-                'observation_count': 0
-            }
+            if self._label_to_group is not None:
+                self._label_to_group[canonical_activity] = group_id
+            self.group_index.add(group_id, activity_embedding)
             
             self.activity_to_group[activity] = group_id
             self.activity_to_group[canonical_activity] = group_id
             return group_id
     
-    def add_observation(self, daily_keywords, daily_emotion, mood_rating=None, energy_rating=None):
+    def resolve(self, daily_keywords):
+        """(activity, group_id, weight) for every keyword that belongs to a group, creating groups as needed"""
+        resolved = []
         for activity, weight in daily_keywords:
-            group_id = self._find_or_create_group(activity)
-            
-            if group_id is not None and mood_rating is not None and energy_rating is not None:
-                effect_data = self.group_effects[group_id]
-                
-                old_count = effect_data['observation_count']
-                new_count = old_count + weight
-                
-                # Update mood outcomes
-                current_mood_avg = effect_data['mood_outcomes'].get(daily_emotion[0], 0.0)
-                new_mood_avg = ((current_mood_avg * old_count) + (mood_rating * weight)) / new_count
-                effect_data['mood_outcomes'][daily_emotion[0]] = new_mood_avg
-                
-                # Update energy outcomes
-                current_energy_avg = effect_data['energy_outcomes'].get(daily_emotion[0], 0.0)
-                new_energy_avg = ((current_energy_avg * old_count) + (energy_rating * weight)) / new_count
-                effect_data['energy_outcomes'][daily_emotion[0]] = new_energy_avg
-                
-                effect_data['confidence'] = min(1.0, new_count / 5.0)  
-                effect_data['observation_count'] = new_count
+            group_id = self.find_or_create_group(activity)
+            if group_id is not None:
+                resolved.append((activity, group_id, weight))
+        return resolved
+    
+    def prefetch_embeddings(self, keyword_lists):
+        """Encode every canonical activity without a group yet in one batched call"""
+        pending = []
+        seen = set()
+        for keywords in keyword_lists:
+            for activity, _ in keywords:
+                valid, canonical_activity = self.normalize_activity(activity)
+                if not valid:
+                    continue
+                if canonical_activity not in self.activity_to_group and canonical_activity not in seen:
+                    seen.add(canonical_activity)
+                    pending.append(canonical_activity)
+        
+        if pending:
+            self.embedding_cache.encode(pending)
+    
+    def embedding_stats(self):
+        return self.embedding_cache.stats()
+    
+    def _state(self):
+        return {
+            'activity_groups': self.activity_groups,
+            'activity_to_group': self.activity_to_group,
+            'next_group_id': self.next_group_id,
+            'group_index': self.group_index,
+            'group_index_kind': self.group_index_kind,
+            'journal_seq': self.journal_seq,
+            'seed_state': self.seed_state,
+            'seed_seq': self.seed_seq
+        }
+    
+    def save_state(self, filename):
+        save_state_file(filename, self._state())
+    
+    def set_seed(self, state, seq):
+        self.seed_state = pickle.dumps(state)
+        self.seed_seq = seq
+        self._seed = None
+    
+    def seed(self, seed_seq, copy=True):
+        """The seed taken at seed_seq: a copy of its state, or with copy=False the shared one (not to be changed)"""
+        if seed_seq != self.seed_seq:
+            raise ValueError(f"No seed taken at journal seq {seed_seq} (the current one is from {self.seed_seq})")
+        if copy:
+            return pickle.loads(self.seed_state)
+        if self._seed is None:
+            self._seed = pickle.loads(self.seed_state)
+        return self._seed
+    
+    def _rebuild_group_index(self):
+        self.group_index = create_group_index(self.group_index_kind, ann_min_groups=GROUP_INDEX_ANN_MIN_GROUPS)
+        for group_id, group_data in self.activity_groups.items():
+            self.group_index.add(group_id, group_data['embedding'])
+    
+    def group_label(self, group_id):
+        if isinstance(self.activity_groups, columnar_snapshot.LazyGroups):
+            # Without building the group's dict
+            return self.activity_groups.label(group_id)
+        return self.activity_groups[group_id]['label']
+    
+    @property
+    def label_to_group(self):
+        # Not persisted, and only confidence updates need it, so it's built on first use
+        # instead of reading every label on load. Labels are unique, but if not the lowest
+        # group id wins as with the old linear scan.
+        if self._label_to_group is None:
+            self._label_to_group = {}
+            for group_id in self.activity_groups:
+                self._label_to_group.setdefault(self.group_label(group_id), group_id)
+        return self._label_to_group
+    
+    def restore_state(self, state):
+        self.activity_groups = state['activity_groups']
+        self.activity_to_group = state['activity_to_group']
+        self._label_to_group = None
+        self.next_group_id = state['next_group_id']
+        self.journal_seq = state.get('journal_seq', 0)
+        if state.get('seed_seq') != self.seed_seq:
+            self._seed = None
+        self.seed_state = state.get('seed_state')
+        self.seed_seq = state.get('seed_seq')
+        
+        # Group labels aren't put in the embedding cache: every label is in activity_to_group,
+        # so it never gets encoded again
+        
+        # Older caches don't have the index, and a different index kind means rebuilding it
+        group_index = state.get('group_index')
+        if group_index is not None and state.get('group_index_kind') == self.group_index_kind:
+            self.group_index = group_index
+        else:
+            self._rebuild_group_index()
+    
+    def load_state(self, filename):
+        return load_state_file(filename, self.restore_state)
+    
+    def save_snapshot(self, directory, dtype="float32"):
+        columnar_snapshot.write_snapshot(directory, self._state(), dtype=dtype)
+        # Map the snapshot just written, so the groups and activities added since the last one
+        # move out of the in-memory overlays and nothing maps the older snapshots any more
+        label_to_group = self._label_to_group
+        self.load_snapshot(directory)
+        self._label_to_group = label_to_group
+        columnar_snapshot.remove_old_snapshots(directory)
+    
+    def load_snapshot(self, directory):
+        """Map a columnar snapshot instead of unpickling one"""
+        state = columnar_snapshot.read_snapshot(directory)
+        if state is None:
+            return False
+        self.restore_state(state)
+        return True
+
+class SemanticPatternFinder:
+    """One user's outcome statistics for the shared groups they've written about"""
+    
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        self.group_effects = GroupEffects()
+        # Shared group id -> row in group_effects, and back
+        self.group_rows = {}
+        self.row_groups = []
+        # Per row, this user's keywords that fell into the group (and their canonical forms)
+        self.group_activities = []
+        # Pattern view cache: per-group pattern fields, and per min_confidence a sorted list of
+        # (-confidence, group_id) for the groups that qualify. Groups touched since the last
+        # message are in _dirty_groups and get recomputed and re-positioned on the next one.
+        self._dirty_groups = set()
+        self._pattern_cache = {}
+        self._pattern_views = {}
+        # Per pattern message stream: its last seq, threshold, the pattern fields the receiver
+        # has by group, and the groups touched since its last message. Saved with the state
+        # (without the touched groups), so deltas carry on after an eviction.
+        self._streams = {}
+        self.baseline_initialized = False
+        self.journal_seq = 0
+        # Journal seq of the vocabulary's seed this user started from, None if it started empty
+        self.seed_seq = None
+    
+    def _calculate_overall_averages(self):
+        mood_median = self.group_effects.mood_median
+        energy_median = self.group_effects.energy_median
+        if len(mood_median) and len(energy_median):
+            return mood_median.median(), energy_median.median()
+        return 5.0, 5.0
+    
+    def _row(self, group_id):
+        row = self.group_rows.get(group_id)
+        if row is None:
+            row = len(self.row_groups)
+            self.group_effects.add_group(row)
+            self.group_rows[group_id] = row
+            self.row_groups.append(group_id)
+            self.group_activities.append(set())
+        return row
+    
+    def add_observation(self, daily_keywords, daily_emotion, mood_rating=None, energy_rating=None):
+        rows = []
+        weights = []
+        for activity, group_id, weight in self.vocabulary.resolve(daily_keywords):
+            row = self._row(group_id)
+            self.group_activities[row].add(activity)
+            self.group_activities[row].add(self.vocabulary.normalize_activity(activity)[1])
+            self._dirty_groups.add(group_id)
+            rows.append(row)
+            weights.append(weight)
+        
+        if rows and mood_rating is not None and energy_rating is not None:
+            # Outcomes are kept per emotion label of the entry's top emotion
+            self.group_effects.observe(rows, weights, daily_emotion[0][0], mood_rating, energy_rating)
+    
+    def retract_observation(self, daily_keywords, daily_emotion, mood_rating=None, energy_rating=None):
+        """Take back an observation added with the same arguments (its groups and activities stay)"""
+        rows = []
+        weights = []
+        # The vocabulary maps each keyword it has seen to the same group every time
+        for _, group_id, weight in self.vocabulary.resolve(daily_keywords):
+            row = self.group_rows.get(group_id)
+            if row is None:
+                continue
+            self._dirty_groups.add(group_id)
+            rows.append(row)
+            weights.append(weight)
+        
+        if rows and mood_rating is not None and energy_rating is not None:
+            self.group_effects.retract(rows, weights, daily_emotion[0][0], mood_rating, energy_rating)
+    
+    def correct_observation(self, previous_keywords, daily_keywords, daily_emotion, mood_rating=None, energy_rating=None):
+        """Swap an observation's keywords for corrected ones"""
+        self.retract_observation(previous_keywords, daily_emotion, mood_rating, energy_rating)
+        self.add_observation(daily_keywords, daily_emotion, mood_rating, energy_rating)
     
     def batch_add_observations(self, extracted_data_list):
+        # Grouping still runs entry by entry (so groups come out exactly as with sequential adds),
+        # only the encoding is done up front
+        self.vocabulary.prefetch_embeddings([extracted_data.keywords for extracted_data in extracted_data_list])
         for extracted_data in extracted_data_list:
             self.add_observation(
                 extracted_data.keywords,
@@ -218,93 +495,379 @@ class SemanticPatternFinder:
                 extracted_data.energy_rating
             )
     
-    def get_patterns(self, min_confidence=0.2):
-        patterns = []
+    def adjust_confidence(self, label, adjustment):
+        """Returns (old, new) confidence of the group with this label, or None if this user doesn't have it"""
+        group_id = self.vocabulary.label_to_group.get(label)
+        row = self.group_rows.get(group_id)
+        if row is None:
+            return None
+        self._dirty_groups.add(group_id)
+        return self.group_effects.adjust_confidence(row, adjustment)
+    
+    def apply_journal_record(self, record):
+        if record['op'] == 'observation':
+            self.add_observation(
+                [tuple(keyword) for keyword in record['keywords']],
+                [tuple(emotion) for emotion in record['emotions']],
+                record['mood_rating'],
+                record['energy_rating']
+            )
+        elif record['op'] == 'correction':
+            self.correct_observation(
+                [tuple(keyword) for keyword in record['previous_keywords']],
+                [tuple(keyword) for keyword in record['keywords']],
+                [tuple(emotion) for emotion in record['emotions']],
+                record['mood_rating'],
+                record['energy_rating']
+            )
+        elif record['op'] == 'confidence':
+            self.adjust_confidence(record['label'], record['adjustment'])
+        self.journal_seq = record['seq']
+    
+    def _update_pattern_fields(self, group_ids):
+        """Cache the given groups' pattern fields (None for groups that aren't patterns yet)"""
+        group_ids = list(group_ids)
+        if not group_ids:
+            return
+        effects = self.group_effects
+        rows = [self.group_rows[group_id] for group_id in group_ids]
+        is_pattern, mood_columns, moods, energies = effects.dominant_effects(rows)
+        confidences = effects.confidence[rows].tolist()
+        counts = effects.observation_count[rows].tolist()
+        vocabulary = self.vocabulary
+        
+        for i, group_id in enumerate(group_ids):
+            if not is_pattern[i]:
+                self._pattern_cache[group_id] = None
+                continue
+            self._pattern_cache[group_id] = {
+                'group_label': vocabulary.group_label(group_id),
+                # Sorted, so fields compare equal to the ones a stream sent before a reload
+                'activities': sorted(self.group_activities[rows[i]]),
+                'effect_on_mood': float(moods[i]),
+                'effect_on_energy': float(energies[i]),
+                'primary_emotion': effects.labels[mood_columns[i]],
+                'confidence': confidences[i],
+                'observation_count': counts[i]
+            }
+    
+    def _view_key(self, group_id, min_confidence):
+        fields = self._pattern_cache[group_id]
+        if fields is None or fields['confidence'] < min_confidence:
+            return None
+        return (-fields['confidence'], group_id)
+    
+    def _pattern_view(self, min_confidence):
+        if self._dirty_groups:
+            self._update_pattern_fields(self._dirty_groups)
+            for stream in self._streams.values():
+                stream['pending'].update(self._dirty_groups)
+            for threshold, (keys, members) in self._pattern_views.items():
+                for group_id in self._dirty_groups:
+                    old_key = members.pop(group_id, None)
+                    if old_key is not None:
+                        del keys[bisect_left(keys, old_key)]
+                    new_key = self._view_key(group_id, threshold)
+                    if new_key is not None:
+                        insort(keys, new_key)
+                        members[group_id] = new_key
+            self._dirty_groups = set()
+        
+        if min_confidence not in self._pattern_views:
+            self._update_pattern_fields(group_id for group_id in self.row_groups if group_id not in self._pattern_cache)
+            members = {}
+            for group_id in self.row_groups:
+                key = self._view_key(group_id, min_confidence)
+                if key is not None:
+                    members[group_id] = key
+            self._pattern_views[min_confidence] = (sorted(members.values()), members)
+        return self._pattern_views[min_confidence][0]
+    
+    def _invalidate_patterns(self):
+        self._dirty_groups = set()
+        self._pattern_cache = {}
+        self._pattern_views = {}
+        self._streams = {}
+    
+    def pattern_message(self, stream, min_confidence=0.2, full=False):
+        """Fields of the next pattern message on a stream, a delta unless a full one is due"""
         overall_avg_mood, overall_avg_energy = self._calculate_overall_averages()
+        view = self._pattern_view(min_confidence)
+        members = self._pattern_views[min_confidence][1]
+        state = self._streams.get(stream)
         
-        for group_id, group_data in self.activity_groups.items():
-            effect_data = self.group_effects[group_id]
-            
-            if effect_data['confidence'] >= min_confidence and effect_data['observation_count'] >= 1.5:
-                if effect_data['mood_outcomes'] and effect_data['energy_outcomes']:
-                    dominant_mood = max(effect_data['mood_outcomes'].items(), key=lambda x: abs(x[1]))
-                    dominant_energy = max(effect_data['energy_outcomes'].items(), key=lambda x: abs(x[1]))
-                    
-                    patterns.append({
-                        'group_label': group_data['label'],
-                        'activities': list(group_data['activities']),
-                        'effect_on_mood': dominant_mood[1],
-                        'effect_on_energy': dominant_energy[1],
-                        'mood_change_from_avg': dominant_mood[1] - overall_avg_mood,
-                        'energy_change_from_avg': dominant_energy[1] - overall_avg_energy,
-                        'primary_emotion': dominant_mood[0],
-                        'confidence': effect_data['confidence'],
-                        'observation_count': effect_data['observation_count']
-                    })
+        is_full = full or state is None or state['min_confidence'] != min_confidence
+        if is_full:
+            seq = state['seq'] + 1 if state is not None else 1
+            base_seq = 0
+            sent = {group_id: self._pattern_cache[group_id] for _, group_id in view}
+            patterns = list(sent.values())
+            removed = []
+            self._streams[stream] = {'seq': seq, 'min_confidence': min_confidence, 'sent': sent, 'pending': set()}
+        else:
+            seq = state['seq'] + 1
+            base_seq = state['seq']
+            sent = state['sent']
+            patterns = []
+            removed = []
+            for group_id in sorted(state['pending']):
+                fields = self._pattern_cache[group_id]
+                if group_id in members:
+                    if sent.get(group_id) != fields:
+                        patterns.append(fields)
+                        sent[group_id] = fields
+                elif group_id in sent:
+                    removed.append(sent.pop(group_id)['group_label'])
+            state['seq'] = seq
+            state['pending'] = set()
         
-        return sorted(patterns, key=lambda x: x['confidence'], reverse=True)
+        return {
+            'patterns': patterns,
+            'removed': removed,
+            'seq': seq,
+            'base_seq': base_seq,
+            'is_full': is_full,
+            'total_patterns': len(view),
+            # Keys are (-confidence, group_id), so these are the ones above 0.7
+            'high_confidence_patterns': bisect_left(view, (-0.7, -1)),
+            'overall_avg_mood': overall_avg_mood,
+            'overall_avg_energy': overall_avg_energy
+        }
     
-    def save_state(self, filename):
+    def start_from_seed(self, seed_seq):
+        self.restore_state(self.vocabulary.seed(seed_seq))
+        self._streams = {}
+        self.seed_seq = seed_seq
+        # None of this user's journal records are in the seed, so replay starts from 0
+        self.journal_seq = 0
+    
+    def _state(self):
         state = {
-            'activity_groups': self.activity_groups,
             'group_effects': self.group_effects,
-            'activity_to_group': self.activity_to_group,
-            'next_group_id': self.next_group_id
+            'row_groups': self.row_groups,
+            'group_activities': self.group_activities,
+            'baseline_initialized': self.baseline_initialized,
+            'journal_seq': self.journal_seq,
+            'seed_seq': self.seed_seq,
+            'streams': {
+                stream: {'seq': stream_state['seq'], 'min_confidence': stream_state['min_confidence'], 'sent': stream_state['sent']}
+                for stream, stream_state in self._streams.items()
+            }
         }
-        with open(filename, 'wb') as f:
-            pickle.dump(state, f)
+        if self.seed_seq is None:
+            return state
+        
+        # Only the rows that differ from the seed, and the rows added after it
+        seed = self.vocabulary.seed(self.seed_seq, copy=False)
+        seed_rows = len(seed['row_groups'])
+        rows = set(self.group_effects.changed_rows(seed['group_effects']).tolist())
+        rows.update(row for row in range(seed_rows) if self.group_activities[row] != seed['group_activities'][row])
+        rows = sorted(rows)
+        state['group_effects'] = self.group_effects.rows_state(rows)
+        state['row_groups'] = self.row_groups[seed_rows:]
+        state['group_activities'] = {row: self.group_activities[row] for row in rows}
+        return state
     
-    def load_state(self, filename):
-        try:
-            with open(filename, 'rb') as f:
-                state = pickle.load(f)
-            self.activity_groups = state['activity_groups']
+    def save_state(self, filename):
+        save_state_file(filename, self._state())
+    
+    def embedding_stats(self):
+        return self.vocabulary.embedding_stats()
+    
+    def restore_state(self, state):
+        self.seed_seq = state.get('seed_seq')
+        if self.seed_seq is None:
             self.group_effects = state['group_effects']
-            self.activity_to_group = state['activity_to_group']
-            self.next_group_id = state['next_group_id']
-            return True
-        except FileNotFoundError:
-            return False
+            self.row_groups = state['row_groups']
+            self.group_activities = state['group_activities']
+        else:
+            seed = self.vocabulary.seed(self.seed_seq)
+            self.group_effects = seed['group_effects']
+            self.group_effects.restore_rows(state['group_effects'])
+            self.row_groups = seed['row_groups'] + state['row_groups']
+            self.group_activities = seed['group_activities'] + [set() for _ in state['row_groups']]
+            for row, activities in state['group_activities'].items():
+                self.group_activities[row] = activities
+        self.group_rows = {group_id: row for row, group_id in enumerate(self.row_groups)}
+        self.baseline_initialized = state.get('baseline_initialized', False)
+        self.journal_seq = state.get('journal_seq', 0)
+        self._invalidate_patterns()
+        # Pattern fields are recomputed after a load, so every group is compared with what was sent
+        self._streams = {
+            stream: {**stream_state, 'pending': set(self.row_groups)}
+            for stream, stream_state in state.get('streams', {}).items()
+        }
+    
+    def load_state(self, filename):
+        return load_state_file(filename, self.restore_state)
+
+def user_state_path(user_id):
+    # Hashed fan-out keeps any one directory to a few thousand users
+    digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+    return os.path.join(PATTERN_USERS_DIR, digest[:2], quote(user_id, safe="") + ".pkl")
+
+def load_user_finder(user_id):
+    finder = SemanticPatternFinder(vocabulary)
+    return finder if finder.load_state(user_state_path(user_id)) else None
+
+def save_user_finder(user_id, finder):
+    # The saved journal_seq must not get ahead of the journal on disk: replay recreates the
+    # groups this user's rows point at from the records up to it
+    journal.flush()
+    path = user_state_path(user_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    finder.save_state(path)
+
+def new_user_finder(seed_seq):
+    finder = SemanticPatternFinder(vocabulary)
+    if seed_seq is not None:
+        finder.start_from_seed(seed_seq)
+    return finder
+
+def create_user_finder(user_id):
+    return new_user_finder(vocabulary.seed_seq if user_id != SEED_USER else None)
+
+def record_changes(user_id, finder, records):
+    """Journal changes that have already been applied to the user's finder (in one write), compacting when due"""
+    records = [{'user_id': user_id, **record} for record in records]
+    if finder.journal_seq == 0 and finder.seed_seq is not None:
+        # Replay creates users from their first record, and has to start them from the seed they
+        # started from live (users created before the seed arrived start empty)
+        records[0]['seed_seq'] = finder.seed_seq
+    finder.journal_seq = vocabulary.journal_seq = journal.extend(records)
+    user_finders.mark_dirty(user_id)
+    if journal.needs_compaction:
+        write_snapshot()
+
+def stream_message(user_id, finder, stream, min_confidence, full=False):
+    """Fields of the user's next pattern message on a stream, whose new position is saved with the user"""
+    fields = finder.pattern_message(stream, min_confidence=min_confidence, full=full)
+    user_finders.mark_dirty(user_id)
+    return fields
+
+def write_snapshot(seed=None):
+    """Save the vocabulary and every user changed since their last save, and empty the journal
+
+    With a seed user's finder, its state becomes the seed new users start from.
+    """
+    def save(seq):
+        user_finders.save_dirty()
+        # Saved last: its journal_seq is where replay starts, and users saved on eviction since
+        # the previous one may use groups created after it
+        vocabulary.journal_seq = seq
+        if seed is not None:
+            # Part of the snapshot, so it's never on disk without its groups, and only records
+            # journaled after it can start users from it
+            vocabulary.set_seed(seed._state(), seq)
+        if PATTERN_SNAPSHOT_FORMAT == "columnar":
+            vocabulary.save_snapshot(PATTERN_VOCABULARY_DIR, dtype=PATTERN_SNAPSHOT_DTYPE)
+        else:
+            vocabulary.save_state(PATTERN_VOCABULARY_FILE)
+    journal.compact(save)
+
+def recover_state(ctx):
+    """Vocabulary snapshot plus whatever was journaled after it"""
+    if PATTERN_SNAPSHOT_FORMAT == "columnar":
+        vocabulary.load_snapshot(PATTERN_VOCABULARY_DIR)
+    else:
+        vocabulary.load_state(PATTERN_VOCABULARY_FILE)
+    
+    snapshot_seq = vocabulary.journal_seq
+    records = journal.replay(after_seq=snapshot_seq)
+    for record in records:
+        user_id = record['user_id']
+        # Users without a saved state start from the seed they started from live
+        finder = user_finders.get(user_id, create=lambda _: new_user_finder(record.get('seed_seq')))
+        # Users saved on eviction already contain their records up to their own journal_seq,
+        # but the groups those records created have to be created again, in journal order
+        if record['seq'] > finder.journal_seq:
+            finder.apply_journal_record(record)
+            user_finders.mark_dirty(user_id)
+        elif record['op'] in ('observation', 'correction'):
+            vocabulary.resolve([tuple(keyword) for keyword in record['keywords']])
+        vocabulary.journal_seq = record['seq']
+    
+    ctx.logger.info(f"Recovered {len(vocabulary.activity_groups)} shared activity groups (snapshot seq {snapshot_seq}, "
+                    f"{len(records)} journal records replayed), {len(user_finders)} users resident")
 
 @pattern_finder_agent.on_event("startup")
 async def initialize_pattern_finder(ctx: Context):
-    global pattern_finder
+    global vocabulary, user_finders, journal, observation_queue, observation_batch_task
     ctx.logger.info("Initializing Pattern Finder...")
     
-    pattern_finder = SemanticPatternFinder(similarity_threshold=0.85)
+    vocabulary = SharedVocabulary(create_embedding_cache(), similarity_threshold=0.85)
+    user_finders = UserStateCache(
+        create_user_finder,
+        load_user_finder,
+        save_user_finder,
+        max_resident=MAX_RESIDENT_USERS
+    )
+    journal = StateJournal(
+        PATTERN_JOURNAL_FILE,
+        fsync_every=JOURNAL_FSYNC_EVERY,
+        fsync_interval=JOURNAL_FSYNC_INTERVAL,
+        compact_every=JOURNAL_COMPACT_EVERY
+    )
+    recover_state(ctx)
+    
+    # Start collecting live entries into micro-batches
+    observation_queue = MicroBatchQueue(OBSERVATION_BATCH_MAX_SIZE, OBSERVATION_BATCH_WAIT, OBSERVATION_QUEUE_MAX_DEPTH)
+    observation_batch_task = asyncio.create_task(observation_batch_worker())
     ctx.logger.info("Pattern Finder initialized, waiting for baseline data...")
 
+@pattern_finder_agent.on_interval(period=JOURNAL_FSYNC_INTERVAL)
+async def flush_journal(ctx: Context):
+    # Records appended since the last fsync shouldn't wait for the next message
+    if journal is not None:
+        journal.flush()
+
+@pattern_finder_agent.on_event("shutdown")
+async def close_journal(ctx: Context):
+    # Replay on the next start picks up everything journaled, so an fsync is all that's needed here
+    if journal is not None:
+        journal.close()
+
+@pattern_finder_agent.on_interval(period=USER_STATS_INTERVAL)
+async def log_user_stats(ctx: Context):
+    if user_finders is not None:
+        ctx.logger.info(f"User finders: {user_finders.stats()}")
+        ctx.logger.info(f"Observation batches: {observation_queue.metrics}")
+        ctx.logger.info(f"Journal: {journal.stats()}")
+
 @pattern_finder_agent.on_message(model=BaselineInitMessage)
 async def handle_baseline_init(ctx: Context, sender: str, msg: BaselineInitMessage):
-    global baseline_initialized
-    ctx.logger.info(f"RECEIVED BASELINE: {msg.total_entries} entries from {sender}")
+    ctx.logger.info(f"RECEIVED BASELINE: {msg.total_entries} entries for {msg.user_id} from {sender}")
     
-    if pattern_finder is None:
+    if user_finders is None:
         ctx.logger.error("Pattern finder not initialized yet!")
         return
     
     try:
-        ctx.logger.info(f"Processing {len(msg.baseline_data)} baseline entries in batch...")
-        
-        pattern_finder.batch_add_observations(msg.baseline_data)
-        ctx.logger.info(f"Completed batch processing of {len(msg.baseline_data)} baseline entries")
-        
-        pattern_finder.save_state(PATTERN_CACHE_FILE)
-        baseline_initialized = True
-        
-        patterns = pattern_finder.get_patterns(min_confidence=0.1)
-        
-        ctx.logger.info(f"BASELINE COMPLETE! Generated {len(patterns)} patterns")
+        pattern_finder = user_finders.get(msg.user_id)
+        if pattern_finder.baseline_initialized:
+            # Already part of the recovered state, adding it again would count every entry twice
+            ctx.logger.info("Baseline already in recovered state, skipping re-ingest")
+        else:
+            ctx.logger.info(f"Processing {len(msg.baseline_data)} baseline entries in batch...")
+            
+            pattern_finder.batch_add_observations(msg.baseline_data)
+            ctx.logger.info(f"Completed batch processing of {len(msg.baseline_data)} baseline entries")
+            
+            # Not journaled, so snapshotted right away
+            pattern_finder.baseline_initialized = True
+            user_finders.mark_dirty(msg.user_id)
+            write_snapshot(seed=pattern_finder if msg.user_id == SEED_USER else None)
         
-        # Create baseline analysis message FOR CURATOR (old format)
+        # Create baseline analysis message FOR CURATOR (old format), always a full one
         analysis_msg = PatternAnalysisMessage(
-            patterns=patterns,
             user_id=msg.user_id,
-            total_patterns=len(patterns),
-            high_confidence_patterns=len([p for p in patterns if p['confidence'] > 0.7]),
-            is_baseline=True
+            is_baseline=True,
+            **stream_message(msg.user_id, pattern_finder, CURATOR_STREAM, min_confidence=0.1, full=True)
         )
         
+        ctx.logger.info(f"BASELINE COMPLETE! Generated {analysis_msg.total_patterns} patterns")
+        ctx.logger.info(f"Embedding cache: {pattern_finder.embedding_stats()}")
+        
         # Send to curator (old format)
         await asyncio.sleep(1)
         await ctx.send("agent1qdr8zekrarc5hhyhxju7suyr8nfxe6j8q9kgxa9007v8wmdvraw9z0uw37v", analysis_msg)
@@ -315,66 +878,134 @@ async def handle_baseline_init(ctx: Context, sender: str, msg: BaselineInitMessa
 
 @pattern_finder_agent.on_message(model=ExtractedDataMessage)
 async def handle_extracted_data(ctx: Context, sender: str, msg: ExtractedDataMessage):
-    ctx.logger.info(f"Processing NEW daily entry from {sender}")
+    ctx.logger.info(f"Queueing NEW daily entry for {msg.user_id} from {sender}")
     
-    if pattern_finder is None:
+    if observation_queue is None:
         ctx.logger.error("Pattern finder not initialized yet!")
         return
-        
-    if not baseline_initialized:
-        ctx.logger.warning("Baseline not initialized yet, processing new entry anyway...")
     
-    try:
-        # Add single observation to pattern finder
+    await observation_queue.put(ctx, msg)
+
+@pattern_finder_agent.on_message(model=ExtractionCorrectionMessage)
+async def handle_extraction_correction(ctx: Context, sender: str, msg: ExtractionCorrectionMessage):
+    ctx.logger.info(f"Queueing refined keywords for {msg.user_id} from {sender}")
+    
+    if observation_queue is None:
+        ctx.logger.error("Pattern finder not initialized yet!")
+        return
+    
+    # Same queue as the entries, so it's applied after the observation it corrects
+    await observation_queue.put(ctx, msg)
+
+async def observation_batch_worker():
+    """Collect queued entries into micro-batches and apply each batch in one pass"""
+    while True:
+        batch = await observation_queue.next_batch()
+        try:
+            await process_observation_batch(batch)
+        except Exception as e:
+            batch[0][0].logger.error(f"Error processing observation batch: {str(e)}")
+
+def apply_user_entries(user_id, entries):
+    """Apply and journal one user's entries from a batch, returns their analysis message"""
+    pattern_finder = user_finders.get(user_id)
+    ctx = entries[-1][0]
+    if not pattern_finder.baseline_initialized:
+        ctx.logger.warning(f"Baseline not initialized yet for {user_id}, processing new entries anyway...")
+    
+    records = []
+    for _, msg in entries:
+        if isinstance(msg, ExtractionCorrectionMessage):
+            pattern_finder.correct_observation(
+                msg.previous_keywords,
+                msg.keywords,
+                msg.emotions,
+                msg.mood_rating,
+                msg.energy_rating
+            )
+            records.append({
+                'op': 'correction',
+                'previous_keywords': msg.previous_keywords,
+                'keywords': msg.keywords,
+                'emotions': msg.emotions,
+                'mood_rating': msg.mood_rating,
+                'energy_rating': msg.energy_rating
+            })
+            continue
         pattern_finder.add_observation(
             msg.keywords,
             msg.emotions,
             msg.mood_rating,
             msg.energy_rating
         )
-        
-        pattern_finder.save_state(PATTERN_CACHE_FILE)
-        
-        # Get current patterns
-        patterns = pattern_finder.get_patterns(min_confidence=0.2)
-        ctx.logger.info(f"Found {len(patterns)} patterns with confidence >= 0.2")
-        
-        # Create response message
-        analysis_msg = PatternAnalysisMessage(
-            patterns=patterns,
-            user_id=msg.user_id,
-            total_patterns=len(patterns),
-            high_confidence_patterns=len([p for p in patterns if p['confidence'] > 0.7]),
-            is_baseline=False
-        )
-        
-        # Send to curator agent
-        await ctx.send("agent1qdr8zekrarc5hhyhxju7suyr8nfxe6j8q9kgxa9007v8wmdvraw9z0uw37v", analysis_msg)
-        ctx.logger.info("Sent pattern analysis to curator")
-        
-    except Exception as e:
-        ctx.logger.error(f"Error processing extracted data: {str(e)}")
+        records.append({
+            'op': 'observation',
+            'keywords': msg.keywords,
+            'emotions': msg.emotions,
+            'mood_rating': msg.mood_rating,
+            'energy_rating': msg.energy_rating
+        })
+    # Journaled before moving on to the next user, whose lookup may evict (and save) this one
+    record_changes(user_id, pattern_finder, records)
+    
+    # Only what changed since the curator's last message for this user
+    analysis_msg = PatternAnalysisMessage(
+        user_id=user_id,
+        is_baseline=False,
+        **stream_message(user_id, pattern_finder, CURATOR_STREAM, min_confidence=0.2)
+    )
+    ctx.logger.info(
+        f"Found {analysis_msg.total_patterns} patterns with confidence >= 0.2 for {user_id} after {len(entries)} new entries "
+        f"({len(analysis_msg.patterns)} added or changed, {len(analysis_msg.removed)} removed)"
+    )
+    return analysis_msg
+
+async def process_observation_batch(batch):
+    first_ctx = batch[0][0]
+    
+    # Entries of the same user stay in arrival order
+    by_user = {}
+    for ctx, msg, _ in batch:
+        by_user.setdefault(msg.user_id, []).append((ctx, msg))
+    
+    wait_ms = observation_queue.record_batch(batch, users=len(by_user))
+    
+    first_ctx.logger.info(
+        f"Applying batch of {len(batch)} entries from {len(by_user)} users "
+        f"(waited {wait_ms:.1f}ms, queue depth {observation_queue.metrics['queue_depth']})"
+    )
+    
+    analyses = []
+    for user_id, entries in by_user.items():
+        try:
+            analyses.append((entries[-1][0], apply_user_entries(user_id, entries)))
+        except Exception as e:
+            first_ctx.logger.error(f"Error processing extracted data for {user_id}: {str(e)}")
+    
+    # Send to curator agent, one analysis per user
+    for ctx, analysis_msg in analyses:
+        try:
+            await ctx.send("agent1qdr8zekrarc5hhyhxju7suyr8nfxe6j8q9kgxa9007v8wmdvraw9z0uw37v", analysis_msg)
+            ctx.logger.info(f"Sent pattern analysis for {analysis_msg.user_id} to curator")
+        except Exception as e:
+            ctx.logger.error(f"Error sending pattern analysis: {str(e)}")
 
 @pattern_finder_agent.on_message(model=ConfidenceUpdateMessage)
 async def handle_confidence_update(ctx: Context, sender: str, msg: ConfidenceUpdateMessage):
     """Handle confidence adjustments from curator"""
     ctx.logger.info(f"Adjusting confidence for '{msg.pattern_id}' by {msg.confidence_adjustment:+.2f}")
     
-    if pattern_finder is None:
+    if user_finders is None:
         return
     
     try:
-        # Find and update the pattern confidence
-        for group_id, group_data in pattern_finder.activity_groups.items():
-            if group_data['label'] == msg.pattern_id:
-                effect_data = pattern_finder.group_effects[group_id]
-                old_confidence = effect_data['confidence']
-                new_confidence = max(0.0, min(1.0, old_confidence + msg.confidence_adjustment))
-                effect_data['confidence'] = new_confidence
-                
-                ctx.logger.info(f"Updated confidence: {old_confidence:.2f} -> {new_confidence:.2f}")
-                pattern_finder.save_state(PATTERN_CACHE_FILE)
-                break
+        # Label index lookup, then only the delta goes to the journal
+        pattern_finder = user_finders.get(msg.user_id)
+        adjusted = pattern_finder.adjust_confidence(msg.pattern_id, msg.confidence_adjustment)
+        if adjusted is not None:
+            old_confidence, new_confidence = adjusted
+            ctx.logger.info(f"Updated confidence: {old_confidence:.2f} -> {new_confidence:.2f}")
+            record_changes(msg.user_id, pattern_finder, [{'op': 'confidence', 'label': msg.pattern_id, 'adjustment': msg.confidence_adjustment}])
         else:
             ctx.logger.warning(f"Pattern '{msg.pattern_id}' not found for confidence update")
                 
@@ -387,22 +1018,18 @@ async def handle_planner_trigger(ctx: Context, sender: str, msg: PlannerTriggerM
     ctx.logger.info(f"Curator triggered planner update: {msg.reason}")
     ctx.logger.info(f"Focus patterns: {msg.patterns_to_focus}")
     
-    if pattern_finder is None:
+    if user_finders is None:
         return
     
     try:
-        # Get current patterns
-        patterns = pattern_finder.get_patterns(min_confidence=0.2)
-        
-        # Create the NEW analysis message with focus information
+        pattern_finder = user_finders.get(msg.user_id)
+        # Create the NEW analysis message with focus information, changes since the planner's last one
         analysis_msg = PatternAnalysisForPlannerMessage(
-            patterns=patterns,
             user_id=msg.user_id,
-            total_patterns=len(patterns),
-            high_confidence_patterns=len([p for p in patterns if p['confidence'] > 0.7]),
             focus_patterns=msg.patterns_to_focus,  # Pass the focus patterns
             trigger_reason=msg.reason,             # Pass the trigger reason
-            is_baseline=False
+            is_baseline=False,
+            **stream_message(msg.user_id, pattern_finder, PLANNER_STREAM, min_confidence=0.2)
         )
         
         # Send directly to planner
@@ -412,5 +1039,40 @@ async def handle_planner_trigger(ctx: Context, sender: str, msg: PlannerTriggerM
     except Exception as e:
         ctx.logger.error(f"Error sending to planner: {str(e)}")
 
+@pattern_finder_agent.on_message(model=PatternResyncRequestMessage)
+async def handle_resync_request(ctx: Context, sender: str, msg: PatternResyncRequestMessage):
+    """A receiver missed a pattern message (or lost its state), send it every pattern again"""
+    ctx.logger.info(f"Resync of {msg.stream} patterns requested for {msg.user_id}")
+    
+    if user_finders is None:
+        return
+    
+    try:
+        pattern_finder = user_finders.get(msg.user_id)
+        if msg.stream == PLANNER_STREAM:
+            # Stands in for the delta the planner dropped, so it carries the same focus
+            analysis_msg = PatternAnalysisForPlannerMessage(
+                user_id=msg.user_id,
+                focus_patterns=msg.focus_patterns,
+                trigger_reason=msg.trigger_reason,
+                is_baseline=False,
+                **stream_message(msg.user_id, pattern_finder, PLANNER_STREAM, min_confidence=0.2, full=True)
+            )
+            await ctx.send("agent1qwvypts2ft35u3w4uhg8da0cj5edkmp0k7slvjqtekas26t4evxj7xk7a4g", analysis_msg)
+        elif msg.stream == CURATOR_STREAM:
+            analysis_msg = PatternAnalysisMessage(
+                user_id=msg.user_id,
+                is_baseline=False,
+                **stream_message(msg.user_id, pattern_finder, CURATOR_STREAM, min_confidence=0.2, full=True)
+            )
+            await ctx.send("agent1qdr8zekrarc5hhyhxju7suyr8nfxe6j8q9kgxa9007v8wmdvraw9z0uw37v", analysis_msg)
+        else:
+            ctx.logger.warning(f"Unknown pattern stream '{msg.stream}'")
+            return
+        ctx.logger.info(f"Sent all {analysis_msg.total_patterns} patterns to {msg.stream} (seq {analysis_msg.seq})")
+        
+    except Exception as e:
+        ctx.logger.error(f"Error resyncing patterns: {str(e)}")
+
 if __name__ == "__main__":
     pattern_finder_agent.run()
\ No newline at end of file
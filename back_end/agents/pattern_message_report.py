@@ -0,0 +1,88 @@
+'''
+Size and serialization time of the pattern analysis messages at each --patterns count: the full
+message every entry used to send (every pattern, with its change from the overall averages) next to
+the delta sent now (the --changed patterns an entry touched, plus --removed labels). Also times
+the receiving end, PatternStreams.apply, rebuilding the full list from the delta. Patterns are
+synthetic with --activities keywords each; messages are serialized with json, like the agents'.
+
+Usage: python pattern_message_report.py [--patterns 100 1000 10000] [--changed 10] [--removed 1] [--activities 8] [--output report.json]
+'''
+
+import json
+import random
+import time
+from types import SimpleNamespace
+
+from pattern_stream import PatternStreams, with_averages
+from report_utils import report_parser, print_table, write_report
+
+EMOTIONS = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
+
+def synthesize_fields(rng, label, activities):
+    """Pattern fields as SemanticPatternFinder.pattern_message sends them"""
+    return {
+        'group_label': label,
+        'activities': [f"{label} {i}" for i in range(activities)],
+        'effect_on_mood': rng.uniform(1, 10),
+        'effect_on_energy': rng.uniform(1, 10),
+        'primary_emotion': rng.choice(EMOTIONS),
+        'confidence': rng.uniform(0.2, 1.0),
+        'observation_count': rng.uniform(1, 50)
+    }
+
+def message(user_id, patterns, removed, seq, base_seq, is_full):
+    return SimpleNamespace(user_id=user_id, patterns=patterns, removed=removed, seq=seq, base_seq=base_seq,
+                           is_full=is_full, overall_avg_mood=5.0, overall_avg_energy=5.0)
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+def measure(patterns, changed, removed, activities, repeat, seed=0):
+    rng = random.Random(seed)
+    fields = [synthesize_fields(rng, f"activity_{i}", activities) for i in range(patterns)]
+    full = [with_averages(pattern, 5.0, 5.0) for pattern in fields]
+    full_text, full_ms = timed(lambda: json.dumps({'patterns': full}), repeat)
+
+    upserts = [synthesize_fields(rng, pattern['group_label'], activities) for pattern in rng.sample(fields, changed)]
+    labels = [pattern['group_label'] for pattern in rng.sample(fields, removed)]
+    delta_text, delta_ms = timed(lambda: json.dumps({'patterns': upserts, 'removed': labels}), repeat)
+
+    streams = PatternStreams()
+    streams.apply(message("user", fields, [], 1, 0, True))
+    start = time.perf_counter()
+    for seq in range(2, repeat + 2):
+        streams.apply(message("user", upserts, labels, seq, seq - 1, False))
+    apply_ms = (time.perf_counter() - start) / repeat * 1000
+
+    return {
+        'patterns': patterns,
+        'full_bytes': len(full_text),
+        'delta_bytes': len(delta_text),
+        'full_serialize_ms': full_ms,
+        'delta_serialize_ms': delta_ms,
+        'receiver_apply_ms': apply_ms
+    }
+
+def main():
+    parser = report_parser(__doc__, output="pattern_message_report.json")
+    parser.add_argument("--patterns", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--changed", type=int, default=10, help="Patterns added or changed per message")
+    parser.add_argument("--removed", type=int, default=1, help="Patterns removed per message")
+    parser.add_argument("--activities", type=int, default=8, help="Keywords per pattern")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = [measure(patterns, args.changed, args.removed, args.activities, args.repeat) for patterns in args.patterns]
+
+    rows = [[result['patterns'], f"{result['full_bytes'] / 1024:.1f}", f"{result['delta_bytes'] / 1024:.1f}",
+             f"{result['full_serialize_ms']:.2f}", f"{result['delta_serialize_ms']:.3f}", f"{result['receiver_apply_ms']:.2f}"]
+            for result in results]
+    print_table(["patterns", "full KB", "delta KB", "full ms", "delta ms", "apply ms"], rows)
+
+    write_report(args.output, {'args': vars(args), 'results': results})
+
+if __name__ == "__main__":
+    main()
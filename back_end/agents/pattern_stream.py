@@ -0,0 +1,51 @@
+# Pattern analysis messages are delta encoded per user and receiving agent: patterns holds the
+# patterns added or changed since message base_seq (all of them when is_full), removed the labels
+# that stopped being patterns, and the overall averages are sent once instead of with every pattern.
+
+class PatternStreams:
+    """Each user's patterns as of the last pattern message applied"""
+
+    def __init__(self):
+        # user_id -> {'seq': last seq applied, 'patterns': {label: pattern fields}}
+        self._users = {}
+
+    def __len__(self):
+        return len(self._users)
+
+    def seq(self, user_id):
+        """Seq of the last message applied for the user, 0 if none"""
+        stream = self._users.get(user_id)
+        return stream['seq'] if stream is not None else 0
+
+    def apply(self, msg):
+        """The user's full pattern list after msg, or None if msg is a delta that doesn't follow on"""
+        if msg.is_full:
+            patterns = {}
+        else:
+            stream = self._users.get(msg.user_id)
+            if stream is None or stream['seq'] != msg.base_seq:
+                return None
+            patterns = stream['patterns']
+
+        for label in msg.removed:
+            patterns.pop(label, None)
+        for pattern in msg.patterns:
+            patterns[pattern['group_label']] = pattern
+        self._users[msg.user_id] = {'seq': msg.seq, 'patterns': patterns}
+
+        ordered = sorted(patterns.values(), key=lambda pattern: (-pattern['confidence'], pattern['group_label']))
+        return [with_averages(pattern, msg.overall_avg_mood, msg.overall_avg_energy) for pattern in ordered]
+
+def with_averages(fields, overall_avg_mood, overall_avg_energy):
+    """A pattern as the agents use it, from the fields the pattern finder sends"""
+    return {
+        'group_label': fields['group_label'],
+        'activities': fields['activities'],
+        'effect_on_mood': fields['effect_on_mood'],
+        'effect_on_energy': fields['effect_on_energy'],
+        'mood_change_from_avg': fields['effect_on_mood'] - overall_avg_mood,
+        'energy_change_from_avg': fields['effect_on_energy'] - overall_avg_energy,
+        'primary_emotion': fields['primary_emotion'],
+        'confidence': fields['confidence'],
+        'observation_count': fields['observation_count']
+    }
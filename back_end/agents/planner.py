@@ -7,12 +7,20 @@ import os
 import numpy as np
 import threading
 
+from pattern_stream import PatternStreams, with_averages
+
 class PatternAnalysisMessage(Model):
     patterns: List[Dict[str, Any]]
     user_id: str
     total_patterns: int
     high_confidence_patterns: int
     is_baseline: bool = False
+    seq: int = 0
+    base_seq: int = 0
+    is_full: bool = True
+    removed: List[str] = []
+    overall_avg_mood: float = 5.0
+    overall_avg_energy: float = 5.0
 
 class PatternAnalysisForPlannerMessage(Model):
     patterns: List[Dict[str, Any]]
@@ -22,6 +30,12 @@ class PatternAnalysisForPlannerMessage(Model):
     focus_patterns: List[str] = []  # Which patterns to focus on
     trigger_reason: str = ""
     is_baseline: bool = False
+    seq: int = 0
+    base_seq: int = 0
+    is_full: bool = True
+    removed: List[str] = []
+    overall_avg_mood: float = 5.0
+    overall_avg_energy: float = 5.0
 
 class ImmediatePlannerUpdateMessage(Model):
     user_id: str
@@ -29,6 +43,12 @@ class ImmediatePlannerUpdateMessage(Model):
     patterns_to_focus: List[str]
     updated_patterns: List[Dict[str, Any]]
 
+class PatternResyncRequestMessage(Model):
+    user_id: str
+    stream: str
+    focus_patterns: List[str] = []
+    trigger_reason: str = ""
+
 class PlannerRecommendationsMessage(Model):
     daily_suggestions: str
     weekly_report: str
@@ -307,6 +327,8 @@ class WellnessPlanner:
 
 # Global planner instance
 wellness_planner = None
+# Each user's patterns, rebuilt from the pattern finder's deltas
+planner_pattern_streams = PatternStreams()
 
 @planner_agent.on_event("startup")
 async def initialize_planner(ctx: Context):
@@ -325,9 +347,11 @@ async def initialize_planner(ctx: Context):
 @planner_agent.on_message(model=PatternAnalysisMessage)
 async def handle_pattern_analysis(ctx: Context, sender: str, msg: PatternAnalysisMessage):
     """Handle original pattern analysis messages (for backwards compatibility)"""
+    patterns = [with_averages(pattern, msg.overall_avg_mood, msg.overall_avg_energy) for pattern in msg.patterns]
+    
     # Convert to new format
     new_msg = PatternAnalysisForPlannerMessage(
-        patterns=msg.patterns,
+        patterns=patterns,
         user_id=msg.user_id,
         total_patterns=msg.total_patterns,
         high_confidence_patterns=msg.high_confidence_patterns,
@@ -335,10 +359,26 @@ async def handle_pattern_analysis(ctx: Context, sender: str, msg: PatternAnalysi
         trigger_reason="",
         is_baseline=msg.is_baseline
     )
-    await handle_focused_pattern_analysis(ctx, sender, new_msg)
+    await analyze_pattern_update(ctx, sender, new_msg, patterns)
 
 @planner_agent.on_message(model=PatternAnalysisForPlannerMessage)
 async def handle_focused_pattern_analysis(ctx: Context, sender: str, msg: PatternAnalysisForPlannerMessage):
+    patterns = planner_pattern_streams.apply(msg)
+    if patterns is None:
+        # The full resync that comes back carries this message's focus and is analyzed instead
+        ctx.logger.warning(f"Missed pattern messages for {msg.user_id} (have seq {planner_pattern_streams.seq(msg.user_id)}, "
+                           f"got a delta on {msg.base_seq}), requesting a resync")
+        await ctx.send(sender, PatternResyncRequestMessage(
+            user_id=msg.user_id,
+            stream="planner",
+            focus_patterns=msg.focus_patterns,
+            trigger_reason=msg.trigger_reason
+        ))
+        return
+    await analyze_pattern_update(ctx, sender, msg, patterns)
+
+async def analyze_pattern_update(ctx: Context, sender: str, msg: PatternAnalysisForPlannerMessage, patterns: List[Dict[str, Any]]):
+    """Analysis of the user's full pattern list, patterns, as of msg"""
     ctx.logger.info(f"Processing pattern analysis from {sender}")
     ctx.logger.info(f"Received {msg.total_patterns} patterns, {msg.high_confidence_patterns} high confidence")
     ctx.logger.info(f"Is baseline: {msg.is_baseline}")
@@ -353,16 +393,16 @@ async def handle_focused_pattern_analysis(ctx: Context, sender: str, msg: Patter
 
     try:
         # Filter patterns based on focus
-        patterns_to_analyze = wellness_planner.filter_patterns_by_focus(msg.patterns, msg.focus_patterns)
+        patterns_to_analyze = wellness_planner.filter_patterns_by_focus(patterns, msg.focus_patterns)
         
         if msg.focus_patterns:
-            ctx.logger.info(f"Filtered to {len(patterns_to_analyze)} focused patterns from {len(msg.patterns)} total")
+            ctx.logger.info(f"Filtered to {len(patterns_to_analyze)} focused patterns from {len(patterns)} total")
         
         # Send patterns to Flask server
         def send_patterns_to_flask():
             try:
                 send_to_flask_server("/api/agent_update/patterns", {
-                    "patterns": msg.patterns,
+                    "patterns": patterns,
                     "focus_patterns": msg.focus_patterns,
                     "trigger_reason": msg.trigger_reason,
                     "is_baseline": msg.is_baseline
@@ -381,7 +421,7 @@ async def handle_focused_pattern_analysis(ctx: Context, sender: str, msg: Patter
         if msg.is_baseline:
             # Handle comprehensive baseline establishment (use all patterns)
             ctx.logger.info("Processing COMPREHENSIVE BASELINE analysis...")
-            analysis = wellness_planner.analyze_baseline_patterns(msg.patterns)  # Use all patterns for baseline
+            analysis = wellness_planner.analyze_baseline_patterns(patterns)  # Use all patterns for baseline
             wellness_planner.baseline_established = True
             
             # Comprehensive baseline logging
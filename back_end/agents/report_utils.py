@@ -0,0 +1,44 @@
+import argparse
+import json
+import resource
+import time
+import numpy as np
+
+def report_parser(doc, output=None):
+    """Argument parser for a report script, with --output for its JSON results"""
+    parser = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=output, help="Write the results as JSON to this file")
+    return parser
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux (peak, not current, but the best we have elsewhere)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def peak_rss_mb():
+    return max(current_rss_mb(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+def latency_summary(latencies, percentiles=(50, 95)):
+    summary = {'mean': float(np.mean(latencies))}
+    for percentile in percentiles:
+        summary[f"p{percentile}"] = float(np.percentile(latencies, percentile))
+    return summary
+
+def print_table(headers, rows):
+    """Right-aligned columns, each as wide as its widest cell"""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers, *rows]:
+        print(" ".join(f"{str(cell):>{width}}" for cell, width in zip(row, widths)))
+
+def write_report(output, report):
+    if not output:
+        return
+    with open(output, 'w') as f:
+        json.dump({'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), **report}, f, indent=2)
+    print(f"\nResults written to {output}")
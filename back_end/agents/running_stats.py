@@ -0,0 +1,70 @@
+from bisect import bisect_left, insort
+
+class RunningMedian:
+    """Median of a multiset of floats that supports replacing values"""
+
+    def __init__(self, values=(), bucket_size=512):
+        self.bucket_size = bucket_size
+        values = sorted(values)
+        self._buckets = [values[i:i + bucket_size] for i in range(0, len(values), bucket_size)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._size = len(values)
+        self._median = None
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value):
+        self._median = None
+        self._size += 1
+        if not self._buckets:
+            self._buckets.append([value])
+            self._maxes.append(value)
+            return
+
+        i = min(bisect_left(self._maxes, value), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        insort(bucket, value)
+        self._maxes[i] = bucket[-1]
+        if len(bucket) > 2 * self.bucket_size:
+            self._buckets[i:i + 1] = [bucket[:self.bucket_size], bucket[self.bucket_size:]]
+            self._maxes[i:i + 1] = [bucket[self.bucket_size - 1], bucket[-1]]
+
+    def remove(self, value):
+        # Every value in a later bucket is >= this bucket's max, so value is here or nowhere
+        i = bisect_left(self._maxes, value)
+        if i < len(self._buckets):
+            bucket = self._buckets[i]
+            j = bisect_left(bucket, value)
+            if j < len(bucket) and bucket[j] == value:
+                del bucket[j]
+                if bucket:
+                    self._maxes[i] = bucket[-1]
+                else:
+                    del self._buckets[i], self._maxes[i]
+                self._size -= 1
+                self._median = None
+                return
+        raise ValueError(f"{value} is not in the running median")
+
+    def replace(self, old_value, new_value):
+        self.remove(old_value)
+        self.add(new_value)
+
+    def _kth(self, k):
+        for bucket in self._buckets:
+            if k < len(bucket):
+                return bucket[k]
+            k -= len(bucket)
+        raise IndexError(k)
+
+    def median(self):
+        if self._size == 0:
+            return None
+        if self._median is None:
+            middle = self._size // 2
+            if self._size % 2:
+                self._median = self._kth(middle)
+            else:
+                self._median = (self._kth(middle - 1) + self._kth(middle)) / 2
+        return self._median
@@ -0,0 +1,135 @@
+'''
+Load time, memory and size comparison of the pattern finder's vocabulary snapshot formats: the pickle
+written by SharedVocabulary.save_state and the memory-mapped columnar directory written by save_snapshot.
+Vocabularies are synthetic (random embeddings, two activities per group) at each --groups size.
+Every load runs in a fresh process. RSS is measured right after loading and again after one
+nearest-group search, which touches every embedding page of a memory-mapped snapshot. Mapped
+pages are clean page cache (shared, and dropped under pressure), so anonymous (private heap)
+memory is reported separately.
+
+Usage: python snapshot_format_report.py --groups 1000 10000 100000 [--dim 384] [--output report.json]
+'''
+
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import numpy as np
+
+import columnar_snapshot
+from group_index import create_group_index
+from report_utils import report_parser, current_rss_mb, print_table, write_report
+
+def synthesize_state(groups, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((groups, dim)).astype(np.float32)
+    group_index = create_group_index("auto", ann_min_groups=20_000)
+
+    activity_groups = {}
+    activity_to_group = {}
+    for group_id in range(groups):
+        label = f"activity_{group_id}"
+        activities = {label, f"{label} session"}
+        activity_groups[group_id] = {'activities': activities, 'embedding': embeddings[group_id], 'label': label}
+        for activity in activities:
+            activity_to_group[activity] = group_id
+        group_index.add(group_id, embeddings[group_id])
+
+    return {
+        'activity_groups': activity_groups,
+        'activity_to_group': activity_to_group,
+        'next_group_id': groups,
+        'group_index': group_index,
+        'group_index_kind': "auto",
+        'journal_seq': 0
+    }
+
+def directory_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def anonymous_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return current_rss_mb()
+
+def measure_load(snapshot_format, path, query):
+    rss_before = current_rss_mb()
+    anon_before = anonymous_rss_mb()
+    start = time.perf_counter()
+    if snapshot_format == "pickle":
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    else:
+        state = columnar_snapshot.read_snapshot(path)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    start = time.perf_counter()
+    group_id, similarity = state['group_index'].search(query, 0.0)
+    search_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'load_seconds': load_seconds,
+        'rss_after_load_mb': rss_loaded - rss_before,
+        'rss_after_search_mb': current_rss_mb() - rss_before,
+        'anon_after_search_mb': anonymous_rss_mb() - anon_before,
+        'first_search_ms': search_ms,
+        'nearest': [group_id, similarity]
+    }
+
+def main():
+    parser = report_parser(__doc__, output="snapshot_format_report.json")
+    parser.add_argument("--groups", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    work_dir = tempfile.mkdtemp(prefix="snapshot_report_")
+    results = []
+    try:
+        for groups in args.groups:
+            print(f"Building state with {groups} groups...")
+            state = synthesize_state(groups, args.dim)
+            query = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+
+            pickle_file = os.path.join(work_dir, f"state_{groups}.pkl")
+            start = time.perf_counter()
+            with open(pickle_file, 'wb') as f:
+                pickle.dump(state, f)
+            pickle_save = time.perf_counter() - start
+
+            formats = {'pickle': (pickle_file, pickle_save)}
+            for dtype in ("float32", "float16"):
+                directory = os.path.join(work_dir, f"columnar_{groups}_{dtype}")
+                start = time.perf_counter()
+                columnar_snapshot.write_snapshot(directory, state, dtype=dtype)
+                formats[f"columnar_{dtype}"] = (directory, time.perf_counter() - start)
+            del state
+
+            for name, (path, save_seconds) in formats.items():
+                with context.Pool(1) as pool:
+                    loaded = pool.apply(measure_load, ("pickle" if name == "pickle" else "columnar", path, query))
+                loaded.update({'groups': groups, 'format': name, 'save_seconds': save_seconds, 'bytes': directory_bytes(path)})
+                results.append(loaded)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    rows = [[result['groups'], result['format'], f"{result['bytes'] / 1e6:.1f}", f"{result['save_seconds']:.2f}",
+             f"{result['load_seconds']:.3f}", f"{result['rss_after_load_mb']:.1f}", f"{result['rss_after_search_mb']:.1f}",
+             f"{result['anon_after_search_mb']:.1f}", f"{result['first_search_ms']:.2f}"] for result in results]
+    print()
+    print_table(["groups", "format", "size MB", "save s", "load s", "RSS load", "RSS search", "anon MB", "search ms"], rows)
+
+    write_report(args.output, {'dim': args.dim, 'results': results})
+
+if __name__ == "__main__":
+    main()
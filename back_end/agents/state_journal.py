@@ -0,0 +1,128 @@
+import json
+import os
+import time
+
+def atomic_write(filename, write):
+    """Write through a temp file that is fsynced and renamed into place"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_filename, filename)
+
+    # Make the rename itself durable
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+class StateJournal:
+    """Append-only journal of state changes, one JSON record per line"""
+
+    def __init__(self, filename, fsync_every=32, fsync_interval=1.0, compact_every=1000):
+        self.filename = filename
+        # fsync once fsync_every records are pending or fsync_interval seconds have passed,
+        # and the owner should compact() (write a snapshot) after compact_every records
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self.seq = 0
+        self.records_since_compaction = 0
+        self.pending = 0
+        self.fsyncs = 0
+        self.last_fsync = time.monotonic()
+        self._file = None
+
+    def replay(self, after_seq=0):
+        """Records with a sequence number above after_seq, oldest first"""
+        self.seq = after_seq
+        records = []
+        good_bytes = 0
+        if os.path.exists(self.filename):
+            with open(self.filename, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    good_bytes += len(line)
+                    if record['seq'] > after_seq:
+                        records.append(record)
+                        self.seq = record['seq']
+
+            # Cut a torn last line (crash mid-append) so new records aren't appended after it
+            if good_bytes < os.path.getsize(self.filename):
+                with open(self.filename, 'r+b') as f:
+                    f.truncate(good_bytes)
+
+        self.records_since_compaction = len(records)
+        return records
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.filename, 'ab')
+        return self._file
+
+    def append(self, record):
+        """Write one record, returns its sequence number"""
+        return self.extend([record])
+
+    def extend(self, records):
+        """Write several records in one go, returns the last one's sequence number"""
+        lines = []
+        for record in records:
+            self.seq += 1
+            lines.append(json.dumps({'seq': self.seq, **record}, separators=(",", ":")) + "\n")
+        f = self._open()
+        f.write("".join(lines).encode("utf-8"))
+        f.flush()
+        self.pending += len(lines)
+        self.records_since_compaction += len(lines)
+
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.flush()
+        return self.seq
+
+    def flush(self):
+        if self.pending and self._file is not None:
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+        self.pending = 0
+        self.last_fsync = time.monotonic()
+
+    @property
+    def needs_compaction(self):
+        return self.records_since_compaction >= self.compact_every
+
+    def compact(self, write_snapshot):
+        """Empty the journal once write_snapshot(seq) has saved everything up to seq"""
+        self.flush()
+        write_snapshot(self.seq)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.filename, 'wb') as f:
+            os.fsync(f.fileno())
+        self.records_since_compaction = 0
+
+    def stats(self):
+        return {
+            'seq': self.seq,
+            'records_since_compaction': self.records_since_compaction,
+            'pending_fsync': self.pending,
+            'fsyncs': self.fsyncs,
+            'file_bytes': os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        }
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,23 @@
+import pytest
+
+from pattern_finder_support import trigram_embedding_cache
+
+# Imported at collection: uagents sets up the agent's event loop on import, which fails once
+# another test has run asyncio.run
+try:
+    import pattern_finder as pattern_finder_module
+except ImportError:
+    pattern_finder_module = None
+
+@pytest.fixture
+def pattern_finder(tmp_path, monkeypatch):
+    """The pattern finder agent module, keeping its files under tmp_path and using TrigramModel"""
+    if pattern_finder_module is None:
+        pytest.skip("pattern_finder needs uagents and sentence_transformers")
+    module = pattern_finder_module
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(module, "create_embedding_cache", trigram_embedding_cache)
+    monkeypatch.setattr(module, "PATTERN_USERS_DIR", str(tmp_path / "users"))
+    for name in ("vocabulary", "user_finders", "journal", "observation_queue", "observation_batch_task"):
+        monkeypatch.setattr(module, name, None)
+    return module
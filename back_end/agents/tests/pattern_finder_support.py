@@ -0,0 +1,61 @@
+"""Helpers for the tests that drive the pattern finder agent module"""
+
+import asyncio
+import logging
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+class TrigramModel:
+    """Offline stand-in for the sentence model: hashed character trigrams, so similar strings embed close"""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+
+    def encode(self, texts, batch_size=32):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f"  {text} "
+            for i in range(len(padded) - 2):
+                embeddings[row, zlib.crc32(padded[i:i + 3].encode("utf-8")) % self.dim] += 1.0
+        return embeddings
+
+def trigram_embedding_cache():
+    return EmbeddingCache(TrigramModel(), "trigram-test", disk_dir=None)
+
+# Keywords the random entries are drawn from: synonyms, near-duplicates, and words the finder filters out
+ACTIVITIES = [
+    "gym", "workout", "running", "morning run", "yoga class", "hiking trail", "instagram", "scrolling feeds",
+    "tiktok", "cooking dinner", "meal prep", "baking bread", "friends", "family dinner", "video call",
+    "reading", "reading books", "meditation", "meditating", "journaling", "journal writing", "gardening",
+    "painting", "guitar practice", "guitar lessons", "tired", "something", "monday", "late night",
+    "presentation", "emails", "team meeting", "volunteer work", "walk dog", "power nap"
+]
+EMOTIONS = ["joy", "sadness", "anger", "fear", "neutral", "surprise"]
+
+def random_entry(rng, module, user_id):
+    keywords = [(activity, round(rng.uniform(0.2, 0.6), 4)) for activity in rng.sample(ACTIVITIES, rng.randint(2, 7))]
+    return module.ExtractedDataMessage(
+        keywords=keywords,
+        emotions=[(rng.choice(EMOTIONS), round(rng.random(), 4))],
+        mood_rating=rng.randint(1, 10),
+        energy_rating=rng.randint(1, 10),
+        user_id=user_id,
+        entry_text=f"entry {rng.random()}"
+    )
+
+CTX = SimpleNamespace(logger=logging.getLogger("pattern_finder_tests"))
+
+def start(module):
+    """Run the agent's startup handler (recovering whatever is on disk)"""
+    # The batch worker it starts is cancelled when the loop closes, tests call the handlers directly
+    asyncio.run(module.initialize_pattern_finder(CTX))
+
+def patterns_by_label(finder):
+    """Every group's pattern fields, by label, with activities as a set"""
+    message = finder.pattern_message("test", min_confidence=0.0, full=True)
+    patterns = {pattern['group_label']: {**pattern, 'activities': set(pattern['activities'])} for pattern in message['patterns']}
+    return patterns, (message['overall_avg_mood'], message['overall_avg_energy'])
@@ -0,0 +1,40 @@
+import random
+import pytest
+
+from activity_vocabulary import ACTIVITY_SYNONYMS, SynonymMatcher
+
+def scan_canonical(text, synonyms):
+    """The pattern finder's original lookup: first canonical in dict order with a synonym in the text"""
+    for canonical, synonym_list in synonyms.items():
+        if text in synonym_list or any(synonym in text for synonym in synonym_list):
+            return canonical
+    return None
+
+def test_every_synonym_maps_like_the_scan():
+    matcher = SynonymMatcher()
+    for synonym_list in ACTIVITY_SYNONYMS.values():
+        for synonym in synonym_list:
+            assert matcher.canonical(synonym) == scan_canonical(synonym, ACTIVITY_SYNONYMS)
+
+@pytest.mark.parametrize("text", [
+    "", "reading", "morning run", "late night scrolling", "family dinner", "cooking with friends",
+    "phone call", "napping", "bedtime yoga", "prepared brunch", "walking the dog", "xyz"
+])
+def test_phrases_map_like_the_scan(text):
+    assert SynonymMatcher().canonical(text) == scan_canonical(text, ACTIVITY_SYNONYMS)
+
+def test_random_texts_map_like_the_scan():
+    matcher = SynonymMatcher()
+    rng = random.Random(0)
+    pieces = [synonym for synonym_list in ACTIVITY_SYNONYMS.values() for synonym in synonym_list]
+    pieces += ["the", "a", "x", "ing", "re", "st", " ", "-"]
+    for _ in range(2000):
+        # Fragments of synonyms glued together, so matches straddle and overlap
+        text = "".join(rng.choice(pieces)[rng.randint(0, 2):] for _ in range(rng.randint(1, 5)))
+        assert matcher.canonical(text) == scan_canonical(text, ACTIVITY_SYNONYMS)
+
+def test_overlapping_synonyms_prefer_the_earliest_canonical():
+    synonyms = {'first': ['hers'], 'second': ['he', 'she'], 'third': ['his', 'r']}
+    matcher = SynonymMatcher(synonyms)
+    for text in ["ushers", "she", "this", "r", "ahishe", "hxrs", "nothing"]:
+        assert matcher.canonical(text) == scan_canonical(text, synonyms)
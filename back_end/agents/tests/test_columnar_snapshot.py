@@ -0,0 +1,105 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import columnar_snapshot
+from group_index import ExactGroupIndex, IVFGroupIndex, normalize_rows
+from pattern_finder_support import trigram_embedding_cache
+
+def vocabulary_state(groups=300, dim=16, index=None, seed=0):
+    rng = np.random.default_rng(seed)
+    activity_groups = {}
+    activity_to_group = {}
+    for group_id in range(groups):
+        label = f"activity {group_id} ünïcode" if group_id % 7 == 0 else f"activity {group_id}"
+        activities = {label, f"{label} daily", f"doing {label}"}
+        activity_groups[group_id] = {'activities': activities, 'embedding': rng.standard_normal(dim).astype(np.float32), 'label': label}
+        for activity in activities:
+            activity_to_group[activity] = group_id
+    if index is not None:
+        for group_id, group in activity_groups.items():
+            index.add(group_id, group['embedding'])
+    return {
+        'activity_groups': activity_groups,
+        'activity_to_group': activity_to_group,
+        'next_group_id': groups,
+        'group_index': index,
+        'group_index_kind': "test",
+        'journal_seq': 42
+    }
+
+@pytest.mark.parametrize("index", [None, ExactGroupIndex(), IVFGroupIndex(min_train_size=100, nprobe=4)])
+def test_round_trip(tmp_path, index):
+    state = vocabulary_state(index=index)
+    columnar_snapshot.write_snapshot(tmp_path, state)
+    loaded = columnar_snapshot.read_snapshot(tmp_path)
+
+    assert loaded['next_group_id'] == 300
+    assert loaded['journal_seq'] == 42
+    assert loaded['group_index_kind'] == "test"
+    assert len(loaded['activity_groups']) == 300
+    for group_id, group in state['activity_groups'].items():
+        got = loaded['activity_groups'][group_id]
+        assert got['label'] == group['label'] == loaded['activity_groups'].label(group_id)
+        assert got['activities'] == group['activities']
+        # Stored normalized, exactly the vectors the index searches
+        assert np.allclose(got['embedding'], normalize_rows(group['embedding']), atol=1e-6)
+    assert dict(loaded['activity_to_group'].items()) == state['activity_to_group']
+    assert "never seen" not in loaded['activity_to_group']
+
+    if index is None:
+        assert loaded['group_index'] is None
+        return
+    assert type(loaded['group_index']) is type(index)
+    for query in np.random.default_rng(1).standard_normal((50, 16)):
+        assert loaded['group_index'].search(query, 0.0) == index.search(query, 0.0)
+
+def test_overlays_take_additions_and_pickle_as_dicts(tmp_path):
+    columnar_snapshot.write_snapshot(tmp_path, vocabulary_state(groups=5))
+    loaded = columnar_snapshot.read_snapshot(tmp_path)
+    groups, index = loaded['activity_groups'], loaded['activity_to_group']
+
+    groups[5] = {'activities': {"new"}, 'embedding': np.ones(16, dtype=np.float32), 'label': "new"}
+    groups[2]['activities'].add("extra")
+    index["new"] = 5
+    index["activity 1"] = 1
+
+    assert len(groups) == 6 and list(groups) == [0, 1, 2, 3, 4, 5]
+    assert groups.label(5) == "new"
+    assert len(index) == 16
+    assert index["new"] == 5 and index["activity 3 daily"] == 3
+
+    plain_groups, plain_index = pickle.loads(pickle.dumps((groups, index)))
+    assert type(plain_groups) is dict and type(plain_index) is dict
+    assert "extra" in plain_groups[2]['activities']
+    assert plain_index == dict(index.items())
+
+def test_old_snapshots_stay_until_removed(tmp_path):
+    columnar_snapshot.write_snapshot(tmp_path, vocabulary_state(groups=3))
+    columnar_snapshot.write_snapshot(tmp_path, vocabulary_state(groups=4))
+    os.makedirs(tmp_path / "snapshot-interrupted")
+    assert len([entry for entry in os.listdir(tmp_path) if entry.startswith("snapshot-")]) == 3
+
+    columnar_snapshot.remove_old_snapshots(tmp_path)
+    with open(tmp_path / "CURRENT") as f:
+        current = f.read()
+    assert [entry for entry in os.listdir(tmp_path) if entry.startswith("snapshot-")] == [current]
+    assert columnar_snapshot.read_snapshot(tmp_path)['next_group_id'] == 4
+
+def test_saving_the_vocabulary_folds_the_overlays_into_the_new_mapping(pattern_finder):
+    vocabulary = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+    vocabulary.resolve([("gardening", 0.5), ("painting", 0.4)])
+    vocabulary.save_snapshot("vocabulary")
+    vocabulary.resolve([("guitar practice", 0.5), ("gardening daily", 0.3), ("meditation", 0.2)])
+    before = {group_id: (vocabulary.group_label(group_id), set(group['activities'])) for group_id, group in vocabulary.activity_groups.items()}
+    assert vocabulary.activity_groups._added > 0
+
+    vocabulary.save_snapshot("vocabulary")
+    assert vocabulary.activity_groups._added == 0 and not vocabulary.activity_groups._groups
+    assert not vocabulary.activity_to_group._added
+    assert len([entry for entry in os.listdir("vocabulary") if entry.startswith("snapshot-")]) == 1
+    after = {group_id: (vocabulary.group_label(group_id), set(group['activities'])) for group_id, group in vocabulary.activity_groups.items()}
+    assert after == before
+    assert vocabulary.resolve([("guitar practice", 0.5)])[0][1] == vocabulary.activity_to_group["guitar practice"]
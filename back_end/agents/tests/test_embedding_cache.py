@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+class CountingModel:
+    """Deterministic stand-in for the SentenceTransformer that records what it was asked to encode"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        return np.array([embedding(text, self.dim) for text in texts], dtype=np.float32)
+
+def embedding(text, dim=8):
+    rng = np.random.default_rng(sum(ord(c) * 31 ** i for i, c in enumerate(text)) % 2 ** 32)
+    return rng.standard_normal(dim).astype(np.float32)
+
+def test_only_misses_reach_the_model():
+    model = CountingModel()
+    cache = EmbeddingCache(model, "test-model")
+    first = cache.encode(["Gym", "reading", "gym "])
+    second = cache.encode(["reading", "cooking"])
+
+    # Keys are normalized, and each missing key is encoded once per call
+    assert model.calls == [["gym", "reading"], ["cooking"]]
+    assert np.array_equal(first[0], first[2])
+    assert np.array_equal(first[1], second[0])
+    assert np.array_equal(second[1], embedding("cooking"))
+    assert (cache.hits, cache.misses) == (1, 3)
+
+def test_least_recently_used_entry_is_evicted():
+    model = CountingModel()
+    cache = EmbeddingCache(model, "test-model", max_entries=2)
+    cache.encode(["gym", "reading"])
+    cache.encode(["gym"])
+    cache.encode(["cooking"])
+    assert cache.stats()['entries'] == 2
+
+    model.calls.clear()
+    cache.encode(["gym", "cooking", "reading"])
+    assert model.calls == [["reading"]]
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = EmbeddingCache(CountingModel(), "org/test-model", disk_dir=str(tmp_path))
+    expected = cache.encode(["gym", "reading", "cooking"])
+
+    model = CountingModel()
+    reopened = EmbeddingCache(model, "org/test-model", disk_dir=str(tmp_path))
+    for got, want in zip(reopened.encode(["gym", "reading", "cooking"]), expected):
+        assert np.array_equal(got, want)
+    assert model.calls == []
+    assert reopened.disk_hits == 3
+
+def test_rows_without_both_key_and_embedding_are_dropped_on_open(tmp_path):
+    cache = EmbeddingCache(CountingModel(), "test-model", disk_dir=str(tmp_path))
+    cache.encode(["gym", "reading", "cooking"])
+
+    # Crash mid-append: the last embedding row is cut short and a key line is torn
+    directory = tmp_path / "test-model"
+    matrix_file = directory / "embeddings.f32"
+    os.truncate(matrix_file, os.path.getsize(matrix_file) - 4)
+    with open(directory / "keys.jsonl", 'a', encoding="utf-8") as f:
+        f.write('"walk')
+
+    model = CountingModel()
+    reopened = EmbeddingCache(model, "test-model", disk_dir=str(tmp_path))
+    assert reopened.stats()['disk_entries'] == 2
+    result = reopened.encode(["gym", "reading", "cooking", "walking"])
+    assert model.calls == [["cooking", "walking"]]
+    assert np.array_equal(result[2], embedding("cooking"))
+
+    # The re-encoded rows are appended after the two that survived
+    again = EmbeddingCache(CountingModel(), "test-model", disk_dir=str(tmp_path))
+    assert again.stats()['disk_entries'] == 4
+    assert np.array_equal(again.encode(["walking"])[0], embedding("walking"))
@@ -0,0 +1,91 @@
+import pickle
+import random
+
+import numpy as np
+
+from group_effects import GroupEffects
+
+LABELS = ["joy", "sadness", "anger"]
+
+def random_observation(rng, groups):
+    rows = [rng.randrange(groups) for _ in range(rng.randint(1, 4))]
+    return rows, [rng.random() for _ in rows], rng.choice(LABELS), rng.randint(1, 10), rng.randint(1, 10)
+
+def trimmed(effects, labels):
+    state = effects.columns()
+    state['mood'] = state['mood'][:, :labels]
+    state['energy'] = state['energy'][:, :labels]
+    state['first_seen'] = state['first_seen'][:, :labels]
+    return state
+
+def test_retract_undoes_observe():
+    rng = random.Random(0)
+    for _ in range(200):
+        effects = GroupEffects()
+        for row in range(6):
+            effects.add_group(row)
+        for _ in range(rng.randint(0, 6)):
+            effects.observe(*random_observation(rng, 6))
+        labels = len(effects.labels)
+        before = pickle.loads(pickle.dumps(effects))
+
+        observation = random_observation(rng, 6)
+        effects.observe(*observation)
+        effects.retract(*observation)
+
+        for name, values in trimmed(before, labels).items():
+            assert np.allclose(values, trimmed(effects, labels)[name], equal_nan=True), name
+        assert len(effects.mood_median) == len(before.mood_median)
+        if len(before.mood_median):
+            assert np.isclose(effects.mood_median.median(), before.mood_median.median())
+            assert np.isclose(effects.energy_median.median(), before.energy_median.median())
+
+def test_retract_of_an_unseen_label_changes_nothing():
+    effects = GroupEffects()
+    effects.add_group(0)
+    effects.observe([0], [0.5], "joy", 7, 6)
+    effects.retract([0], [0.5], "fear", 7, 6)
+    assert effects.observation_count[0] == 0.5
+    assert effects.mood[0, 0] == 7
+
+def dict_effects(observations):
+    """The dicts GroupEffects replaced: per group, label -> running average in first-seen order"""
+    effects = {}
+    for rows, weights, label, mood_rating, energy_rating in observations:
+        for row, weight in zip(rows, weights):
+            effect_data = effects.setdefault(row, {'mood_outcomes': {}, 'energy_outcomes': {}, 'observation_count': 0})
+            old_count = effect_data['observation_count']
+            new_count = old_count + weight
+            effect_data['mood_outcomes'][label] = (effect_data['mood_outcomes'].get(label, 0.0) * old_count + mood_rating * weight) / new_count
+            effect_data['energy_outcomes'][label] = (effect_data['energy_outcomes'].get(label, 0.0) * old_count + energy_rating * weight) / new_count
+            effect_data['observation_count'] = new_count
+    return effects
+
+def test_dominant_effects_match_the_dict_implementation():
+    rng = random.Random(1)
+    for _ in range(100):
+        groups = rng.randint(1, 8)
+        # Each group sees the labels in its own order, and 3s and 6s tie often (a 3 averaged over
+        # one observation equals a 6 over two)
+        observations = []
+        for _ in range(rng.randint(1, 30)):
+            rows = rng.sample(range(groups), rng.randint(1, groups))
+            observations.append((rows, [1.0] * len(rows), rng.choice(LABELS + ["fear"]),
+                                 rng.choice([3, 6]), rng.choice([3, 6])))
+        effects = GroupEffects()
+        for row in range(groups):
+            effects.add_group(row)
+        for observation in observations:
+            effects.observe(*observation)
+        effects = pickle.loads(pickle.dumps(effects))
+
+        expected = dict_effects(observations)
+        rows = sorted(expected)
+        is_pattern, mood_column, mood, energy = effects.dominant_effects(rows)
+        for i, row in enumerate(rows):
+            effect_data = expected[row]
+            label, expected_mood = max(effect_data['mood_outcomes'].items(), key=lambda x: abs(x[1]))
+            _, expected_energy = max(effect_data['energy_outcomes'].items(), key=lambda x: abs(x[1]))
+            assert is_pattern[i] == (effect_data['observation_count'] >= 1.5)
+            assert effects.labels[mood_column[i]] == label
+            assert mood[i] == expected_mood and energy[i] == expected_energy
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from group_index import ExactGroupIndex, IVFGroupIndex, create_group_index
+
+def build(index, embeddings):
+    for group_id, embedding in enumerate(embeddings):
+        index.add(group_id, embedding)
+    return index
+
+def clustered_embeddings(groups, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    return (centers[rng.integers(clusters, size=groups)] + 0.3 * rng.standard_normal((groups, dim))).astype(np.float32)
+
+def test_exact_search_is_the_per_group_scan():
+    embeddings = clustered_embeddings(200)
+    index = build(ExactGroupIndex(initial_capacity=4), embeddings)
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    for query in np.random.default_rng(1).standard_normal((50, 32)):
+        similarities = normalized @ (query / np.linalg.norm(query))
+        best = int(np.argmax(similarities))
+        group_id, similarity = index.search(query, 0.0)
+        if similarities[best] > 0:
+            assert group_id == best
+        assert similarity == pytest.approx(similarities[best], abs=1e-5)
+
+def test_ivf_searches_exactly_below_its_training_size():
+    embeddings = clustered_embeddings(300)
+    exact = build(ExactGroupIndex(), embeddings)
+    ivf = build(IVFGroupIndex(min_train_size=1000, nprobe=1), embeddings)
+    assert ivf.centroids is None
+    for query in np.random.default_rng(1).standard_normal((50, 32)):
+        assert ivf.search(query, 0.5) == exact.search(query, 0.5)
+
+def test_ivf_probing_every_cluster_matches_exact():
+    embeddings = clustered_embeddings(400)
+    exact = build(ExactGroupIndex(), embeddings)
+    ivf = build(IVFGroupIndex(min_train_size=100, nprobe=1000), embeddings)
+    assert ivf.centroids is not None
+    for query in np.random.default_rng(1).standard_normal((50, 32)):
+        group_id, similarity = ivf.search(query, 0.0)
+        exact_id, exact_similarity = exact.search(query, 0.0)
+        assert group_id == exact_id
+        assert similarity == pytest.approx(exact_similarity, abs=1e-6)
+
+def test_ivf_finds_groups_near_their_own_embedding():
+    embeddings = clustered_embeddings(2000)
+    exact = build(ExactGroupIndex(), embeddings)
+    ivf = build(IVFGroupIndex(min_train_size=500, nprobe=8), embeddings)
+    rng = np.random.default_rng(1)
+    queries = embeddings[:200] + 0.01 * rng.standard_normal((200, 32)).astype(np.float32)
+    found = sum(ivf.search(query, 0.85)[0] == exact.search(query, 0.85)[0] for query in queries)
+    assert found / len(queries) >= 0.95
+
+def test_ivf_threshold_and_retraining():
+    embeddings = clustered_embeddings(400)
+    ivf = build(IVFGroupIndex(min_train_size=100, nprobe=4), embeddings[:100])
+    assert ivf._trained_size == 100
+    for group_id in range(100, 199):
+        ivf.add(group_id, embeddings[group_id])
+    assert ivf._trained_size == 100
+    ivf.add(199, embeddings[199])
+    assert ivf._trained_size == 200
+    assert sorted(row for rows in ivf.lists for row in rows) == list(range(200))
+
+    # No group is that close to a unit axis vector, so the threshold turns the nearest one down
+    query = np.zeros(32, dtype=np.float32)
+    query[0] = 1.0
+    group_id, similarity = ivf.search(query, 0.99)
+    assert group_id is None and similarity < 0.99
+
+def test_auto_switches_to_ivf_at_the_threshold():
+    embeddings = clustered_embeddings(60)
+    index = create_group_index("auto", ann_min_groups=50)
+    build(index, embeddings[:49])
+    assert index.centroids is None
+    index.add(49, embeddings[49])
+    assert index.centroids is not None
+
+    assert type(create_group_index("exact")) is ExactGroupIndex
+    with pytest.raises(ValueError):
+        create_group_index("hnsw")
@@ -0,0 +1,50 @@
+import itertools
+import numpy as np
+import pytest
+
+from keyword_diversity import exact_max_sum, greedy_max_sum
+
+def keybert_max_sum(similarities, top_n):
+    """KeyBERT's brute force Max-Sum scan: every combination in order, first strict minimum wins"""
+    rows = similarities.tolist()
+    min_sim = np.inf
+    best = None
+    for combination in itertools.combinations(range(len(rows)), top_n):
+        sim = sum([rows[i][j] for i in combination for j in combination if i != j])
+        if sim < min_sim:
+            best = combination
+            min_sim = sim
+    return list(best)
+
+def similarity_matrix(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings @ embeddings.T
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("n, top_n", [(8, 3), (12, 5), (14, 7)])
+def test_exact_max_sum_matches_brute_force(seed, n, top_n):
+    similarities = similarity_matrix(np.random.default_rng(seed).standard_normal((n, 16)))
+    assert exact_max_sum(similarities, top_n) == keybert_max_sum(similarities, top_n)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_exact_max_sum_breaks_ties_like_keybert(seed):
+    # Duplicated candidates make many combinations tie
+    base = np.random.default_rng(seed).standard_normal((4, 8))
+    similarities = similarity_matrix(np.repeat(base, 3, axis=0))
+    assert exact_max_sum(similarities, 4) == keybert_max_sum(similarities, 4)
+
+def test_exact_max_sum_all_candidates():
+    similarities = similarity_matrix(np.random.default_rng(0).standard_normal((5, 4)))
+    assert exact_max_sum(similarities, 5) == [0, 1, 2, 3, 4]
+
+@pytest.mark.parametrize("seed", range(10))
+def test_greedy_max_sum_is_a_valid_pick_no_better_than_exact(seed):
+    similarities = similarity_matrix(np.random.default_rng(seed).standard_normal((12, 16)))
+
+    def total(chosen):
+        return sum(similarities[i, j] for i, j in itertools.combinations(chosen, 2))
+
+    greedy = greedy_max_sum(similarities, 5)
+    assert greedy == sorted(set(greedy)) and len(greedy) == 5
+    assert total(greedy) >= total(exact_max_sum(similarities, 5)) - 1e-9
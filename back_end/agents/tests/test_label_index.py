@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+
+from pattern_finder_support import ACTIVITIES, trigram_embedding_cache
+
+def scan_label(vocabulary, label):
+    """The confidence handler's original lookup: first group in activity_groups order with the label"""
+    for group_id, group_data in vocabulary.activity_groups.items():
+        if group_data['label'] == label:
+            return group_id
+    return None
+
+def assert_matches_scan(vocabulary, extra_labels):
+    labels = [vocabulary.group_label(group_id) for group_id in vocabulary.activity_groups]
+    for label in labels + extra_labels:
+        assert vocabulary.label_to_group.get(label) == scan_label(vocabulary, label), label
+
+def random_keywords(rng):
+    # Suffixed keywords add groups beyond the ones ACTIVITIES collapse into
+    return [(f"{rng.choice(ACTIVITIES)} {rng.randint(0, 30)}" if rng.random() < 0.5 else rng.choice(ACTIVITIES), 0.5)
+            for _ in range(rng.randint(1, 5))]
+
+def test_label_index_matches_the_scan_across_snapshots(pattern_finder):
+    rng = random.Random(0)
+    vocabulary = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+    unknown = ["", "not a label", "gym class 99"]
+    for round_number in range(3):
+        for _ in range(40):
+            vocabulary.resolve(random_keywords(rng))
+        assert_matches_scan(vocabulary, unknown)
+        vocabulary.save_snapshot("vocabulary")
+        assert_matches_scan(vocabulary, unknown)
+
+        loaded = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+        assert loaded.load_snapshot("vocabulary")
+        assert loaded._label_to_group is None
+        for _ in range(10):
+            loaded.resolve(random_keywords(rng))
+        assert_matches_scan(loaded, unknown)
+        vocabulary = loaded
+
+def test_duplicate_labels_resolve_to_the_first_group(pattern_finder):
+    vocabulary = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+    embedding = np.ones(64, dtype=np.float32)
+    activity_groups = {group_id: {'activities': {label}, 'embedding': embedding, 'label': label}
+                       for group_id, label in [(0, "reading"), (1, "yoga"), (2, "reading"), (3, "yoga")]}
+    vocabulary.restore_state({'activity_groups': activity_groups, 'activity_to_group': {}, 'next_group_id': 4})
+    assert_matches_scan(vocabulary, [])
+    assert vocabulary.label_to_group["reading"] == 0 and vocabulary.label_to_group["yoga"] == 1
+
+def test_adjust_confidence_finds_the_scanned_group(pattern_finder):
+    rng = random.Random(1)
+    vocabulary = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+    finders = [pattern_finder.SemanticPatternFinder(vocabulary) for _ in range(2)]
+    for _ in range(30):
+        rng.choice(finders).add_observation(random_keywords(rng), [("joy", 0.9)], rng.randint(1, 10), rng.randint(1, 10))
+
+    for label in [vocabulary.group_label(group_id) for group_id in vocabulary.activity_groups] + ["not a label"]:
+        group_id = scan_label(vocabulary, label)
+        for finder in finders:
+            row = finder.group_rows.get(group_id)
+            expected = None if row is None else float(finder.group_effects.confidence[row])
+            result = finder.adjust_confidence(label, -0.1)
+            assert (None if result is None else result[0]) == expected
+            if row is not None:
+                assert finder.group_effects.confidence[row] == max(0.0, expected - 0.1)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from micro_batching import MicroBatchQueue
+
+def caller(name):
+    return SimpleNamespace(name=name, replies=[])
+
+def test_full_batch_is_released_without_waiting():
+    async def run():
+        queue = MicroBatchQueue(max_size=4, max_wait=1.0, max_depth=16)
+        for i in range(6):
+            await queue.put(caller(i), i)
+        start = time.perf_counter()
+        batch = await queue.next_batch()
+        return [msg for _, msg, _ in batch], time.perf_counter() - start, await queue.next_batch()
+
+    first, seconds, rest = asyncio.run(run())
+    assert first == [0, 1, 2, 3]
+    assert seconds < 0.5
+    assert [msg for _, msg, _ in rest] == [4, 5]
+
+def test_partial_batch_is_released_after_max_wait():
+    async def run():
+        queue = MicroBatchQueue(max_size=8, max_wait=0.05, max_depth=16)
+        await queue.put(caller("a"), "a")
+
+        async def late_put():
+            await asyncio.sleep(0.01)
+            await queue.put(caller("b"), "b")
+            await asyncio.sleep(0.2)
+            await queue.put(caller("c"), "c")
+
+        task = asyncio.create_task(late_put())
+        start = time.perf_counter()
+        batch = await queue.next_batch()
+        seconds = time.perf_counter() - start
+        await task
+        return [msg for _, msg, _ in batch], seconds, [msg for _, msg, _ in await queue.next_batch()]
+
+    first, seconds, second = asyncio.run(run())
+    assert first == ["a", "b"]
+    assert 0.04 <= seconds < 0.2
+    assert second == ["c"]
+
+def test_results_go_back_to_each_caller():
+    async def run():
+        queue = MicroBatchQueue(max_size=3, max_wait=0.02, max_depth=16)
+        callers = [caller(i) for i in range(7)]
+
+        async def worker():
+            # Same shape as the agents' batch workers: one pass over the batch, then a reply per entry
+            while True:
+                batch = await queue.next_batch()
+                queue.record_batch(batch)
+                results = [msg * 10 for _, msg, _ in batch]
+                for (ctx, msg, _), result in zip(batch, results):
+                    ctx.replies.append((msg, result))
+
+        task = asyncio.create_task(worker())
+        for i, ctx in enumerate(callers):
+            await queue.put(ctx, i)
+        await asyncio.sleep(0.2)
+        task.cancel()
+        return queue, callers
+
+    queue, callers = asyncio.run(run())
+    assert [ctx.replies for ctx in callers] == [[(i, i * 10)] for i in range(7)]
+    assert queue.metrics['entries'] == 7
+    assert queue.metrics['max_batch_size'] == 3
+    assert queue.metrics['batches'] == 3
+
+def test_put_blocks_at_max_depth():
+    async def run():
+        queue = MicroBatchQueue(max_size=2, max_wait=0.01, max_depth=2)
+        await queue.put(caller(0), 0)
+        await queue.put(caller(1), 1)
+        blocked = asyncio.create_task(queue.put(caller(2), 2))
+        await asyncio.sleep(0.02)
+        was_blocked = not blocked.done()
+        batch = await queue.next_batch()
+        await blocked
+        return was_blocked, [msg for _, msg, _ in batch], queue.metrics['max_queue_depth']
+
+    was_blocked, batch, max_depth = asyncio.run(run())
+    assert was_blocked
+    assert batch == [0, 1]
+    assert max_depth == 2
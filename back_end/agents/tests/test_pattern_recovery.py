@@ -0,0 +1,96 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from pattern_finder_support import CTX, random_entry, start, patterns_by_label, trigram_embedding_cache
+
+USERS = [f"user-{i}" for i in range(6)]
+
+def run_live(module, rng, steps, history):
+    """Random entries, keyword corrections and confidence changes through the agent's own paths"""
+    operations = []
+    for _ in range(steps):
+        user_id = rng.choice(USERS)
+        roll = rng.random()
+        if roll < 0.15:
+            finder = module.user_finders.get(user_id)
+            if not finder.row_groups:
+                continue
+            label = module.vocabulary.group_label(rng.choice(finder.row_groups))
+            adjustment = rng.choice([-0.3, -0.1, 0.1, 0.2])
+            asyncio.run(module.handle_confidence_update(CTX, "curator", module.ConfidenceUpdateMessage(
+                pattern_id=label, confidence_adjustment=adjustment, user_id=user_id, reason="test")))
+            operations.append(('confidence', user_id, label, adjustment))
+        elif roll < 0.25 and history.get(user_id):
+            entry = rng.choice(history[user_id])
+            refined = random_entry(rng, module, user_id)
+            correction = module.ExtractionCorrectionMessage(
+                previous_keywords=entry.keywords, keywords=refined.keywords, emotions=entry.emotions,
+                mood_rating=entry.mood_rating, energy_rating=entry.energy_rating,
+                user_id=user_id, entry_text=entry.entry_text)
+            module.apply_user_entries(user_id, [(CTX, correction)])
+            operations.append(('correction', user_id, correction))
+        else:
+            entries = [random_entry(rng, module, user_id) for _ in range(rng.randint(1, 3))]
+            module.apply_user_entries(user_id, [(CTX, entry) for entry in entries])
+            history.setdefault(user_id, []).extend(entries)
+            operations.append(('entries', user_id, entries))
+    return operations
+
+def apply_in_memory(module, vocabulary, finders, operations):
+    """The same operations on plain in-memory objects: no journal, no eviction, no snapshots"""
+    for operation in operations:
+        user_id = operation[1]
+        if user_id not in finders:
+            finders[user_id] = module.SemanticPatternFinder(vocabulary)
+        finder = finders[user_id]
+        if operation[0] == 'entries':
+            for entry in operation[2]:
+                finder.add_observation(entry.keywords, entry.emotions, entry.mood_rating, entry.energy_rating)
+        elif operation[0] == 'correction':
+            correction = operation[2]
+            finder.correct_observation(correction.previous_keywords, correction.keywords, correction.emotions,
+                                       correction.mood_rating, correction.energy_rating)
+        else:
+            finder.adjust_confidence(operation[2], operation[3])
+
+def assert_same_state(module, vocabulary, finders):
+    assert module.vocabulary.next_group_id == vocabulary.next_group_id
+    for group_id in range(vocabulary.next_group_id):
+        assert module.vocabulary.group_label(group_id) == vocabulary.group_label(group_id)
+        assert set(module.vocabulary.activity_groups[group_id]['activities']) == vocabulary.activity_groups[group_id]['activities']
+    for user_id, finder in finders.items():
+        assert patterns_by_label(module.user_finders.get(user_id)) == patterns_by_label(finder), user_id
+
+def crash(module):
+    # Everything journaled reaches the disk, but no user or vocabulary gets saved
+    module.journal.close()
+
+@pytest.mark.parametrize("max_resident, compact_every, snapshot_format", [
+    (100, 100_000, "columnar"),
+    (2, 100_000, "columnar"),
+    (100, 15, "columnar"),
+    (2, 15, "columnar"),
+    (2, 15, "pickle"),
+])
+def test_recovery_matches_the_state_before_the_crash(pattern_finder, monkeypatch, max_resident, compact_every, snapshot_format):
+    monkeypatch.setattr(pattern_finder, "MAX_RESIDENT_USERS", max_resident)
+    monkeypatch.setattr(pattern_finder, "JOURNAL_COMPACT_EVERY", compact_every)
+    monkeypatch.setattr(pattern_finder, "PATTERN_SNAPSHOT_FORMAT", snapshot_format)
+    rng = random.Random(f"{max_resident}-{compact_every}-{snapshot_format}")
+    vocabulary = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+    finders = {}
+    history = {}
+
+    start(pattern_finder)
+    for _ in range(2):
+        apply_in_memory(pattern_finder, vocabulary, finders, run_live(pattern_finder, rng, 60, history))
+        # Make sure the run went through the paths under test
+        assert (pattern_finder.user_finders.evictions > 0) == (max_resident < len(USERS))
+        snapshot = pattern_finder.PATTERN_VOCABULARY_DIR if snapshot_format == "columnar" else pattern_finder.PATTERN_VOCABULARY_FILE
+        assert os.path.exists(snapshot) == (compact_every < 100)
+        crash(pattern_finder)
+        start(pattern_finder)
+        assert_same_state(pattern_finder, vocabulary, finders)
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import pickle
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from pattern_finder_support import CTX, random_entry, start, patterns_by_label
+
+@pytest.fixture
+def send_ctx(pattern_finder, monkeypatch):
+    """A context whose sends are recorded, and no waiting before the baseline analysis goes out"""
+    sleep = asyncio.sleep
+    monkeypatch.setattr(pattern_finder.asyncio, "sleep", lambda seconds: sleep(0))
+    sent = []
+
+    async def send(destination, message):
+        sent.append(message)
+
+    return SimpleNamespace(logger=CTX.logger, send=send, sent=sent)
+
+def send_baseline(module, ctx, rng, entries=25):
+    data = [random_entry(rng, module, module.SEED_USER) for _ in range(entries)]
+    asyncio.run(module.handle_baseline_init(ctx, "extractor", module.BaselineInitMessage(
+        baseline_data=data, total_entries=len(data), user_id=module.SEED_USER)))
+
+def write_entries(module, rng, user_id, count=3):
+    module.apply_user_entries(user_id, [(CTX, random_entry(rng, module, user_id)) for _ in range(count)])
+
+def seed_labels(module):
+    return set(patterns_by_label(module.user_finders.get(module.SEED_USER))[0])
+
+def test_the_seed_is_part_of_the_snapshot(pattern_finder, send_ctx):
+    rng = random.Random(0)
+    start(pattern_finder)
+    send_baseline(pattern_finder, send_ctx, rng)
+    assert send_ctx.sent and send_ctx.sent[0].is_baseline
+
+    with open(os.path.join(pattern_finder.PATTERN_VOCABULARY_DIR, "CURRENT")) as f:
+        current = f.read()
+    assert os.path.exists(os.path.join(pattern_finder.PATTERN_VOCABULARY_DIR, current, "seed.pkl"))
+    seed_seq = pattern_finder.vocabulary.seed_seq
+    seed = pattern_finder.vocabulary.seed(seed_seq)
+    assert seed['baseline_initialized'] and len(seed['row_groups']) > 0
+
+    # And stays in the ones after it
+    write_entries(pattern_finder, rng, "user")
+    pattern_finder.write_snapshot()
+    start(pattern_finder)
+    restarted = pattern_finder.vocabulary.seed(seed_seq)
+    assert restarted['row_groups'] == seed['row_groups']
+    assert restarted['group_activities'] == seed['group_activities']
+
+def test_seeded_users_save_only_what_differs_from_the_seed(pattern_finder, send_ctx):
+    rng = random.Random(1)
+    start(pattern_finder)
+    send_baseline(pattern_finder, send_ctx, rng)
+    write_entries(pattern_finder, rng, "user", count=2)
+    finder = pattern_finder.user_finders.get("user")
+    assert finder.seed_seq == pattern_finder.vocabulary.seed_seq
+    assert seed_labels(pattern_finder) <= set(patterns_by_label(finder)[0])
+
+    pattern_finder.write_snapshot()
+    with open(pattern_finder.user_state_path("user"), 'rb') as f:
+        state = pickle.load(f)
+    seed_rows = len(pattern_finder.vocabulary.seed(finder.seed_seq)['row_groups'])
+    assert state['row_groups'] == finder.row_groups[seed_rows:]
+    assert len(state['group_effects']['rows']) < len(finder.row_groups)
+    assert set(state['group_activities']) == set(state['group_effects']['rows'])
+
+    loaded = pattern_finder.load_user_finder("user")
+    assert loaded.seed_seq == finder.seed_seq
+    assert patterns_by_label(loaded) == patterns_by_label(finder)
+    # Saving the loaded one again gives the same delta
+    assert len(loaded._state()['group_effects']['rows']) == len(state['group_effects']['rows'])
+
+@pytest.mark.parametrize("max_resident, snapshot_format", [(100, "columnar"), (1, "columnar"), (1, "pickle")])
+def test_recovery_starts_users_from_the_seed_they_had_live(pattern_finder, send_ctx, monkeypatch, max_resident, snapshot_format):
+    monkeypatch.setattr(pattern_finder, "MAX_RESIDENT_USERS", max_resident)
+    monkeypatch.setattr(pattern_finder, "PATTERN_SNAPSHOT_FORMAT", snapshot_format)
+    rng = random.Random(2)
+    start(pattern_finder)
+
+    # Looked up before the baseline but writes only after it, written before it, and new after it
+    pattern_finder.user_finders.get("early reader")
+    write_entries(pattern_finder, rng, "early writer")
+    send_baseline(pattern_finder, send_ctx, rng)
+    for _ in range(3):
+        for user_id in ["early reader", "early writer", "late"]:
+            write_entries(pattern_finder, rng, user_id, count=1)
+    seeded = seed_labels(pattern_finder)
+    live = {user_id: patterns_by_label(pattern_finder.user_finders.get(user_id)) for user_id in ["early reader", "early writer", "late"]}
+    if max_resident == 100:
+        assert not seeded <= set(live["early reader"][0])
+    assert seeded <= set(live["late"][0])
+
+    # Crash: only the journal since the baseline's snapshot is on disk
+    pattern_finder.journal.close()
+    start(pattern_finder)
+    for user_id, patterns in live.items():
+        assert patterns_by_label(pattern_finder.user_finders.get(user_id)) == patterns, user_id
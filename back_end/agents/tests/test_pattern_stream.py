@@ -0,0 +1,104 @@
+import random
+from types import SimpleNamespace
+
+from pattern_finder_support import CTX, random_entry, start
+from pattern_stream import PatternStreams
+
+def fields(label, confidence, mood=6.0, energy=4.0):
+    return {
+        'group_label': label,
+        'activities': [label],
+        'effect_on_mood': mood,
+        'effect_on_energy': energy,
+        'primary_emotion': "joy",
+        'confidence': confidence,
+        'observation_count': 3.0
+    }
+
+def message(patterns, seq, base_seq=0, removed=(), user_id="user", averages=(5.0, 5.0)):
+    return SimpleNamespace(user_id=user_id, patterns=list(patterns), removed=list(removed), seq=seq,
+                           base_seq=base_seq, is_full=base_seq == 0, overall_avg_mood=averages[0],
+                           overall_avg_energy=averages[1])
+
+def labels(patterns):
+    return [pattern['group_label'] for pattern in patterns]
+
+def test_full_message_replaces_the_patterns():
+    streams = PatternStreams()
+    streams.apply(message([fields("run", 0.5)], seq=1))
+    patterns = streams.apply(message([fields("cooking", 0.4), fields("sleep", 0.9)], seq=2))
+    assert labels(patterns) == ["sleep", "cooking"]
+    assert streams.seq("user") == 2
+
+def test_deltas_add_change_and_remove_patterns():
+    streams = PatternStreams()
+    streams.apply(message([fields("run", 0.5), fields("sleep", 0.3), fields("social", 0.3)], seq=1))
+    patterns = streams.apply(message([fields("sleep", 0.8), fields("cooking", 0.3)], seq=2, base_seq=1, removed=["run"]))
+    # Highest confidence first, ties by label
+    assert labels(patterns) == ["sleep", "cooking", "social"]
+    assert patterns[0]['confidence'] == 0.8
+
+    patterns = streams.apply(message([], seq=3, base_seq=2, removed=["cooking"]))
+    assert labels(patterns) == ["sleep", "social"]
+
+def test_changes_from_average_use_the_message_averages():
+    streams = PatternStreams()
+    patterns = streams.apply(message([fields("run", 0.5, mood=7.5, energy=3.0)], seq=1, averages=(6.0, 4.0)))
+    assert patterns[0]['mood_change_from_avg'] == 1.5
+    assert patterns[0]['energy_change_from_avg'] == -1.0
+
+def test_gap_is_rejected_until_a_full_resync():
+    streams = PatternStreams()
+    streams.apply(message([fields("run", 0.5)], seq=1))
+    streams.apply(message([fields("sleep", 0.4)], seq=2, base_seq=1))
+
+    # Message 3 was lost
+    assert streams.apply(message([fields("cooking", 0.6)], seq=4, base_seq=3, removed=["run"])) is None
+    assert streams.seq("user") == 2
+    assert labels(streams.apply(message([], seq=3, base_seq=2))) == ["run", "sleep"]
+
+    streams = PatternStreams()
+    streams.apply(message([fields("run", 0.5)], seq=1))
+    assert streams.apply(message([fields("cooking", 0.6)], seq=3, base_seq=2)) is None
+    patterns = streams.apply(message([fields("cooking", 0.6), fields("run", 0.5)], seq=4))
+    assert labels(patterns) == ["cooking", "run"]
+    assert labels(streams.apply(message([], seq=5, base_seq=4, removed=["run"]))) == ["cooking"]
+
+def test_delta_for_an_unknown_user_needs_a_resync():
+    streams = PatternStreams()
+    assert streams.apply(message([fields("run", 0.5)], seq=2, base_seq=1)) is None
+    assert streams.seq("user") == 0
+    assert len(streams) == 0
+
+def test_users_are_independent():
+    streams = PatternStreams()
+    streams.apply(message([fields("run", 0.5)], seq=1, user_id="a"))
+    streams.apply(message([fields("sleep", 0.5)], seq=1, user_id="b"))
+    assert labels(streams.apply(message([], seq=2, base_seq=1, removed=["run"], user_id="a"))) == []
+    assert labels(streams.apply(message([], seq=2, base_seq=1, user_id="b"))) == ["sleep"]
+
+def test_deltas_carry_on_after_the_user_is_evicted(pattern_finder, monkeypatch):
+    monkeypatch.setattr(pattern_finder, "MAX_RESIDENT_USERS", 1)
+    start(pattern_finder)
+    rng = random.Random(0)
+    streams = PatternStreams()
+
+    def send_entries(user_id):
+        return pattern_finder.apply_user_entries(user_id, [(CTX, random_entry(rng, pattern_finder, user_id)) for _ in range(2)])
+
+    assert streams.apply(send_entries("user")) is not None
+    for _ in range(4):
+        # Evicts (and saves) the user
+        send_entries("other")
+        msg = send_entries("user")
+        assert not msg.is_full and msg.base_seq == streams.seq("user")
+        patterns = streams.apply(msg)
+        full = pattern_finder.user_finders.get("user").pattern_message("check", min_confidence=0.2, full=True)
+        assert patterns == PatternStreams().apply(SimpleNamespace(user_id="user", **full))
+    assert pattern_finder.user_finders.loads >= 4
+
+    # Nothing changed since the last message, so nothing is sent again
+    send_entries("other")
+    unchanged = pattern_finder.user_finders.get("user").pattern_message(pattern_finder.CURATOR_STREAM, min_confidence=0.2)
+    assert not unchanged['is_full'] and unchanged['base_seq'] == streams.seq("user")
+    assert unchanged['patterns'] == [] and unchanged['removed'] == []
@@ -0,0 +1,59 @@
+import random
+
+import numpy as np
+import pytest
+
+from group_effects import GroupEffects
+from running_stats import RunningMedian
+
+def test_matches_np_median_through_adds_removes_and_replaces():
+    rng = random.Random(0)
+    # Small buckets so splits and emptied buckets happen often
+    median = RunningMedian(bucket_size=4)
+    values = []
+    assert median.median() is None
+    for _ in range(3000):
+        roll = rng.random()
+        if values and roll < 0.3:
+            value = values.pop(rng.randrange(len(values)))
+            median.remove(value)
+        elif values and roll < 0.6:
+            i = rng.randrange(len(values))
+            new_value = rng.choice([values[i], round(rng.uniform(1, 10), 2)])
+            median.replace(values[i], new_value)
+            values[i] = new_value
+        else:
+            # Plenty of duplicates, like averages of integer ratings
+            value = rng.choice([rng.randint(1, 10), round(rng.uniform(1, 10), 2)])
+            median.add(value)
+            values.append(value)
+        assert len(median) == len(values)
+        if values:
+            assert median.median() == pytest.approx(np.median(values))
+
+def test_initial_values_are_bucketed():
+    values = np.random.default_rng(1).uniform(0, 10, 2001).tolist()
+    median = RunningMedian(values, bucket_size=16)
+    assert median.median() == np.median(values)
+    median.add(-1.0)
+    assert median.median() == np.median(values + [-1.0])
+
+def test_removing_a_missing_value_raises():
+    median = RunningMedian([1.0, 2.0, 3.0])
+    with pytest.raises(ValueError):
+        median.remove(2.5)
+    with pytest.raises(ValueError):
+        median.remove(4.0)
+    assert median.median() == 2.0
+
+def test_group_effects_keep_the_overall_medians_of_their_outcomes():
+    rng = random.Random(2)
+    effects = GroupEffects()
+    for row in range(30):
+        effects.add_group(row)
+    for _ in range(300):
+        rows = [rng.randrange(30) for _ in range(rng.randint(1, 5))]
+        effects.observe(rows, [rng.random() for _ in rows], rng.choice(["joy", "sadness", "fear"]), rng.randint(1, 10), rng.randint(1, 10))
+        for values, running_median in ((effects.mood, effects.mood_median), (effects.energy, effects.energy_median)):
+            outcomes = values[:len(effects), :len(effects.labels)]
+            assert running_median.median() == pytest.approx(np.median(outcomes[~np.isnan(outcomes)]))
@@ -0,0 +1,141 @@
+import random
+import re
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from activity_vocabulary import ACTIVITY_SYNONYMS
+from pattern_finder_support import TrigramModel, random_entry, trigram_embedding_cache
+
+class OriginalFinder:
+    """The single pattern finder the shared vocabulary and per-user finders replaced, condensed.
+
+    Groups are shared as before, outcomes are kept per user (each user's the original's table for
+    their own entries) and keyed by the emotion label.
+    """
+
+    def __init__(self, module, similarity_threshold=0.85):
+        self.module = module
+        self.model = TrigramModel()
+        self.similarity_threshold = similarity_threshold
+        self.time_patterns = module.SharedVocabulary(trigram_embedding_cache()).time_patterns
+        self.activity_groups = {}
+        self.activity_to_group = {}
+        self.group_effects = defaultdict(dict)
+        self.group_activities = defaultdict(lambda: defaultdict(set))
+
+    def _is_valid_activity(self, activity):
+        activity_lower = activity.lower().strip()
+        if any(re.search(pattern, activity_lower) for pattern in self.time_patterns):
+            return False
+        return not (len(activity_lower) <= 3 or activity_lower in self.module.FEELING_WORDS or activity_lower in self.module.NON_ACTIVITIES)
+
+    def _get_canonical_activity(self, activity):
+        activity_lower = activity.lower().strip()
+        for canonical, synonyms in ACTIVITY_SYNONYMS.items():
+            if activity_lower in synonyms or any(synonym in activity_lower for synonym in synonyms):
+                return canonical
+        return activity_lower
+
+    def _find_or_create_group(self, activity):
+        if not self._is_valid_activity(activity):
+            return None
+        canonical_activity = self._get_canonical_activity(activity)
+        if canonical_activity in self.activity_to_group:
+            group_id = self.activity_to_group[canonical_activity]
+            self.activity_to_group[activity] = group_id
+            return group_id
+
+        embedding = self.model.encode([canonical_activity])[0].astype(np.float64)
+        embedding /= np.linalg.norm(embedding)
+        best_group = None
+        best_similarity = 0
+        for group_id, group_data in self.activity_groups.items():
+            similarity = float(embedding @ group_data['embedding'])
+            if similarity > best_similarity and similarity >= self.similarity_threshold:
+                best_similarity = similarity
+                best_group = group_id
+        if best_group is None:
+            best_group = len(self.activity_groups)
+            self.activity_groups[best_group] = {'embedding': embedding, 'label': canonical_activity}
+        self.activity_to_group[activity] = best_group
+        self.activity_to_group[canonical_activity] = best_group
+        return best_group
+
+    def add_observation(self, user_id, daily_keywords, daily_emotion, mood_rating, energy_rating):
+        for activity, weight in daily_keywords:
+            group_id = self._find_or_create_group(activity)
+            if group_id is None:
+                continue
+            self.group_activities[user_id][group_id].update({activity, self._get_canonical_activity(activity)})
+            effect_data = self.group_effects[user_id].setdefault(group_id, {
+                'mood_outcomes': {}, 'energy_outcomes': {}, 'confidence': 0.0, 'observation_count': 0})
+            old_count = effect_data['observation_count']
+            new_count = old_count + weight
+            label = daily_emotion[0][0]
+            effect_data['mood_outcomes'][label] = (effect_data['mood_outcomes'].get(label, 0.0) * old_count + mood_rating * weight) / new_count
+            effect_data['energy_outcomes'][label] = (effect_data['energy_outcomes'].get(label, 0.0) * old_count + energy_rating * weight) / new_count
+            effect_data['confidence'] = min(1.0, new_count / 5.0)
+            effect_data['observation_count'] = new_count
+
+    def get_patterns(self, user_id, min_confidence):
+        group_effects = self.group_effects[user_id]
+        all_moods = [value for effect_data in group_effects.values() for value in effect_data['mood_outcomes'].values()]
+        all_energies = [value for effect_data in group_effects.values() for value in effect_data['energy_outcomes'].values()]
+        averages = (np.median(all_moods), np.median(all_energies)) if all_moods else (5.0, 5.0)
+
+        patterns = []
+        for group_id in sorted(group_effects):
+            effect_data = group_effects[group_id]
+            if effect_data['confidence'] >= min_confidence and effect_data['observation_count'] >= 1.5:
+                dominant_mood = max(effect_data['mood_outcomes'].items(), key=lambda x: abs(x[1]))
+                dominant_energy = max(effect_data['energy_outcomes'].items(), key=lambda x: abs(x[1]))
+                patterns.append({
+                    'group_label': self.activity_groups[group_id]['label'],
+                    'activities': self.group_activities[user_id][group_id],
+                    'effect_on_mood': dominant_mood[1],
+                    'effect_on_energy': dominant_energy[1],
+                    'primary_emotion': dominant_mood[0],
+                    'confidence': effect_data['confidence'],
+                    'observation_count': effect_data['observation_count']
+                })
+        return sorted(patterns, key=lambda x: x['confidence'], reverse=True), averages
+
+def assert_same_patterns(finder, expected, expected_averages, min_confidence):
+    message = finder.pattern_message("test", min_confidence=min_confidence, full=True)
+    # One entry's keywords in the same group are added up before averaging, so allow for rounding
+    assert (message['overall_avg_mood'], message['overall_avg_energy']) == pytest.approx(expected_averages)
+    assert [pattern['group_label'] for pattern in message['patterns']] == [pattern['group_label'] for pattern in expected]
+    for pattern, expected_pattern in zip(message['patterns'], expected):
+        assert set(pattern['activities']) == expected_pattern['activities']
+        assert pattern['primary_emotion'] == expected_pattern['primary_emotion']
+        for name in ('effect_on_mood', 'effect_on_energy', 'confidence', 'observation_count'):
+            assert pattern[name] == pytest.approx(expected_pattern[name]), name
+
+@pytest.mark.parametrize("users", [1, 4])
+def test_patterns_match_the_original_finder(pattern_finder, users):
+    rng = random.Random(users)
+    vocabulary = pattern_finder.SharedVocabulary(trigram_embedding_cache())
+    finders = {f"user-{i}": pattern_finder.SemanticPatternFinder(vocabulary) for i in range(users)}
+    original = OriginalFinder(pattern_finder)
+
+    for step in range(150):
+        user_id = rng.choice(list(finders))
+        entries = [random_entry(rng, pattern_finder, user_id) for _ in range(rng.randint(1, 3))]
+        # Both ways of adding entries
+        if step % 2:
+            finders[user_id].batch_add_observations(entries)
+        else:
+            for entry in entries:
+                finders[user_id].add_observation(entry.keywords, entry.emotions, entry.mood_rating, entry.energy_rating)
+        for entry in entries:
+            original.add_observation(user_id, entry.keywords, entry.emotions, entry.mood_rating, entry.energy_rating)
+
+        if step % 25 == 24:
+            for user_id, finder in finders.items():
+                for min_confidence in (0.2, 0.6):
+                    assert_same_patterns(finder, *original.get_patterns(user_id, min_confidence), min_confidence)
+    assert vocabulary.next_group_id == len(original.activity_groups)
+    for group_id, group_data in original.activity_groups.items():
+        assert vocabulary.group_label(group_id) == group_data['label']
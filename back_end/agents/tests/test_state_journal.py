@@ -0,0 +1,87 @@
+import json
+
+from state_journal import StateJournal, atomic_write
+
+def observation(i):
+    return {'user_id': "user", 'op': "observation", 'value': i}
+
+def test_replay_returns_records_after_the_snapshot(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    journal = StateJournal(filename)
+    assert journal.extend([observation(1), observation(2)]) == 2
+    assert journal.append(observation(3)) == 3
+    journal.close()
+
+    reopened = StateJournal(filename)
+    assert [record['value'] for record in reopened.replay()] == [1, 2, 3]
+    assert [record['seq'] for record in reopened.replay(after_seq=1)] == [2, 3]
+    assert reopened.records_since_compaction == 2
+    # New records continue from the last one on disk
+    assert reopened.append(observation(4)) == 4
+
+def test_replay_of_a_missing_journal_starts_at_the_snapshot(tmp_path):
+    journal = StateJournal(tmp_path / "journal.jsonl")
+    assert journal.replay(after_seq=7) == []
+    assert journal.append(observation(1)) == 8
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    journal = StateJournal(filename)
+    journal.extend([observation(1), observation(2)])
+    journal.close()
+    with open(filename, 'ab') as f:
+        f.write(b'{"seq":3,"user_id":"us')
+
+    reopened = StateJournal(filename)
+    assert [record['seq'] for record in reopened.replay()] == [1, 2]
+    reopened.append(observation(3))
+    reopened.close()
+
+    with open(filename, 'rb') as f:
+        assert [json.loads(line)['seq'] for line in f] == [1, 2, 3]
+
+def test_fsync_is_batched(tmp_path):
+    journal = StateJournal(tmp_path / "journal.jsonl", fsync_every=3, fsync_interval=3600)
+    journal.extend([observation(1), observation(2)])
+    assert journal.fsyncs == 0 and journal.pending == 2
+    journal.append(observation(3))
+    assert journal.fsyncs == 1 and journal.pending == 0
+    journal.append(observation(4))
+    journal.flush()
+    assert journal.fsyncs == 2
+
+def test_compaction_snapshots_then_empties_the_journal(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    snapshot_file = tmp_path / "snapshot.json"
+    journal = StateJournal(filename, compact_every=3)
+    state = []
+
+    def write_snapshot(seq):
+        atomic_write(snapshot_file, lambda f: f.write(json.dumps({'seq': seq, 'state': state}).encode("utf-8")))
+
+    for i in range(1, 4):
+        state.append(i)
+        journal.append(observation(i))
+    assert journal.needs_compaction
+    journal.compact(write_snapshot)
+
+    assert not journal.needs_compaction
+    assert filename.read_bytes() == b""
+    assert json.loads(snapshot_file.read_text()) == {'seq': 3, 'state': [1, 2, 3]}
+    assert journal.append(observation(4)) == 4
+
+    # Recovery: the snapshot, then whatever was journaled after it
+    snapshot = json.loads(snapshot_file.read_text())
+    reopened = StateJournal(filename)
+    assert [record['value'] for record in reopened.replay(after_seq=snapshot['seq'])] == [4]
+
+def test_records_already_in_the_snapshot_are_skipped(tmp_path):
+    # A crash after the snapshot was written but before the journal was emptied
+    filename = tmp_path / "journal.jsonl"
+    journal = StateJournal(filename)
+    journal.extend([observation(i) for i in range(1, 6)])
+    journal.close()
+
+    reopened = StateJournal(filename)
+    assert [record['seq'] for record in reopened.replay(after_seq=5)] == []
+    assert reopened.append(observation(6)) == 6
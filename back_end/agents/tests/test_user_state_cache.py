@@ -0,0 +1,67 @@
+from user_state_cache import UserStateCache
+
+class Store:
+    """Saved states by user id, standing in for the per-user files"""
+
+    def __init__(self, saved=None):
+        self.saved = dict(saved or {})
+        self.save_calls = []
+
+    def load(self, user_id):
+        state = self.saved.get(user_id)
+        return dict(state) if state is not None else None
+
+    def save(self, user_id, state):
+        self.save_calls.append(user_id)
+        self.saved[user_id] = dict(state)
+
+def cache(store, max_resident):
+    return UserStateCache(lambda user_id: {'user': user_id, 'entries': 0}, store.load, store.save, max_resident=max_resident)
+
+def test_least_recently_used_users_are_evicted():
+    users = cache(Store(), max_resident=2)
+    users.get("a")
+    users.get("b")
+    users.get("a")
+    users.get("c")
+    assert "a" in users and "c" in users and "b" not in users
+    assert len(users) == 2
+    assert users.stats()['evictions'] == 1
+
+def test_only_changed_users_are_saved():
+    store = Store()
+    users = cache(store, max_resident=1)
+    users.get("a")['entries'] += 1
+    users.mark_dirty("a")
+    users.get("b")
+    users.get("c")
+    # b was never marked dirty
+    assert store.save_calls == ["a"]
+
+    users.get("c")['entries'] += 2
+    users.mark_dirty("c")
+    users.save_dirty()
+    users.save_dirty()
+    assert store.save_calls == ["a", "c"]
+    assert users.get("a") == {'user': "a", 'entries': 1}
+
+def test_marking_a_user_that_is_not_resident_does_nothing():
+    store = Store()
+    users = cache(store, max_resident=1)
+    users.mark_dirty("a")
+    users.get("a")
+    users.get("b")
+    assert store.save_calls == []
+
+def test_saved_users_are_loaded_instead_of_created():
+    users = cache(Store({"a": {'user': "a", 'entries': 5}}), max_resident=4)
+    assert users.get("a")['entries'] == 5
+    assert users.get("b")['entries'] == 0
+    assert users.get("c", create=lambda user_id: {'user': user_id, 'entries': 9})['entries'] == 9
+    # A per-lookup create is only used when there's nothing to load
+    assert users.get("a", create=lambda user_id: {})['entries'] == 5
+    users.get("b")
+
+    stats = users.stats()
+    assert (stats['hits'], stats['loads'], stats['creates']) == (2, 1, 2)
+    assert stats['hit_rate'] == 2 / 5
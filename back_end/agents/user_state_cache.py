@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+class UserStateCache:
+    """LRU of per-user state objects, saved on eviction if they changed"""
+
+    def __init__(self, create, load, save, max_resident=256):
+        self.create = create
+        self.load = load
+        self.save = save
+        self.max_resident = max_resident
+        self._states = OrderedDict()
+        self._dirty = set()
+
+        self.hits = 0
+        self.loads = 0
+        self.creates = 0
+        self.evictions = 0
+        self.saves = 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, user_id):
+        return user_id in self._states
+
+    def get(self, user_id, create=None):
+        """The user's state, loaded or else created (by create instead of the cache's own, if given)"""
+        state = self._states.get(user_id)
+        if state is not None:
+            self._states.move_to_end(user_id)
+            self.hits += 1
+            return state
+
+        state = self.load(user_id)
+        if state is not None:
+            self.loads += 1
+        else:
+            state = (create or self.create)(user_id)
+            self.creates += 1
+        self._states[user_id] = state
+        self._evict()
+        return state
+
+    def mark_dirty(self, user_id):
+        if user_id in self._states:
+            self._dirty.add(user_id)
+
+    def _save(self, user_id, state):
+        self.save(user_id, state)
+        self._dirty.discard(user_id)
+        self.saves += 1
+
+    def _evict(self):
+        while len(self._states) > self.max_resident:
+            user_id, state = self._states.popitem(last=False)
+            if user_id in self._dirty:
+                self._save(user_id, state)
+            self.evictions += 1
+
+    def save_dirty(self):
+        """Save every resident user that changed since their last save"""
+        for user_id in [user_id for user_id in self._states if user_id in self._dirty]:
+            self._save(user_id, self._states[user_id])
+
+    def stats(self):
+        lookups = self.hits + self.loads + self.creates
+        return {
+            'resident': len(self._states),
+            'max_resident': self.max_resident,
+            'dirty': len(self._dirty),
+            'hits': self.hits,
+            'loads': self.loads,
+            'creates': self.creates,
+            'evictions': self.evictions,
+            'saves': self.saves,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
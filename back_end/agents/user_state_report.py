@@ -0,0 +1,128 @@
+'''
+Hit rate, latency and resident memory of the pattern finder's per-user state LRU (UserStateCache) under
+Zipf-distributed traffic, each --max-resident size in a fresh process. With --seed-groups every user also
+carries a copy of that many baseline groups, as resident users started from the seed do by default
+(PATTERN_FINDER_SEED_USER). Saved files are modeled in full, the finder saves only what differs from the seed.
+
+Usage: python user_state_report.py [--users 10000] [--requests 20000] [--max-resident 100 1000] [--groups 40] [--vocabulary 5000] [--seed-groups 0]
+'''
+
+import multiprocessing
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from report_utils import report_parser, current_rss_mb, print_table, write_report
+
+EMOTIONS = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'neutral']
+
+def synthesize_user(user_id, groups, vocabulary, seed_groups=0):
+    """A user's state as SemanticPatternFinder._state() builds it"""
+    from group_effects import GroupEffects
+
+    rng = random.Random(user_id)
+    effects = GroupEffects()
+    # A seeded user's first rows are the seed user's groups, the first ids of the vocabulary
+    row_groups = list(range(seed_groups)) + rng.sample(range(seed_groups, vocabulary), groups)
+    rows = len(row_groups)
+    for row in range(rows):
+        effects.add_group(row)
+    for _ in range(rows // 2):
+        effects.observe(rng.sample(range(rows), 5), [rng.uniform(0.2, 1.0) for _ in range(5)],
+                        rng.choice(EMOTIONS), rng.randint(1, 10), rng.randint(1, 10))
+    return {
+        'group_effects': effects,
+        'row_groups': row_groups,
+        'group_activities': [{f"activity_{group_id}", f"activity_{group_id} session"} for group_id in row_groups],
+        'baseline_initialized': True,
+        'journal_seq': 0
+    }
+
+def run_cache(max_resident, users, requests, groups, vocabulary, zipf, write_fraction, seed_groups=0, seed=0):
+    from state_journal import atomic_write
+    from user_state_cache import UserStateCache
+
+    directory = tempfile.mkdtemp(prefix="user_state_report_")
+    rng = np.random.default_rng(seed)
+    # Zipf ranks past the number of users wrap around
+    traffic = ((rng.zipf(zipf, requests) - 1) % users).tolist()
+    writes = (rng.random(requests) < write_fraction).tolist()
+
+    def path(user_id):
+        return os.path.join(directory, f"{user_id}.pkl")
+
+    def load(user_id):
+        try:
+            with open(path(user_id), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    cache = UserStateCache(
+        create=lambda user_id: synthesize_user(user_id, groups, vocabulary, seed_groups),
+        load=load,
+        save=lambda user_id, state: atomic_write(path(user_id), lambda f: pickle.dump(state, f)),
+        max_resident=max_resident
+    )
+
+    rss_before = current_rss_mb()
+    latencies = []
+    start = time.perf_counter()
+    try:
+        for user_id, write in zip(traffic, writes):
+            request_start = time.perf_counter()
+            cache.get(user_id)
+            if write:
+                cache.mark_dirty(user_id)
+            latencies.append(time.perf_counter() - request_start)
+        seconds = time.perf_counter() - start
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            **cache.stats(),
+            'distinct_users': len(set(traffic)),
+            'seconds': seconds,
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p99_ms': float(np.percentile(latencies_ms, 99)),
+            'rss_growth_mb': current_rss_mb() - rss_before
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = report_parser(__doc__, "user_state_report.json")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--max-resident", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--groups", type=int, default=40, help="Activity groups per user")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="Shared activity groups")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent of user activity")
+    parser.add_argument("--write-fraction", type=float, default=0.5)
+    parser.add_argument("--seed-groups", type=int, default=0, help="Groups of a seed user's table copied into every user")
+    args = parser.parse_args()
+
+    table_bytes = len(pickle.dumps(synthesize_user(0, args.groups, args.vocabulary, args.seed_groups)))
+    print(f"One user with {args.groups} groups (+{args.seed_groups} seeded): {table_bytes / 1024:.1f} KB pickled\n")
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for max_resident in args.max_resident:
+        print(f"Running with {max_resident} resident users...")
+        with context.Pool(1) as pool:
+            result = pool.apply(run_cache, (max_resident, args.users, args.requests, args.groups, args.vocabulary, args.zipf,
+                                            args.write_fraction, args.seed_groups))
+        results.append(result)
+
+    print()
+    print_table(["resident", "distinct", "hit rate", "loads", "creates", "evictions", "saves", "p50 ms", "p99 ms", "RSS MB"],
+                [[result['max_resident'], result['distinct_users'], f"{result['hit_rate']:.3f}", result['loads'],
+                  result['creates'], result['evictions'], result['saves'], f"{result['p50_ms']:.3f}",
+                  f"{result['p99_ms']:.2f}", f"{result['rss_growth_mb']:.1f}"] for result in results])
+
+    write_report(args.output, {'args': vars(args), 'effect_table_bytes': table_bytes, 'results': results})
+
+if __name__ == "__main__":
+    main()